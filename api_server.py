@@ -0,0 +1,462 @@
+"""
+API Server for Road Safety Estimator
+Local HTTP/JSON service exposing parsing, matching and pricing to other
+systems, built on asyncio streams with CPU-heavy work in worker processes
+
+Usage:
+    python api_server.py --host 127.0.0.1 --port 8765 --workers 4
+
+Endpoints:
+    GET  /health                                   Service and database status
+    POST /parse?file_name=audit.pdf                Document bytes -> interventions
+    POST /match                                    {"interventions": [...]} -> matched items
+    POST /price                                    {"matched": [...], "location", "year"} -> priced items and totals
+    POST /estimate?file_name=audit.pdf&location=Kerala&year=2024
+                                                   Document bytes -> priced items and totals
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from document_parser import DocumentParser
+from matching_engine import MatchingEngine
+from price_fetcher import PricedEstimate
+from standards_store import get_standards_store
+from telemetry import get_telemetry
+
+# Document formats DocumentParser can read
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+# Bytes read from the socket at a time while streaming an upload to disk
+UPLOAD_CHUNK = 1 << 20
+
+# Largest document and JSON bodies accepted
+MAX_UPLOAD_BYTES = int(os.getenv('API_MAX_UPLOAD_MB', '512')) * 1024 * 1024
+MAX_JSON_BYTES = int(os.getenv('API_MAX_JSON_MB', '64')) * 1024 * 1024
+
+# Largest request head (request line and headers)
+MAX_HEAD_BYTES = 64 * 1024
+
+# Pipeline stages of each worker process, built once per worker
+_worker_pipeline = None
+
+
+def _init_worker(database_path: str):
+    """Load the standards database and build the pipeline once per worker process"""
+    global _worker_pipeline
+    _worker_pipeline = ApiPipeline(database_path)
+
+
+def _call_in_worker(method: str, *args) -> bytes:
+    """Run a pipeline method in a worker and return its JSON-encoded result"""
+    return _encode(getattr(_worker_pipeline, method)(*args))
+
+
+def _warm_worker() -> int:
+    return os.getpid()
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, default=_json_default).encode('utf-8')
+
+
+def _json_default(value):
+    """Encode the NumPy scalars that standards columns carry into records"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class HttpError(Exception):
+    """Request failure reported to the client as a JSON error body"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ApiPipeline:
+    """DocumentParser -> MatchingEngine -> PricedEstimate, as used by one worker process"""
+    
+    def __init__(self, database_path: str = 'GPT_Input_DB.xlsx'):
+        self.parser = DocumentParser()
+        self.matcher = MatchingEngine(database_path)
+    
+    def parse(self, path: str) -> Dict:
+        with open(path, 'rb') as file:
+            interventions = list(self.parser.iter_interventions(file))
+        return {'interventions': interventions}
+    
+    def match(self, interventions: List[Dict]) -> Dict:
+        matched = self.matcher.match_standards_batch(interventions)
+        return {'matched': matched, 'database_version': self.matcher.database_version}
+    
+    def price(self, matched: List[Dict], location: str, year: int) -> Dict:
+        estimate = PricedEstimate(matched, location=location, year=year)
+        return {
+            'location': location,
+            'year': year,
+            'items': estimate.records,
+            'summary': estimate.summary.to_dict()
+        }
+    
+    def estimate(self, path: str, location: str, year: int) -> Dict:
+        interventions = self.parse(path)['interventions']
+        matched = self.matcher.match_standards_batch(interventions)
+        result = self.price(matched, location, year)
+        result['interventions'] = len(interventions)
+        result['database_version'] = self.matcher.database_version
+        return result
+
+
+class RequestBody:
+    """Body of one request, read from the connection as it is consumed"""
+    
+    def __init__(self, reader: asyncio.StreamReader, headers: Dict[str, str]):
+        self.reader = reader
+        self.chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        try:
+            self.length = None if self.chunked else int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        self.complete = not self.chunked and self.length == 0
+    
+    async def iter_chunks(self, max_bytes: int) -> AsyncIterator[bytes]:
+        """Yield the body in pieces of at most UPLOAD_CHUNK bytes"""
+        if self.length is not None and self.length > max_bytes:
+            raise HttpError(413, f"Body exceeds {max_bytes} bytes")
+        received = 0
+        async for chunk in (self._iter_chunked() if self.chunked else self._iter_sized()):
+            received += len(chunk)
+            if received > max_bytes:
+                raise HttpError(413, f"Body exceeds {max_bytes} bytes")
+            yield chunk
+        self.complete = True
+    
+    async def read(self, max_bytes: int) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_chunks(max_bytes)])
+    
+    async def read_json(self) -> Dict:
+        try:
+            payload = json.loads(await self.read(MAX_JSON_BYTES) or b'{}')
+        except ValueError as e:
+            raise HttpError(400, f"Invalid JSON body: {e}")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "JSON body must be an object")
+        return payload
+    
+    async def _iter_sized(self) -> AsyncIterator[bytes]:
+        remaining = self.length
+        while remaining:
+            chunk = await self.reader.read(min(remaining, UPLOAD_CHUNK))
+            if not chunk:
+                raise HttpError(400, "Connection closed before the body was complete")
+            remaining -= len(chunk)
+            yield chunk
+    
+    async def _iter_chunked(self) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0].strip(), 16)
+                if size < 0:
+                    raise ValueError("negative chunk size")
+                if size == 0:
+                    # Skip trailers up to the blank line ending the body
+                    while (await self.reader.readline()).strip():
+                        pass
+                    return
+                while size:
+                    chunk = await self.reader.read(min(size, UPLOAD_CHUNK))
+                    if not chunk:
+                        raise HttpError(400, "Connection closed before the body was complete")
+                    size -= len(chunk)
+                    yield chunk
+                if await self.reader.readexactly(2) != b'\r\n':
+                    raise ValueError("chunk not followed by CRLF")
+        except (ValueError, asyncio.IncompleteReadError):
+            raise HttpError(400, "Malformed chunked body")
+
+
+class EstimatorApi:
+    """
+    HTTP/1.1 JSON service over asyncio streams.
+    
+    The event loop only moves bytes: uploads are streamed to temporary
+    files and every parse, match and price call runs in a process pool
+    whose workers load the standards database before the server starts
+    listening. At most max_pending calls wait for a worker; beyond that
+    requests are turned away with 503 instead of queueing without bound.
+    """
+    
+    def __init__(self, database_path: str = 'GPT_Input_DB.xlsx', workers: int = None,
+                 max_pending: int = None, upload_dir: str = None):
+        """
+        Args:
+            database_path: IRC standards workbook
+            workers: Worker processes for parsing, matching and pricing
+            max_pending: Calls allowed in flight or waiting for a worker
+                (default: 4 per worker)
+            upload_dir: Where uploads are spooled (default: system temp dir)
+        """
+        self.database_path = database_path
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.workers
+        self.upload_dir = upload_dir
+        self.routes = {
+            ('GET', '/health'): self.handle_health,
+            ('POST', '/parse'): self.handle_parse,
+            ('POST', '/match'): self.handle_match,
+            ('POST', '/price'): self.handle_price,
+            ('POST', '/estimate'): self.handle_estimate
+        }
+        self._executor = None
+        self._pending = 0
+        self._server = None
+    
+    async def start(self, host: str = '127.0.0.1', port: int = 8765) -> Tuple[str, int]:
+        """Warm every worker, then start listening; returns the bound address"""
+        # Writes the Feather snapshot if it is missing, so workers memory-map it
+        get_standards_store().load(self.database_path)
+        self._executor = self._create_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _warm_worker) for _ in range(self.workers)
+        ))
+        
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEAD_BYTES)
+        return self._server.sockets[0].getsockname()[:2]
+    
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+    
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def handle_health(self, query: Dict, body: RequestBody) -> bytes:
+        store = get_standards_store()
+        return _encode({
+            'status': 'ok',
+            'database_version': store.get_version(self.database_path) or 'default',
+            'workers': self.workers,
+            'pending': self._pending,
+            'max_pending': self.max_pending
+        })
+    
+    async def handle_parse(self, query: Dict, body: RequestBody) -> bytes:
+        async with self._spooled_upload(query, body) as path:
+            return await self._run('parse', path)
+    
+    async def handle_match(self, query: Dict, body: RequestBody) -> bytes:
+        payload = await body.read_json()
+        interventions = payload.get('interventions')
+        if not isinstance(interventions, list) or not all(
+            isinstance(item, dict) and 'type' in item for item in interventions
+        ):
+            raise HttpError(400, "'interventions' must be a list of objects with a 'type'")
+        for item in interventions:
+            item.setdefault('description', '')
+        return await self._run('match', interventions)
+    
+    async def handle_price(self, query: Dict, body: RequestBody) -> bytes:
+        payload = await body.read_json()
+        matched = payload.get('matched')
+        if not isinstance(matched, list) or not all(isinstance(item, dict) for item in matched):
+            raise HttpError(400, "'matched' must be a list of objects")
+        location, year = self._pricing_options({**query, **payload})
+        return await self._run('price', matched, location, year)
+    
+    async def handle_estimate(self, query: Dict, body: RequestBody) -> bytes:
+        location, year = self._pricing_options(query)
+        async with self._spooled_upload(query, body) as path:
+            return await self._run('estimate', path, location, year)
+    
+    def _pricing_options(self, options: Dict) -> Tuple[str, int]:
+        try:
+            return str(options.get('location', "Tamil Nadu")), int(options.get('year', 2024))
+        except (TypeError, ValueError):
+            raise HttpError(400, "'year' must be an integer")
+    
+    def _spooled_upload(self, query: Dict, body: RequestBody):
+        """Context manager streaming the body to a temporary file named like the upload"""
+        suffix = Path(query.get('file_name', '')).suffix.lower()
+        if suffix not in SUPPORTED_EXTENSIONS:
+            raise HttpError(400, f"file_name must end in one of {', '.join(SUPPORTED_EXTENSIONS)}")
+        return _SpooledUpload(body, suffix, self.upload_dir)
+    
+    async def _run(self, method: str, *args) -> bytes:
+        """Call a pipeline method in the worker pool, refusing work beyond max_pending"""
+        if self._pending >= self.max_pending:
+            raise HttpError(503, "Server busy, retry shortly")
+        self._pending += 1
+        executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, _call_in_worker, method, *args
+            )
+        except BrokenProcessPool:
+            # Every request in flight on the broken pool lands here; replace it once
+            if self._executor is executor:
+                get_telemetry().event('api.pool_broken', method=method)
+                self._executor = self._create_executor()
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise HttpError(500, "Worker process died")
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        finally:
+            self._pending -= 1
+    
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.database_path,)
+        )
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection until the client closes it or asks to"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 431, _encode({'error': "Request head too large"}), False)
+                    return
+                
+                try:
+                    method, target, keep_alive, headers = self._parse_head(head)
+                except HttpError as e:
+                    await self._respond(writer, e.status, _encode({'error': e.message}), False)
+                    return
+                
+                body = None
+                try:
+                    body = RequestBody(reader, headers)
+                    status, payload = 200, await self._dispatch(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, _encode({'error': e.message})
+                except Exception as e:
+                    get_telemetry().event('api.error', method=method, target=target,
+                                          error_type=type(e).__name__, error=str(e))
+                    status, payload = 500, _encode({'error': f"{type(e).__name__}: {e}"})
+                
+                # An unread body would be parsed as the next request
+                keep_alive = keep_alive and body is not None and body.complete
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    
+    def _parse_head(self, head: bytes) -> Tuple[str, str, bool, Dict[str, str]]:
+        try:
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            method, target, version = request_line.split(' ')
+            headers = {}
+            for line in header_lines:
+                if line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+        except ValueError:
+            raise HttpError(400, "Malformed request")
+        
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method.upper(), target, keep_alive, headers
+    
+    async def _dispatch(self, method: str, target: str, body: RequestBody) -> bytes:
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self.routes):
+                raise HttpError(405, f"{method} not allowed on {url.path}")
+            raise HttpError(404, f"No endpoint {url.path}")
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return await handler(query, body)
+    
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: bytes, keep_alive: bool):
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            + ("Retry-After: 1\r\n" if status == 503 else "")
+            + "\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+
+class _SpooledUpload:
+    """Streams a request body to a temporary file, removed on exit"""
+    
+    def __init__(self, body: RequestBody, suffix: str, upload_dir: str = None):
+        self.body = body
+        self.suffix = suffix
+        self.upload_dir = upload_dir
+        self.path = None
+    
+    async def __aenter__(self) -> str:
+        fd, self.path = tempfile.mkstemp(suffix=self.suffix, dir=self.upload_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in self.body.iter_chunks(MAX_UPLOAD_BYTES):
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(self.path)
+            raise
+        return self.path
+    
+    async def __aexit__(self, *exc_info):
+        os.unlink(self.path)
+
+
+async def serve(host: str, port: int, database_path: str, workers: int = None, max_pending: int = None):
+    api = EstimatorApi(database_path, workers=workers, max_pending=max_pending)
+    bound_host, bound_port = await api.start(host, port)
+    print(f"Road Safety Estimator API listening on http://{bound_host}:{bound_port} "
+          f"({api.workers} workers)", flush=True)
+    try:
+        await api.serve_forever()
+    finally:
+        await api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the estimation pipeline over HTTP/JSON")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on")
+    parser.add_argument('--port', type=int, default=8765, help="port to listen on (0 = any free port)")
+    parser.add_argument('--database', default='GPT_Input_DB.xlsx', help="IRC standards workbook")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help="calls in flight or queued before answering 503 (default: 4 per worker)")
+    args = parser.parse_args()
+    
+    try:
+        asyncio.run(serve(args.host, args.port, args.database, args.workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
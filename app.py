@@ -3,12 +3,16 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import io
+import re
+import time
 from document_parser import DocumentParser
 from matching_engine import MatchingEngine
-from price_fetcher import PriceFetcher
+from price_fetcher import PriceFetcher, PricedEstimate, PriceSummary
 from report_generator import ReportGenerator
 from notification_service import get_notification_service
-import time
+from job_queue import JOB_STAGES, TEXT_PREVIEW_CHARS, get_job_queue
+from email_outbox import get_email_outbox
+from telemetry import aggregate_json_lines, get_telemetry
 import os
 from dotenv import load_dotenv
 
@@ -232,12 +236,219 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# States/UTs offered for pricing
+LOCATIONS = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh",
+    "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand",
+    "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur",
+    "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab",
+    "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura",
+    "Uttar Pradesh", "Uttarakhand", "West Bengal",
+    "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry"
+]
+
+# Price reference years offered for inflation adjustment
+PRICE_YEARS = [2024, 2023, 2022, 2021]
+
+# Seconds between refreshes of the background jobs panel
+JOB_POLL_SECONDS = 2
+
 # Initialize session state
 if 'processed_data' not in st.session_state:
     st.session_state.processed_data = None
 if 'report_generated' not in st.session_state:
     st.session_state.report_generated = False
 
+def stage_progress(progress_bar, status_text, label: str, start: int, end: int):
+    """
+    Progress callback for a backend stage: maps its (done, total) onto
+    start..end percent of the bar, redrawing only when the percent changes
+    """
+    last_percent = None
+    
+    def update(done: int, total: int):
+        nonlocal last_percent
+        percent = start + (end - start) * done // max(total, 1)
+        if percent != last_percent:
+            last_percent = percent
+            progress_bar.progress(percent)
+            status_text.text(f"{label} ({done:,}/{total:,})")
+    
+    return update
+
+def show_flash(section: str):
+    """Show the success message a step stored before rerunning the app"""
+    flash = st.session_state.get('flash')
+    if flash and flash['section'] == section:
+        del st.session_state['flash']
+        if flash.get('balloons', True):
+            st.balloons()
+        st.success(flash['message'])
+        if flash.get('caption'):
+            st.caption(flash['caption'])
+
+def get_price_summary() -> PriceSummary:
+    """Totals of the priced data, kept current by its PricedEstimate"""
+    estimate = st.session_state.get('priced_estimate')
+    if estimate is not None and estimate.records is st.session_state.get('priced_data'):
+        return estimate.summary
+    return PriceSummary(st.session_state.get('priced_data', []))
+
+def open_job_results(job: dict) -> bool:
+    """
+    Load a finished background job into the session, as if each step had run here
+    
+    Returns:
+        bool: False if the job belongs to another session and was not loaded
+    """
+    if job['id'] not in st.session_state.get('job_ids', []):
+        # Jobs of other sessions hold other users' documents
+        st.error("❌ This job was not submitted in your session.")
+        return False
+    result = get_job_queue().load_result(job['id'])
+    options = job['options']
+    estimate = PricedEstimate(result['matched_data'], location=options['location'], year=options['year'])
+    
+    st.session_state.interventions = result['interventions']
+    st.session_state.extracted_text = result['extracted_text']
+    st.session_state.matched_data = result['matched_data']
+    st.session_state.priced_estimate = estimate
+    st.session_state.priced_data = estimate.records
+    with open(result['report_path'], 'rb') as f:
+        st.session_state.report_pdf = f.read()
+    st.session_state.project_name = options['project_name']
+    st.session_state.report_date = job['finished'][:10]
+    st.session_state.consultant_name = ''
+    for key in ('upload', 'match', 'price', 'report'):
+        st.session_state[f'{key}_completed'] = True
+    
+    st.session_state.flash = {
+        'section': 'jobs',
+        'message': f"✅ Loaded **{job['file_name']}**: **{len(result['interventions'])}** interventions found.",
+        'caption': f"Extraction cache: {'hit' if result['extraction_cache_hit'] else 'miss'}"
+    }
+    return True
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_status_panel():
+    """Recent background jobs of this session, refreshed in place from the job table"""
+    jobs = get_job_queue().list_jobs(limit=10, job_ids=st.session_state.get('job_ids', []))
+    if not jobs:
+        return
+    
+    st.markdown("### ⏳ Processing Jobs")
+    for job in jobs:
+        name = job['file_name']
+        if job['status'] == 'queued':
+            st.progress(0, text=f"🕒 {name}: waiting for a worker")
+        elif job['status'] == 'running':
+            stage_index = JOB_STAGES.index(job['stage']) if job['stage'] in JOB_STAGES else 0
+            stage_fraction = job['done'] / job['total'] if job['total'] else 0.0
+            counts = f" ({job['done']:,}/{job['total']:,})" if job['total'] else ""
+            st.progress(
+                (stage_index + stage_fraction) / len(JOB_STAGES),
+                text=f"⚙️ {name}: {job['stage']}{counts}"
+            )
+        elif job['status'] == 'done':
+            summary = job['summary']
+            col_info, col_open = st.columns([3, 1])
+            with col_info:
+                st.markdown(
+                    f"✅ **{name}**: {summary['matched']} of {summary['interventions']} items priced, "
+                    f"₹{summary['grand_total']/100000:.1f}L incl. GST"
+                )
+            with col_open:
+                if st.button("📂 Open", key=f"open_job_{job['id']}", use_container_width=True):
+                    if open_job_results(job):
+                        st.rerun()
+        else:
+            st.error(f"❌ {name}: {job['error']}")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def email_status_panel():
+    """Delivery status of the emails this session queued, refreshed from the outbox"""
+    message_ids = st.session_state.get('outbox_ids', [])[:20]
+    if not message_ids:
+        return
+    
+    st.markdown("#### 📬 Email Delivery")
+    for message in get_email_outbox().get_messages(message_ids):
+        recipient = message['recipient']
+        if message['status'] == 'sent':
+            st.markdown(f"✅ **{recipient}**: delivered at {message['sent'][11:16]}")
+        elif message['status'] == 'failed':
+            st.error(f"❌ {recipient}: {message['error']}")
+        elif message['status'] == 'retrying':
+            retry_in = max(message['next_attempt'] - time.time(), 0)
+            st.warning(f"🔁 {recipient}: attempt {message['attempts']} failed, retrying in {retry_in:.0f}s ({message['error']})")
+        else:
+            st.markdown(f"🕒 **{recipient}**: {message['status']}...")
+
+def telemetry_panel():
+    """Developer view of stage timings, cache hit rates and recent events (TELEMETRY=1)"""
+    telemetry = get_telemetry()
+    if not telemetry.enabled:
+        return
+    
+    with st.expander("🛠️ Telemetry", expanded=False):
+        source = "This process"
+        if telemetry.jsonl_path and Path(telemetry.jsonl_path).exists():
+            source = st.radio("Source", ["This process", "All workers"], horizontal=True, key='telemetry_source')
+        if source == "All workers":
+            # Background jobs and API workers append to the same JSON lines log
+            telemetry = aggregate_json_lines(telemetry.jsonl_path)
+        snapshot = telemetry.snapshot()
+        
+        if snapshot['spans']:
+            st.markdown("**Stages**")
+            spans = pd.DataFrame([
+                {
+                    'Stage': span['name'] + ''.join(f" {value}" for value in span['labels'].values()),
+                    'Calls': span['count'],
+                    'Mean ms': round(span['mean_ms'], 1),
+                    'Max ms': round(span['max_ms'], 1),
+                    'Total s': round(span['total_seconds'], 2)
+                }
+                for span in snapshot['spans']
+            ])
+            st.dataframe(spans, hide_index=True, use_container_width=True)
+        
+        if snapshot['hit_rates']:
+            st.markdown("**Caches**")
+            hit_rates = pd.DataFrame([
+                {'Cache': rate['name'], 'Hits': rate['hits'], 'Misses': rate['misses'],
+                 'Hit rate': f"{rate['hit_rate']:.0%}"}
+                for rate in snapshot['hit_rates']
+            ])
+            st.dataframe(hit_rates, hide_index=True, use_container_width=True)
+        
+        if snapshot['counters']:
+            st.markdown("**Counters**")
+            counters = pd.DataFrame([
+                {'Counter': counter['name'], 'Labels': ', '.join(f"{k}={v}" for k, v in counter['labels'].items()),
+                 'Value': counter['value']}
+                for counter in snapshot['counters']
+            ])
+            st.dataframe(counters, hide_index=True, use_container_width=True)
+        
+        if snapshot['events']:
+            st.markdown("**Recent events**")
+            for event in reversed(snapshot['events'][-15:]):
+                details = ' '.join(f"{key}={value}" for key, value in event['fields'].items())
+                st.caption(f"{time.strftime('%H:%M:%S', time.localtime(event['ts']))} {event['name']} {details}")
+        
+        col_prom, col_json = st.columns(2)
+        with col_prom:
+            st.download_button("Prometheus", telemetry.to_prometheus(), file_name="metrics.prom",
+                               mime="text/plain", use_container_width=True)
+        with col_json:
+            st.download_button("JSON lines", telemetry.to_json_lines(), file_name="metrics.jsonl",
+                               mime="application/json", use_container_width=True)
+        if source == "This process" and st.button("Reset", use_container_width=True):
+            telemetry.reset()
+            st.rerun()
+
 def main():
     # Animated header
     st.markdown('<h1 class="floating">🛣️ Road Safety Estimator</h1>', unsafe_allow_html=True)
@@ -298,8 +509,10 @@ def main():
                 st.metric("Items", len(st.session_state.interventions))
             with col2:
                 if 'priced_data' in st.session_state:
-                    total = sum(item.get('total_with_gst', 0) for item in st.session_state.priced_data)
+                    total = get_price_summary().grand_total
                     st.metric("Total", f"₹{total/100000:.1f}L")
+        
+        telemetry_panel()
     
     # Main content with animated tabs
     tab1, tab2, tab3, tab4 = st.tabs([
@@ -355,50 +568,47 @@ def upload_section():
                 </div>
             """, unsafe_allow_html=True)
             
+            # Pricing applied by the background job; the Cost Estimation tab can re-price
+            col_loc, col_year = st.columns(2)
+            with col_loc:
+                job_location = st.selectbox(
+                    "📍 Location/State for pricing",
+                    LOCATIONS,
+                    index=LOCATIONS.index("Tamil Nadu"),
+                    key="job_location"
+                )
+            with col_year:
+                job_year = st.selectbox("📅 Price Reference Year", PRICE_YEARS, key="job_year")
+            
             # Animated process button
             col_btn1, col_btn2, col_btn3 = st.columns([1, 2, 1])
             with col_btn2:
                 if st.button("🚀 Process Document", type="primary", use_container_width=True):
-                    # Progress bar animation
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
                     try:
-                        # Initialize parser
-                        status_text.text("🔄 Initializing parser...")
-                        progress_bar.progress(20)
-                        time.sleep(0.3)
-                        
-                        parser = DocumentParser()
-                        
-                        # Extract text
-                        status_text.text("📖 Extracting text from document...")
-                        progress_bar.progress(40)
-                        text = parser.extract_text(uploaded_file)
-                        st.session_state.extracted_text = text
-                        time.sleep(0.3)
-                        
-                        # Identify interventions
-                        status_text.text("🔍 Identifying interventions...")
-                        progress_bar.progress(70)
-                        interventions = parser.identify_interventions(text)
-                        st.session_state.interventions = interventions
-                        st.session_state.upload_completed = True
-                        time.sleep(0.3)
-                        
-                        progress_bar.progress(100)
-                        status_text.empty()
-                        progress_bar.empty()
-                        
-                        st.balloons()
-                        st.success(f"✅ Document processed successfully! Found **{len(interventions)}** interventions.")
-                        time.sleep(1)
+                        # Parsing, matching, pricing and the report run in a
+                        # worker process; the jobs panel below follows progress
+                        job_id = get_job_queue().submit(
+                            uploaded_file.getvalue(),
+                            uploaded_file.name,
+                            location=job_location,
+                            year=job_year
+                        )
+                        st.session_state.setdefault('job_ids', []).append(job_id)
+                        st.session_state.flash = {
+                            'section': 'upload',
+                            'message': f"✅ **{uploaded_file.name}** queued for processing.",
+                            'caption': "You can keep working or upload more documents while it runs.",
+                            'balloons': False
+                        }
                         st.rerun()
                         
                     except Exception as e:
-                        progress_bar.empty()
-                        status_text.empty()
-                        st.error(f"❌ Error processing document: {str(e)}")
+                        st.error(f"❌ Error queueing document: {str(e)}")
+                
+                show_flash('upload')
+        
+        show_flash('jobs')
+        job_status_panel()
     
     with col2:
         st.markdown("""
@@ -478,7 +688,7 @@ def analysis_section():
     with st.expander("📄 Extracted Text Preview"):
         st.text_area(
             "Document Text",
-            st.session_state.get('extracted_text', '')[:1000] + "...",
+            st.session_state.get('extracted_text', '')[:TEXT_PREVIEW_CHARS] + "...",
             height=200,
             disabled=True
         )
@@ -509,16 +719,15 @@ def analysis_section():
             
             try:
                 status_text.text("🔄 Loading IRC database...")
-                progress_bar.progress(25)
-                time.sleep(0.3)
-                
                 matcher = MatchingEngine()
+                progress_bar.progress(10)
                 
-                status_text.text("🔍 Matching interventions with standards...")
-                progress_bar.progress(50)
-                time.sleep(0.3)
-                
-                matched_data = matcher.match_standards(interventions)
+                matched_data = matcher.match_standards_batch(
+                    interventions,
+                    progress=stage_progress(
+                        progress_bar, status_text, "🔍 Matching intervention types with standards", 10, 100
+                    )
+                )
                 st.session_state.matched_data = matched_data
                 st.session_state.match_completed = True
                 
@@ -526,14 +735,23 @@ def analysis_section():
                 status_text.empty()
                 progress_bar.empty()
                 
-                st.balloons()
-                st.success("✅ Standards matched successfully!")
-                time.sleep(1)
+                match_cache = matcher.get_match_cache_info()
+                st.session_state.flash = {
+                    'section': 'analysis',
+                    'message': "✅ Standards matched successfully!",
+                    'caption': (
+                        f"Match cache: {match_cache['hit_rate']:.0%} hit rate · "
+                        f"{match_cache['hits']} hits / {match_cache['misses']} misses · "
+                        f"{match_cache['size']} distinct types"
+                    )
+                }
                 st.rerun()
             except Exception as e:
                 progress_bar.empty()
                 status_text.empty()
                 st.error(f"❌ Error matching standards: {str(e)}")
+        
+        show_flash('analysis')
     
     # Display interventions table with better styling
     if interventions:
@@ -608,27 +826,22 @@ def pricing_section():
             <h3 style='color: #667eea; text-align: center; margin-bottom: 1.5rem;'>🎯 Configure Pricing Parameters</h3>
     """, unsafe_allow_html=True)
     
+    # Start from the pricing of the current estimate, e.g. one a background job made
+    estimate = st.session_state.get('priced_estimate')
     col1, col2 = st.columns(2)
     with col1:
         location = st.selectbox(
             "📍 Select Location/State",
-            [
-                "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh",
-                "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand",
-                "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur",
-                "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab",
-                "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura",
-                "Uttar Pradesh", "Uttarakhand", "West Bengal",
-                "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
-                "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry"
-            ],
+            LOCATIONS,
+            index=LOCATIONS.index(estimate.location) if estimate is not None and estimate.location in LOCATIONS else 0,
             help="Pricing varies by location"
         )
     
     with col2:
         price_year = st.selectbox(
             "📅 Price Reference Year",
-            [2024, 2023, 2022, 2021],
+            PRICE_YEARS,
+            index=PRICE_YEARS.index(estimate.year) if estimate is not None and estimate.year in PRICE_YEARS else 0,
             help="Inflation adjustments will be applied"
         )
     
@@ -641,35 +854,34 @@ def pricing_section():
             status_text = st.empty()
             
             try:
-                status_text.text("🔄 Initializing price calculator...")
-                progress_bar.progress(20)
-                time.sleep(0.3)
-                
-                fetcher = PriceFetcher(location=location, year=price_year)
-                
-                status_text.text(f"📍 Applying {location} pricing...")
-                progress_bar.progress(50)
-                time.sleep(0.3)
+                # Reuse the estimate for these matches: a location or year
+                # change only rescales it instead of re-pricing from scratch
+                estimate = st.session_state.get('priced_estimate')
+                rows_progress = stage_progress(
+                    progress_bar, status_text, f"💰 Applying {location} pricing with GST", 0, 100
+                )
                 
-                status_text.text("💰 Calculating costs with GST...")
-                progress_bar.progress(80)
-                priced_data = fetcher.calculate_costs(matched_data)
-                st.session_state.priced_data = priced_data
+                if estimate is not None and estimate.matched_data is matched_data:
+                    estimate.rescale(location, price_year, progress=rows_progress)
+                else:
+                    estimate = PricedEstimate(matched_data, location=location, year=price_year,
+                                              progress=rows_progress)
+                st.session_state.priced_estimate = estimate
+                st.session_state.priced_data = estimate.records
                 st.session_state.price_completed = True
-                time.sleep(0.3)
                 
                 progress_bar.progress(100)
                 status_text.empty()
                 progress_bar.empty()
                 
-                st.balloons()
-                st.success("✅ Prices calculated successfully!")
-                time.sleep(1)
+                st.session_state.flash = {'section': 'pricing', 'message': "✅ Prices calculated successfully!"}
                 st.rerun()
             except Exception as e:
                 progress_bar.empty()
                 status_text.empty()
                 st.error(f"❌ Error calculating prices: {str(e)}")
+        
+        show_flash('pricing')
     
     # Display priced data
     if 'priced_data' in st.session_state:
@@ -688,27 +900,64 @@ def pricing_section():
         """, unsafe_allow_html=True)
         
         priced_df = pd.DataFrame(st.session_state.priced_data)
-        
-        # Add total row
-        total_cost = priced_df['total_cost'].sum() if 'total_cost' in priced_df.columns else 0
-        total_with_gst = priced_df['total_with_gst'].sum() if 'total_with_gst' in priced_df.columns else 0
+        estimate = st.session_state.get('priced_estimate')
+        summary = get_price_summary()
         
         # Animated metrics
         st.markdown("<br>", unsafe_allow_html=True)
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("📦 Total Items", len(priced_df))
+            st.metric("📦 Total Items", summary.total_items)
         with col2:
-            st.metric("💵 Subtotal", f"₹{total_cost/100000:.2f}L")
+            st.metric("💵 Subtotal", f"₹{summary.subtotal/100000:.2f}L")
         with col3:
-            st.metric("💰 With GST", f"₹{total_with_gst/100000:.2f}L")
+            st.metric("💰 With GST", f"₹{summary.grand_total/100000:.2f}L")
         with col4:
-            avg_cost = total_cost / len(priced_df) if len(priced_df) > 0 else 0
-            st.metric("📊 Avg/Item", f"₹{avg_cost/1000:.1f}K")
+            st.metric("📊 Avg/Item", f"₹{summary.average_cost_per_item/1000:.1f}K")
         
         st.markdown("<br>", unsafe_allow_html=True)
         
-        st.dataframe(priced_df, use_container_width=True, height=400)
+        if estimate is not None:
+            # Quantities are editable; an edit re-prices only that row
+            edited_df = st.data_editor(
+                priced_df,
+                use_container_width=True,
+                height=400,
+                disabled=[column for column in priced_df.columns if column != 'quantity'],
+                key=f"priced_editor_{id(estimate)}"
+            )
+            edited_quantities = edited_df['quantity'].to_numpy(dtype=float)
+            changed_rows = np.flatnonzero((edited_quantities != estimate.quantities) & ~np.isnan(edited_quantities))
+            for row in changed_rows:
+                estimate.update_quantity(int(row), float(edited_quantities[row]))
+            if len(changed_rows):
+                st.rerun()
+        else:
+            st.dataframe(priced_df, use_container_width=True, height=400)
+    
+    # Compare the same project across states and price years
+    st.markdown("<br>", unsafe_allow_html=True)
+    with st.expander("🗺️ Compare Locations & Years"):
+        scenario_fetcher = PriceFetcher(location=location, year=price_year)
+        col1, col2 = st.columns(2)
+        with col1:
+            scenario_locations = st.multiselect(
+                "📍 Locations",
+                list(scenario_fetcher.price_adjustment_factors),
+                default=list(scenario_fetcher.price_adjustment_factors)
+            )
+        with col2:
+            scenario_years = st.multiselect("📅 Price Years", [2024, 2023, 2022, 2021], default=[price_year])
+        
+        if scenario_locations and scenario_years:
+            scenarios = scenario_fetcher.price_scenarios(
+                matched_data,
+                [(scenario_location, year) for scenario_location in scenario_locations for year in scenario_years]
+            )
+            comparison = scenarios.pivot(index='location', columns='price_year', values='total_with_gst') / 100000
+            comparison = comparison.loc[scenario_locations, sorted(scenario_years, reverse=True)]
+            comparison.columns = [f"{year} (₹ Lakhs, incl. GST)" for year in comparison.columns]
+            st.dataframe(comparison.round(2), use_container_width=True, height=400)
 
 def report_section():
     st.markdown("""
@@ -771,34 +1020,23 @@ def report_section():
             status_text = st.empty()
             
             try:
-                status_text.text("📝 Initializing report generator...")
-                progress_bar.progress(20)
-                time.sleep(0.3)
-                
                 generator = ReportGenerator()
                 
-                status_text.text("📊 Creating cost breakdown...")
-                progress_bar.progress(40)
-                time.sleep(0.3)
-                
-                status_text.text("📚 Adding IRC citations...")
-                progress_bar.progress(60)
-                time.sleep(0.3)
-                
-                status_text.text("🎨 Formatting report...")
-                progress_bar.progress(80)
-                
-                report_path = generator.generate_report(
+                # Rendered in memory: the download button and the email
+                # attachment both use these bytes, and no file is written
+                report_pdf = generator.render_report(
                     data=priced_data,
                     title=report_title,
                     project_name=project_name,
                     consultant=consultant_name,
                     date=str(report_date),
                     include_citations=include_citations,
-                    include_charts=include_charts
+                    include_charts=include_charts,
+                    summary=get_price_summary(),
+                    progress=stage_progress(progress_bar, status_text, "📝 Writing report sections", 0, 100)
                 )
                 
-                st.session_state.report_path = report_path
+                st.session_state.report_pdf = report_pdf
                 st.session_state.report_completed = True
                 st.session_state.project_name = project_name
                 st.session_state.report_date = report_date
@@ -817,24 +1055,24 @@ def report_section():
                 st.error(f"❌ Error generating report: {str(e)}")
         
         # Show download and email options if report was generated
-        if st.session_state.get('report_completed') and st.session_state.get('report_path'):
-            report_path = st.session_state.report_path
+        if st.session_state.get('report_completed') and st.session_state.get('report_pdf'):
+            report_pdf = st.session_state.report_pdf
             project_name = st.session_state.get('project_name', 'Road Safety Project')
             report_date = st.session_state.get('report_date', 'Unknown')
             consultant_name = st.session_state.get('consultant_name', 'Unknown')
-            priced_data = st.session_state.get('priced_data', [])
+            price_summary = get_price_summary()
             
             # Download button
             st.markdown("<br>", unsafe_allow_html=True)
-            with open(report_path, 'rb') as f:
-                st.download_button(
-                    label="📥 Download Report (PDF)",
-                    data=f,
-                    file_name=f"road_safety_report_{report_date}.pdf",
-                    mime="application/pdf",
-                    use_container_width=True,
-                    key="download_report_btn"
-                )
+            report_file_name = f"road_safety_report_{report_date}.pdf"
+            st.download_button(
+                label="📥 Download Report (PDF)",
+                data=report_pdf,
+                file_name=report_file_name,
+                mime="application/pdf",
+                use_container_width=True,
+                key="download_report_btn"
+            )
             
             # Email Sharing Section - Professional Design
             st.markdown("<br><br>", unsafe_allow_html=True)
@@ -888,7 +1126,7 @@ def report_section():
                 with col1:
                     email_address = st.text_input(
                         "Recipient Email",
-                        placeholder="Enter recipient's email address",
+                        placeholder="Enter recipient email addresses, separated by commas",
                         label_visibility="collapsed",
                         key="recipient_email"
                     )
@@ -901,7 +1139,10 @@ def report_section():
                     )
                 
                 if send_button:
-                    if email_address:
+                    recipients = [
+                        address.strip() for address in re.split(r'[,;\s]+', email_address) if address.strip()
+                    ]
+                    if recipients:
                         # Email subject and body with HTML formatting
                         subject = f"Road Safety Cost Estimate Report - {project_name}"
                         body = f"""<html>
@@ -932,8 +1173,8 @@ def report_section():
                 <div class="info-item"><span class="info-label">• Project Name:</span> {project_name}</div>
                 <div class="info-item"><span class="info-label">• Report Date:</span> {report_date}</div>
                 <div class="info-item"><span class="info-label">• Consultant:</span> {consultant_name}</div>
-                <div class="info-item"><span class="info-label">• Total Items:</span> {len(priced_data)}</div>
-                <div class="info-item"><span class="info-label">• Estimated Cost:</span> ₹{sum(item.get('total_with_gst', 0) for item in priced_data)/100000:.2f} Lakhs</div>
+                <div class="info-item"><span class="info-label">• Total Items:</span> {price_summary.total_items}</div>
+                <div class="info-item"><span class="info-label">• Estimated Cost:</span> ₹{price_summary.grand_total/100000:.2f} Lakhs</div>
             </div>
             
             <hr>
@@ -953,24 +1194,25 @@ def report_section():
 </body>
 </html>"""
                         
-                        with st.spinner("📨 Sending email..."):
-                            success, msg = notification_service.send_email(
-                                email_address,
+                        if notification_service.is_email_configured():
+                            # Queued instantly; the outbox sender delivers and retries in the background
+                            message_ids = get_email_outbox().submit(
+                                recipients,
                                 subject,
                                 body,
-                                report_path
+                                pdf_data=report_pdf,
+                                pdf_name=report_file_name
                             )
-                            
-                            if success:
-                                st.success(f"✅ Email sent successfully to **{email_address}**", icon="✅")
-                                st.balloons()
-                            else:
-                                st.error(f"❌ Failed to send email: {msg}", icon="❌")
-                                if not config['email']['configured']:
-                                    st.info("💡 **Setup Required:** Configure Gmail SMTP in `.env` file. Click 'Setup Guide' above for instructions.", icon="💡")
+                            st.session_state.outbox_ids = message_ids + st.session_state.get('outbox_ids', [])
+                            st.success(f"📨 Email queued for **{', '.join(recipients)}**", icon="📨")
+                        else:
+                            st.error("❌ Failed to send email: SMTP credentials not configured.", icon="❌")
+                            st.info("💡 **Setup Required:** Configure Gmail SMTP in `.env` file. Click 'Setup Guide' above for instructions.", icon="💡")
                     else:
                         st.warning("⚠️ Please enter a valid email address", icon="⚠️")
                 
+                email_status_panel()
+                
                 # Footer info - subtle
                 st.markdown("""
                     <div style='
@@ -1008,10 +1250,11 @@ def report_section():
             if include_charts:
                 import plotly.express as px
                 
-                if 'category' in df.columns and 'total_cost' in df.columns:
+                category_costs = get_price_summary().category_frame().reset_index()
+                if len(category_costs):
                     st.markdown("<br>", unsafe_allow_html=True)
                     fig = px.pie(
-                        df, 
+                        category_costs, 
                         values='total_cost', 
                         names='category',
                         title='Cost Distribution by Category',
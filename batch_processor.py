@@ -0,0 +1,253 @@
+"""
+Batch Processor for Road Safety Estimator
+Headless pipeline that parses, matches, prices and reports a whole
+directory of audit reports, one document per worker process
+
+Usage:
+    python batch_processor.py reports/ "archive/2024/*.pdf" --output batch_output --workers 8
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from document_parser import DocumentParser, PARSER_VERSION
+from matching_engine import MatchingEngine
+from price_fetcher import PriceFetcher, PriceSummary
+from report_generator import ReportGenerator
+from standards_store import get_standards_store
+
+# Document formats DocumentParser can read
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+# Pipeline stages of each worker process, built once per worker
+_worker_pipeline = None
+
+
+def _init_worker(database_path: str, location: str, year: int, write_pdf: bool):
+    """Build the parser, matcher and pricer once per worker process"""
+    global _worker_pipeline
+    _worker_pipeline = BatchPipeline(database_path, location, year, write_pdf)
+
+
+def _process_in_worker(job: Dict) -> Dict:
+    return _worker_pipeline.process(**job)
+
+
+class BatchPipeline:
+    """
+    DocumentParser -> MatchingEngine -> PriceFetcher -> ReportGenerator for
+    one document at a time, writing an Excel estimate and a PDF report
+    """
+    
+    def __init__(self, database_path: str = 'GPT_Input_DB.xlsx', location: str = "Tamil Nadu",
+                 year: int = 2024, write_pdf: bool = True):
+        """
+        Args:
+            database_path: IRC standards workbook
+            location: State/UT used for pricing
+            year: Price reference year
+            write_pdf: Also render the PDF report (the slowest stage)
+        """
+        self.parser = DocumentParser()
+        self.matcher = MatchingEngine(database_path)
+        self.fetcher = PriceFetcher(location=location, year=year)
+        self.write_pdf = write_pdf
+    
+    def process(self, source: str, output_stem: str) -> Dict:
+        """
+        Run every stage on one document
+        
+        Returns:
+            Dict: Manifest entry with counts, totals, output paths and timing,
+                or the error if the document failed
+        """
+        start = time.perf_counter()
+        entry = {'source': source, 'status': 'ok'}
+        try:
+            with open(source, 'rb') as file:
+                interventions = self.parser.extract_intervention_table(file)
+            priced = self.fetcher.calculate_costs_table(self.matcher.match_standards_table(interventions))
+            summary = PriceSummary(priced)
+            
+            entry['excel'] = self.fetcher.export_to_excel(priced, f"{output_stem}.xlsx")
+            if self.write_pdf:
+                entry['pdf'] = ReportGenerator().generate_report(
+                    data=priced,
+                    project_name=os.path.splitext(os.path.basename(source))[0],
+                    summary=summary,
+                    output_path=f"{output_stem}.pdf"
+                )
+            
+            entry.update(
+                interventions=len(interventions),
+                matched=summary.total_items,
+                total_cost=summary.subtotal,
+                total_with_gst=summary.grand_total
+            )
+        except Exception as e:
+            entry.update(status='error', error=f"{type(e).__name__}: {e}")
+        
+        entry['seconds'] = round(time.perf_counter() - start, 3)
+        return entry
+
+
+def _run_pool(jobs: List[Dict], workers: int, initargs: tuple, record: Callable[[Dict], None]) -> List[Dict]:
+    """
+    Process jobs on a fresh pool, recording each finished entry
+    
+    Returns:
+        list: Jobs lost because a worker process died, in submission order
+    """
+    lost = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        futures = {executor.submit(_process_in_worker, job): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            try:
+                record(future.result())
+            except BrokenProcessPool:
+                lost.append(futures[future])
+    return [jobs[index] for index in sorted(lost)]
+
+
+def find_documents(patterns: List[str]) -> List[str]:
+    """Supported documents in the given directories, files or glob patterns, in sorted order"""
+    documents = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*')
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS):
+                documents.add(os.path.abspath(path))
+    return sorted(documents)
+
+
+def _output_stems(documents: List[str], output_dir: str) -> List[str]:
+    """One output path stem per document, numbering repeated file names"""
+    stems = []
+    used = set()
+    for path in documents:
+        name = os.path.splitext(os.path.basename(path))[0]
+        stem, n = name, 1
+        while stem in used:
+            n += 1
+            stem = f"{name}_{n}"
+        used.add(stem)
+        stems.append(os.path.join(output_dir, stem))
+    return stems
+
+
+def run_batch(documents: List[str], output_dir: str, database_path: str = 'GPT_Input_DB.xlsx',
+              location: str = "Tamil Nadu", year: int = 2024, workers: int = None,
+              write_pdf: bool = True) -> Dict:
+    """
+    Process documents across a pool of worker processes and write
+    manifest.json to output_dir
+    
+    Returns:
+        Dict: The run manifest
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    jobs = [
+        {'source': source, 'output_stem': stem}
+        for source, stem in zip(documents, _output_stems(documents, output_dir))
+    ]
+    
+    # Load the standards once here: this writes the Feather snapshot if it is
+    # missing, so every worker memory-maps the same file instead of parsing Excel
+    store = get_standards_store()
+    store.load(database_path)
+    
+    started = datetime.now()
+    start = time.perf_counter()
+    entries = []
+    
+    def record(entry: Dict):
+        entries.append(entry)
+        detail = f"{entry['matched']} items, Rs. {entry['total_with_gst']:,.2f}" \
+            if entry['status'] == 'ok' else entry['error']
+        print(f"[{len(entries)}/{len(jobs)}] {entry['source']}: {detail} ({entry['seconds']:.2f}s)")
+    
+    if workers == 1 or len(jobs) <= 1:
+        pipeline = BatchPipeline(database_path, location, year, write_pdf)
+        for job in jobs:
+            record(pipeline.process(**job))
+    else:
+        # A worker that dies (segfault, out of memory) breaks the pool and
+        # every unfinished job with it, so the culprit is unknown. Those jobs
+        # are rerun on a one-worker pool, where the first job lost is the one
+        # that killed it: it is recorded as failed and the pool rebuilt for
+        # the rest
+        initargs = (database_path, location, year, write_pdf)
+        pending = _run_pool(jobs, min(workers, len(jobs)), initargs, record)
+        while pending:
+            pending = _run_pool(pending, 1, initargs, record)
+            if pending:
+                record({'source': pending[0]['source'], 'status': 'error',
+                        'error': "BrokenProcessPool: worker process died", 'seconds': 0.0})
+                pending = pending[1:]
+    
+    elapsed = time.perf_counter() - start
+    entries.sort(key=lambda entry: entry['source'])
+    manifest = {
+        'started': started.isoformat(timespec='seconds'),
+        'elapsed_seconds': round(elapsed, 3),
+        'documents': len(entries),
+        'succeeded': sum(entry['status'] == 'ok' for entry in entries),
+        'failed': sum(entry['status'] != 'ok' for entry in entries),
+        'documents_per_second': round(len(entries) / elapsed, 3) if elapsed else None,
+        'workers': workers,
+        'location': location,
+        'price_year': year,
+        'database': database_path,
+        'database_version': store.get_version(database_path) or 'default',
+        'parser_version': PARSER_VERSION,
+        'results': entries
+    }
+    
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process a batch of road safety audit reports without the UI")
+    parser.add_argument('inputs', nargs='+', help="documents, directories or glob patterns (.pdf, .docx, .txt)")
+    parser.add_argument('--output', default='batch_output', help="directory for estimates, reports and manifest.json")
+    parser.add_argument('--database', default='GPT_Input_DB.xlsx', help="IRC standards workbook")
+    parser.add_argument('--location', default="Tamil Nadu", help="state/UT used for pricing")
+    parser.add_argument('--year', type=int, default=2024, help="price reference year")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--no-pdf', action='store_true', help="write Excel estimates only")
+    args = parser.parse_args()
+    
+    documents = find_documents(args.inputs)
+    if not documents:
+        parser.exit(1, f"No {'/'.join(SUPPORTED_EXTENSIONS)} documents found in: {' '.join(args.inputs)}\n")
+    
+    manifest = run_batch(
+        documents, args.output,
+        database_path=args.database,
+        location=args.location,
+        year=args.year,
+        workers=args.workers,
+        write_pdf=not args.no_pdf
+    )
+    
+    throughput = manifest['documents_per_second']
+    print(f"Processed {manifest['documents']} documents ({manifest['failed']} failed) "
+          f"in {manifest['elapsed_seconds']:.2f}s"
+          + (f": {throughput:.2f} documents/second" if throughput is not None else ""))
+    print(f"Manifest written to: {os.path.join(args.output, 'manifest.json')}")
+
+
+if __name__ == '__main__':
+    main()
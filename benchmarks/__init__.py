@@ -0,0 +1,6 @@
+"""
+Performance benchmarks for the Road Safety Estimator pipeline.
+
+Run individual benchmarks from the project root, e.g.:
+    python -m benchmarks.bench_keyword_index
+"""
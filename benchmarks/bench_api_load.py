@@ -0,0 +1,142 @@
+"""
+Load test: latency percentiles and throughput of the API server's
+endpoints under concurrent keep-alive clients.
+
+Starts a local api_server instance on a free port unless --url points at
+one that is already running.
+
+Usage:
+    python -m benchmarks.bench_api_load [--url http://127.0.0.1:8765] [--workers 4]
+        [--concurrency 16] [--requests 400] [--lines 500] [--pdf-pages 0]
+        [--endpoints estimate parse match price health]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.bench_keyword_index import make_document
+from benchmarks.bench_parallel_pdf import make_pdf
+
+
+async def _request(reader, writer, method: str, path: str, body: bytes = b"",
+                   content_type: str = 'application/octet-stream'):
+    """One HTTP/1.1 request on an open keep-alive connection: (status, body)"""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+    status = int(head.split(' ', 2)[1])
+    length = next(
+        int(line.split(':', 1)[1]) for line in head.split('\r\n') if line.lower().startswith('content-length:')
+    )
+    return status, await reader.readexactly(length)
+
+
+async def _run_endpoint(host: str, port: int, request: tuple, concurrency: int, total: int):
+    """Send total copies of request from concurrency clients; returns latencies and statuses"""
+    latencies, statuses = [], {}
+    remaining = total
+
+    async def client():
+        nonlocal remaining
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, *request)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(concurrency, total))))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def _load_test(host: str, port: int, args):
+    if args.pdf_pages:
+        document, file_name = make_pdf(args.pdf_pages), 'audit.pdf'
+    else:
+        document, file_name = make_document(args.lines).encode('utf-8'), 'audit.txt'
+
+    # Build the match and price payloads from the server's own answers
+    reader, writer = await asyncio.open_connection(host, port)
+    _, parsed = await _request(reader, writer, 'POST', f'/parse?file_name={file_name}', document)
+    interventions = json.loads(parsed)['interventions']
+    match_body = json.dumps({'interventions': interventions}).encode('utf-8')
+    _, matched = await _request(reader, writer, 'POST', '/match', match_body, 'application/json')
+    price_body = json.dumps({'matched': json.loads(matched)['matched'], 'location': 'Kerala', 'year': 2023})
+    writer.close()
+
+    requests = {
+        'health': ('GET', '/health'),
+        'parse': ('POST', f'/parse?file_name={file_name}', document),
+        'match': ('POST', '/match', match_body, 'application/json'),
+        'price': ('POST', '/price', price_body.encode('utf-8'), 'application/json'),
+        'estimate': ('POST', f'/estimate?file_name={file_name}&location=Kerala&year=2023', document)
+    }
+
+    print(f"{file_name}: {len(document) / 1024:.0f} KB, {len(interventions)} interventions; "
+          f"{args.concurrency} clients x {args.requests} requests per endpoint")
+    print(f"{'endpoint':>10} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9}  statuses")
+    for endpoint in args.endpoints:
+        await _run_endpoint(host, port, requests[endpoint], args.concurrency, args.concurrency)  # warm-up
+        latencies, statuses, elapsed = await _run_endpoint(
+            host, port, requests[endpoint], args.concurrency, args.requests
+        )
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        p99 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.99))]
+        print(f"{endpoint:>10} {statistics.median(latencies_ms):>9.1f} {p99:>9.1f} "
+              f"{len(latencies) / elapsed:>9.1f}  {dict(sorted(statuses.items()))}")
+
+
+def _start_server(workers: int):
+    """Launch api_server on a free port; returns the process and its port"""
+    command = [sys.executable, 'api_server.py', '--port', '0']
+    if workers:
+        command += ['--workers', str(workers)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    for line in server.stdout:
+        if 'listening on' in line:
+            return server, urlsplit(line.split('listening on ')[1].split()[0]).port
+    raise RuntimeError("api_server exited before listening")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--url', default=None, help="running server (default: start one)")
+    arg_parser.add_argument('--workers', type=int, default=None)
+    arg_parser.add_argument('--concurrency', type=int, default=16)
+    arg_parser.add_argument('--requests', type=int, default=400)
+    arg_parser.add_argument('--lines', type=int, default=500, help="lines of the TXT test document")
+    arg_parser.add_argument('--pdf-pages', type=int, default=0, help="send a PDF of this many pages instead")
+    arg_parser.add_argument('--endpoints', nargs='+', default=['health', 'parse', 'match', 'price', 'estimate'])
+    args = arg_parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port
+    else:
+        server, port = _start_server(args.workers)
+        host = '127.0.0.1'
+    try:
+        asyncio.run(_load_test(host, port, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: MatchingEngine.match_standards_batch vs. per-row extractOne.
+
+The per-row path is timed on a sample of interventions and extrapolated,
+since a full 10k x 5k run takes minutes; pass --full to time all of it.
+
+Usage:
+    python -m benchmarks.bench_batch_matcher [--interventions 10000] [--standards 5000]
+"""
+
+import argparse
+import logging
+import random
+import time
+
+import pandas as pd
+
+from matching_engine import MatchingEngine
+
+
+WORDS = [
+    'rumble', 'strip', 'speed', 'hump', 'breaker', 'road', 'marking', 'guard', 'rail',
+    'crash', 'barrier', 'street', 'light', 'signage', 'chevron', 'warning', 'regulatory',
+    'sign', 'reflector', 'delineator', 'traffic', 'signal', 'pedestrian', 'crossing',
+    'thermoplastic', 'paint', 'led', 'solar', 'blinker', 'cattle', 'catcher', 'kerb',
+    'median', 'post', 'stud', 'cat', 'eye', 'overhead', 'gantry', 'cantilever',
+]
+
+
+def make_standards(num_rows: int, rng: random.Random) -> pd.DataFrame:
+    """Build a synthetic SOR-style standards table"""
+    names = [' '.join(rng.sample(WORDS, rng.randint(2, 4))).title() for _ in range(num_rows)]
+    return pd.DataFrame({
+        'Intervention Type': names,
+        'IRC Code': [f"IRC:{rng.randint(1, 120)}-20{rng.randint(10, 24)}" for _ in range(num_rows)],
+        'Specification': [f"Item {i} as per specification" for i in range(num_rows)],
+        'Unit': [rng.choice(['m', 'Nos', 'sqm']) for _ in range(num_rows)],
+        'Standard Rate': [rng.randint(100, 250000) for _ in range(num_rows)],
+        'Category': [rng.choice(['Signage', 'Road Marking', 'Safety Barrier']) for _ in range(num_rows)],
+    })
+
+
+def make_interventions(num_items: int, rng: random.Random):
+    """Build interventions with varied free-text types"""
+    return [
+        {
+            'type': ' '.join(rng.sample(WORDS, rng.randint(1, 3))).title(),
+            'description': f"Intervention {i}",
+            'location': f"Km {rng.randint(0, 200)}",
+            'chainage': '',
+            'quantity': float(rng.randint(1, 100)),
+        }
+        for i in range(num_items)
+    ]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--interventions', type=int, default=10_000)
+    arg_parser.add_argument('--standards', type=int, default=5_000)
+    arg_parser.add_argument('--sample', type=int, default=200,
+                            help="interventions timed on the per-row path before extrapolating")
+    arg_parser.add_argument('--full', action='store_true', help="time the per-row path on every intervention")
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(7)
+    # Memo cache off: both paths must do their own scoring to be compared
+    engine = MatchingEngine(match_cache_size=0)
+    engine.irc_database = make_standards(args.standards, rng)
+    engine._choice_index = None
+    interventions = make_interventions(args.interventions, rng)
+
+    start = time.perf_counter()
+    batch = engine.match_standards_batch(interventions)
+    batch_time = time.perf_counter() - start
+
+    sample = interventions if args.full else interventions[:args.sample]
+    start = time.perf_counter()
+    per_row = engine.match_standards(sample)
+    per_row_time = (time.perf_counter() - start) * len(interventions) / len(sample)
+
+    expected_batch = engine.match_standards_batch(sample)
+    assert per_row == expected_batch, "batch results differ from match_standards"
+
+    label = "measured" if args.full else f"extrapolated from {len(sample)}"
+    print(f"{args.interventions} interventions x {args.standards} standards, {len(batch)} matched")
+    print(f"  match_standards (per-row):  {per_row_time:9.2f} s ({label})")
+    print(f"  match_standards_batch:      {batch_time:9.2f} s")
+    print(f"  speedup:                    {per_row_time / batch_time:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: n-gram candidate pruning vs. full-scan fuzzy matching in
+MatchingEngine._find_best_match, with a recall check against the full scan.
+
+Usage:
+    python -m benchmarks.bench_candidate_pruning [--rows 1000 10000 100000] [--queries 100]
+"""
+
+import argparse
+import logging
+import random
+import time
+
+from benchmarks.bench_batch_matcher import make_interventions, make_standards
+from matching_engine import MatchingEngine
+
+
+def _engine(standards, **kwargs) -> MatchingEngine:
+    # Memo cache off so repeated query types are scored every time
+    engine = MatchingEngine(match_cache_size=0, **kwargs)
+    engine.irc_database = standards
+    engine._choice_index = None
+    return engine
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    arg_parser.add_argument('--queries', type=int, default=100)
+    arg_parser.add_argument('--candidate-limit', type=int, default=50)
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(f"{'rows':>8} {'full scan':>10} {'pruned':>9} {'speedup':>8} {'recall':>7}   (seconds per query)")
+    for rows in args.rows:
+        rng = random.Random(rows)
+        standards = make_standards(rows, rng)
+        interventions = make_interventions(args.queries, rng)
+
+        full_scan = _engine(standards, pruning_min_rows=float('inf'))
+        pruned = _engine(standards, pruning_min_rows=0, candidate_limit=args.candidate_limit)
+        pruned._get_ngram_index()  # build the index and score bounds outside the timed loop
+        pruned._score_bounds('')
+
+        start = time.perf_counter()
+        expected = [full_scan._find_best_match(item) for item in interventions]
+        full_time = (time.perf_counter() - start) / len(interventions)
+
+        start = time.perf_counter()
+        actual = [pruned._find_best_match(item) for item in interventions]
+        pruned_time = (time.perf_counter() - start) / len(interventions)
+
+        recall = sum(a == e for a, e in zip(actual, expected)) / len(interventions)
+        print(f"{rows:>8} {full_time:>10.5f} {pruned_time:>9.5f} {full_time / pruned_time:>7.1f}x {recall:>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
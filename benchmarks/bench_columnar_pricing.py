@@ -0,0 +1,63 @@
+"""
+Benchmark: PriceFetcher.calculate_costs_columnar vs. the per-item
+calculate_costs loop, with a check that every figure matches to the paisa.
+
+Usage:
+    python -m benchmarks.bench_columnar_pricing [--items 100000 1000000]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_batch_matcher import make_interventions, make_standards
+from price_fetcher import PriceFetcher
+
+PRICED_COLUMNS = ['adjusted_rate', 'total_cost', 'gst_amount', 'total_with_gst']
+
+
+def make_matched_data(num_items: int, rng: random.Random) -> pd.DataFrame:
+    """Matched line items with rates from a synthetic standards table"""
+    standards = make_standards(500, rng)
+    matched = pd.DataFrame(make_interventions(num_items, rng))
+    rows = [rng.randrange(len(standards)) for _ in range(num_items)]
+    for column in ['Unit', 'IRC Code', 'Specification', 'Standard Rate', 'Category']:
+        matched[column.lower().replace(' ', '_')] = standards[column].to_numpy()[rows]
+    matched = matched.rename(columns={'type': 'intervention_type'})
+    return matched
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--items', type=int, nargs='+', default=[100_000, 1_000_000])
+    arg_parser.add_argument('--location', default='Kerala')
+    arg_parser.add_argument('--year', type=int, default=2021)
+    args = arg_parser.parse_args()
+
+    fetcher = PriceFetcher(location=args.location, year=args.year)
+    print(f"{'items':>9} {'per-item':>9} {'columnar':>9} {'speedup':>8}")
+    for items in args.items:
+        matched = make_matched_data(items, random.Random(items))
+        records = matched.to_dict('records')
+
+        start = time.perf_counter()
+        per_item = fetcher.calculate_costs(records)
+        per_item_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        columnar = fetcher.calculate_costs_columnar(matched)
+        columnar_time = time.perf_counter() - start
+
+        expected = pd.DataFrame(per_item)
+        for column in PRICED_COLUMNS:
+            assert np.array_equal(expected[column].to_numpy(), columnar[column].to_numpy()), \
+                f"{column} differs from calculate_costs"
+
+        print(f"{items:>9} {per_item_time:>8.3f}s {columnar_time:>8.4f}s {per_item_time / columnar_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark: peak memory and time to email one large PDF to many
+recipients, building a MIME message per send as send_email used to
+(read the file, base64 it, flatten per recipient) vs the attachment
+cache with the body streamed from disk (cold and warm cache).
+
+The SMTP server is a local sink that discards message data, so only the
+sender's allocations are traced.
+
+Usage:
+    python -m benchmarks.bench_email_attachment [--mb 50] [--recipients 20]
+"""
+
+import argparse
+import contextlib
+import os
+import smtplib
+import socketserver
+import tempfile
+import threading
+import time
+import tracemalloc
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from notification_service import AttachmentCache, NotificationService, SMTPConnectionPool
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server: accepts every command and throws message data away"""
+
+    def handle(self):
+        self.wfile.write(b"220 sink\r\n")
+        for line in self.rfile:
+            command = line[:4].upper()
+            if command == b'DATA':
+                self.wfile.write(b"354 go ahead\r\n")
+                tail = b""
+                while True:
+                    chunk = self.rfile.read1(1 << 20)
+                    if not chunk:
+                        return
+                    window = tail + chunk
+                    if b"\r\n.\r\n" in window:
+                        break
+                    tail = window[-4:]
+                self.wfile.write(b"250 OK\r\n")
+            elif command == b'EHLO':
+                self.wfile.write(b"250-sink\r\n250 8BITMIME\r\n")
+            elif command == b'QUIT':
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+
+@contextlib.contextmanager
+def sink_server():
+    """Yield the port of a threaded SMTP sink on 127.0.0.1"""
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SinkHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def send_per_message(port: int, pdf_path: str, recipients):
+    """The previous send_email, once per recipient: read, encode and flatten every time"""
+    for recipient in recipients:
+        msg = MIMEMultipart('alternative')
+        msg['From'] = 'estimator@example.org'
+        msg['To'] = recipient
+        msg['Subject'] = "Report"
+        msg.attach(MIMEText("Attached.", 'plain'))
+        with open(pdf_path, 'rb') as f:
+            pdf_attachment = MIMEApplication(f.read(), _subtype='pdf')
+            pdf_attachment.add_header('Content-Disposition', 'attachment', filename=os.path.basename(pdf_path))
+            msg.attach(pdf_attachment)
+        with smtplib.SMTP('127.0.0.1', port, timeout=60) as server:
+            server.send_message(msg)
+
+
+def make_service(port: int, cache_dir: str) -> NotificationService:
+    service = NotificationService(
+        pool=SMTPConnectionPool('127.0.0.1', port, security='none'),
+        attachments=AttachmentCache(cache_dir)
+    )
+    service.smtp_security = 'none'
+    service.smtp_from_email = 'estimator@example.org'
+    return service
+
+
+def send_streamed(service: NotificationService, pdf_path: str, recipients):
+    results = service.send_many(recipients, "Report", "Attached.", pdf_path=pdf_path)
+    assert all(success for success, _ in results.values()), results
+
+
+def send_streamed_cold(port: int, pdf_path: str, recipients):
+    """send_many through a new service with an empty attachment cache"""
+    cache_dir = tempfile.mkdtemp(dir=os.path.dirname(pdf_path))
+    send_streamed(make_service(port, cache_dir), pdf_path, recipients)
+
+
+def measure(function, *args):
+    """(seconds, peak traced MB) of one call; the traced run is slower, so it is not timed"""
+    with contextlib.redirect_stdout(None):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--mb', type=float, default=50, help="attachment size")
+    arg_parser.add_argument('--recipients', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    recipients = [f"reviewer{i}@example.org" for i in range(args.recipients)]
+    with tempfile.TemporaryDirectory() as workdir, sink_server() as port:
+        pdf_path = os.path.join(workdir, 'corridor_report.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+            for _ in range(int(args.mb)):
+                f.write(os.urandom(2**20))
+
+        print(f"{os.path.getsize(pdf_path) / 2**20:.0f} MB attachment to {args.recipients} recipients")
+        print(f"{'mode':>22} {'seconds':>8} {'peak MB':>8}")
+        elapsed, peak = measure(send_per_message, port, pdf_path, recipients)
+        print(f"{'MIME per send':>22} {elapsed:>8.2f} {peak:>8.1f}")
+
+        elapsed, peak = measure(send_streamed_cold, port, pdf_path, recipients)
+        print(f"{'streamed, cold cache':>22} {elapsed:>8.2f} {peak:>8.1f}")
+
+        service = make_service(port, os.path.join(workdir, 'attachments'))
+        with contextlib.redirect_stdout(None):
+            send_streamed(service, pdf_path, recipients[:1])
+        elapsed, peak = measure(send_streamed, service, pdf_path, recipients)
+        print(f"{'streamed, warm cache':>22} {elapsed:>8.2f} {peak:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: columnar InterventionTable pipeline vs. the list-of-dicts
+pipeline through matching, pricing and aggregation.
+
+Reports wall time per stage (untraced run) and peak traced memory of each
+pipeline (separate tracemalloc run), starting from the same parsed
+interventions. Types are fuzzy-scored once up front into the match memo
+cache, since scoring is shared by both pipelines and would dominate both;
+the comparison is of data handling. Report rendering is left out: a
+1M-row PDF is dominated by FPDF itself.
+
+Usage:
+    python -m benchmarks.bench_intervention_table [--interventions 1000000] [--standards 2000]
+"""
+
+import argparse
+import gc
+import logging
+import random
+import time
+import tracemalloc
+
+from benchmarks.bench_batch_matcher import make_interventions, make_standards
+from intervention_table import INTERVENTION_COLUMNS, InterventionTable
+from matching_engine import MatchingEngine
+from price_fetcher import PriceFetcher, PriceSummary
+
+
+def _dict_pipeline(engine, fetcher, interventions, timings):
+    start = time.perf_counter()
+    matched = engine.match_standards_batch(interventions)
+    timings['match'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    priced = fetcher.calculate_costs(matched)
+    timings['price'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = PriceSummary(priced)
+    timings['summary'] = time.perf_counter() - start
+    return priced, summary
+
+
+def _table_pipeline(engine, fetcher, table, timings):
+    start = time.perf_counter()
+    matched = engine.match_standards_table(table)
+    timings['match'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    priced = fetcher.calculate_costs_table(matched)
+    timings['price'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = PriceSummary(priced)
+    timings['summary'] = time.perf_counter() - start
+    return priced, summary
+
+
+def _peak_memory(func, *args) -> int:
+    """Peak bytes allocated while func runs (results kept alive until the end)"""
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--interventions', type=int, default=1_000_000)
+    arg_parser.add_argument('--standards', type=int, default=2_000)
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(11)
+    interventions = make_interventions(args.interventions, rng)
+    for intervention in interventions:
+        intervention['unit'] = ''
+    types = {intervention['type'] for intervention in interventions}
+
+    engine = MatchingEngine(match_cache_size=len(types))
+    engine.irc_database = make_standards(args.standards, rng)
+    engine.database_version = 'synthetic'  # keeps its memo entries apart from the real database's
+    engine._choice_index = None
+    engine.match_standards_batch(interventions)
+    fetcher = PriceFetcher(location='Kerala', year=2022)
+
+    records_memory = _peak_memory(lambda: [dict(item) for item in interventions])
+    table_memory = _peak_memory(InterventionTable.from_records, interventions, INTERVENTION_COLUMNS)
+    table = InterventionTable.from_records(interventions, INTERVENTION_COLUMNS)
+
+    dict_timings, table_timings = {}, {}
+    dict_priced, dict_summary = _dict_pipeline(engine, fetcher, interventions, dict_timings)
+    table_priced, table_summary = _table_pipeline(engine, fetcher, table, table_timings)
+    assert dict_summary.to_dict() == table_summary.to_dict(), "pipelines disagree on totals"
+    assert len(dict_priced) == len(table_priced)
+    del dict_priced, table_priced
+
+    dict_peak = _peak_memory(lambda: _dict_pipeline(engine, fetcher, interventions, {}))
+    table_peak = _peak_memory(lambda: _table_pipeline(engine, fetcher, table, {}))
+
+    print(f"{args.interventions} interventions x {args.standards} standards, "
+          f"{dict_summary.total_items} matched")
+    print(f"{'stage':>10} {'dicts':>10} {'table':>10} {'speedup':>8}")
+    for stage in ('match', 'price', 'summary'):
+        print(f"{stage:>10} {dict_timings[stage]:>9.3f}s {table_timings[stage]:>9.3f}s "
+              f"{dict_timings[stage] / table_timings[stage]:>7.1f}x")
+    dict_total, table_total = sum(dict_timings.values()), sum(table_timings.values())
+    print(f"{'total':>10} {dict_total:>9.3f}s {table_total:>9.3f}s {dict_total / table_total:>7.1f}x")
+    print(f"{'throughput':>10} {args.interventions / dict_total:>9,.0f}/s {args.interventions / table_total:>9,.0f}/s")
+    print(f"container memory: dicts {records_memory / 2**20:8.1f} MB, table {table_memory / 2**20:8.1f} MB")
+    print(f"pipeline peak:    dicts {dict_peak / 2**20:8.1f} MB, table {table_peak / 2**20:8.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark: keyword index vs. the original nested keyword loop in
+DocumentParser.identify_interventions.
+
+Usage:
+    python -m benchmarks.bench_keyword_index [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import random
+import time
+
+from document_parser import DocumentParser
+
+
+FILLER_LINES = [
+    "The carriageway width is 7.0 m with earthen shoulders on both sides.",
+    "Traffic volume observed during the survey was moderate.",
+    "Visibility at the junction is restricted by roadside vegetation.",
+    "Refer to annexure for photographs of the site.",
+    "",
+    "Page 12",
+]
+
+
+def make_document(num_lines: int, density: float = 0.2, seed: int = 42) -> str:
+    """Build a synthetic audit report with the given share of intervention lines"""
+    rng = random.Random(seed)
+    keywords = DocumentParser().intervention_keywords
+    lines = []
+    for i in range(num_lines):
+        if rng.random() < density:
+            keyword = rng.choice(keywords)
+            lines.append(
+                f"Provide {keyword} at km {rng.randint(0, 200)}.{rng.randint(0, 9)} "
+                f"chainage {rng.randint(0, 200)}+{rng.randint(0, 999):03d} - "
+                f"{rng.randint(1, 500)} nos (item {i})"
+            )
+        else:
+            lines.append(rng.choice(FILLER_LINES))
+    return "\n".join(lines)
+
+
+def identify_interventions_nested(parser: DocumentParser, text: str):
+    """The original per-line, per-keyword substring scan"""
+    interventions = []
+    lines = text.split('\n')
+
+    for i, line in enumerate(lines):
+        line_lower = line.lower()
+        if len(line.strip()) < 10:
+            continue
+        for keyword in parser.intervention_keywords:
+            if keyword in line_lower:
+                intervention = {
+                    'type': _identify_type_nested(parser, line),
+                    'description': line.strip(),
+                    'location': parser._extract_location(line),
+                    'chainage': parser._extract_chainage(line),
+                    'quantity': parser._extract_quantity(line),
+                    'unit': parser._extract_unit(line),
+                }
+                if intervention['description']:
+                    interventions.append(intervention)
+                break
+
+    unique_interventions = []
+    seen_descriptions = set()
+    for intervention in interventions:
+        desc = intervention['description'].strip().lower()
+        if desc not in seen_descriptions and len(desc) > 10:
+            seen_descriptions.add(desc)
+            unique_interventions.append(intervention)
+    return unique_interventions
+
+
+def _identify_type_nested(parser: DocumentParser, line: str) -> str:
+    line_lower = line.lower()
+    for keyword in parser.intervention_keywords:
+        if keyword in line_lower:
+            return keyword.title()
+    return "Other"
+
+
+def keyword_scan_nested(parser: DocumentParser, text: str) -> int:
+    """Keyword detection only (no detail extraction), original algorithm"""
+    hits = 0
+    for line in text.split('\n'):
+        line_lower = line.lower()
+        if len(line.strip()) < 10:
+            continue
+        for keyword in parser.intervention_keywords:
+            if keyword in line_lower:
+                hits += 1
+                break
+        else:
+            continue
+        # the original rescans the keyword list to pick the type
+        _identify_type_nested(parser, line)
+    return hits
+
+
+def keyword_scan_indexed(parser: DocumentParser, text: str) -> int:
+    """Keyword detection only (no detail extraction), indexed algorithm"""
+    lines = text.split('\n')
+    return sum(
+        1 for i, _ in parser._first_keyword_per_line(text)
+        if len(lines[i].strip()) >= 10
+    )
+
+
+def _time(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    arg_parser.add_argument('--density', type=float, default=0.2)
+    args = arg_parser.parse_args()
+
+    parser = DocumentParser()
+    print(f"{'lines':>10} {'stage':<22} {'nested (s)':>11} {'indexed (s)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        text = make_document(size, args.density)
+
+        nested_scan, nested_hits = _time(keyword_scan_nested, parser, text)
+        indexed_scan, indexed_hits = _time(keyword_scan_indexed, parser, text)
+        assert nested_hits == indexed_hits, "keyword hit counts differ"
+        print(f"{size:>10} {'keyword detection':<22} {nested_scan:>11.3f} {indexed_scan:>12.3f} "
+              f"{nested_scan / indexed_scan:>7.1f}x")
+
+        nested_full, expected = _time(identify_interventions_nested, parser, text)
+        indexed_full, actual = _time(parser.identify_interventions, text)
+        assert expected == actual, "identify_interventions output differs"
+        print(f"{size:>10} {'identify_interventions':<22} {nested_full:>11.3f} {indexed_full:>12.3f} "
+              f"{nested_full / indexed_full:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
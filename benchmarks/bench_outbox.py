@@ -0,0 +1,75 @@
+"""
+Throughput test: queue thousands of emails in the outbox and time how
+fast they are accepted and how fast the background sender drains them
+into a local SMTP stub, with a share of transient 451 replies retried.
+
+Usage:
+    python -W ignore -m benchmarks.bench_outbox [--messages 5000] [--per-email 50]
+        [--pdf-kb 50] [--concurrency 4] [--fail-rate 0.05] [--retry-seconds 0.2]
+"""
+
+import argparse
+import contextlib
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.bench_smtp_pool import local_smtp_server
+from email_outbox import EmailOutbox
+from notification_service import AttachmentCache, NotificationService, SMTPConnectionPool
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--messages', type=int, default=5000)
+    arg_parser.add_argument('--per-email', type=int, default=50, help="recipients of each queued email")
+    arg_parser.add_argument('--pdf-kb', type=int, default=50)
+    arg_parser.add_argument('--concurrency', type=int, default=4)
+    arg_parser.add_argument('--fail-rate', type=float, default=0.05, help="share of sends the stub answers 451")
+    arg_parser.add_argument('--retry-seconds', type=float, default=0.2)
+    arg_parser.add_argument('--timeout', type=float, default=300)
+    args = arg_parser.parse_args()
+
+    pdf_data = os.urandom(args.pdf_kb * 1024)
+    with tempfile.TemporaryDirectory() as workdir, \
+            local_smtp_server(fail_rate=args.fail_rate) as (port, received), \
+            contextlib.redirect_stdout(None):
+        pool = SMTPConnectionPool('127.0.0.1', port, security='none', size=args.concurrency)
+        service = NotificationService(pool=pool, attachments=AttachmentCache(os.path.join(workdir, 'attachments')))
+        service.smtp_from_email = 'estimator@example.org'
+        outbox = EmailOutbox(outbox_dir=os.path.join(workdir, 'outbox'), service=service, concurrency=args.concurrency,
+                             retry_base=args.retry_seconds)
+
+        start = time.perf_counter()
+        submit_times = []
+        for first in range(0, args.messages, args.per_email):
+            recipients = [f"reviewer{i}@example.org" for i in range(first, min(first + args.per_email, args.messages))]
+            submit_start = time.perf_counter()
+            outbox.submit(recipients, f"Report {first}", "Attached.", pdf_data=pdf_data)
+            submit_times.append(time.perf_counter() - submit_start)
+        queued = time.perf_counter() - start
+
+        while time.perf_counter() - start < args.timeout:
+            counts = outbox.counts()
+            if counts['sent'] + counts['failed'] == args.messages:
+                break
+            time.sleep(0.05)
+        drained = time.perf_counter() - start
+        outbox.close()
+
+        with contextlib.closing(sqlite3.connect(outbox.db_path)) as conn:
+            retried = conn.execute("SELECT COUNT(*) FROM messages WHERE attempts > 1").fetchone()[0]
+        delivered = len(received)
+
+    print(f"{args.messages} messages in emails of {args.per_email}, {args.pdf_kb} KB attachment, "
+          f"{args.concurrency} senders, {args.fail_rate:.0%} transient failures")
+    print(f"queued in {queued:.2f} s ({args.messages / queued:,.0f} msg/s, "
+          f"slowest submit {max(submit_times) * 1000:.1f} ms)")
+    print(f"drained in {drained:.2f} s ({counts['sent'] / drained:,.0f} msg/s): "
+          f"{counts['sent']} sent, {counts['failed']} failed, {retried} retried, "
+          f"{delivered} delivered, {pool.opened} SMTP sessions")
+
+
+if __name__ == '__main__':
+    main()
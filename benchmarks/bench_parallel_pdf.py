@@ -0,0 +1,66 @@
+"""
+Benchmark: multi-process PDF page extraction speedup curve.
+
+Usage:
+    python -m benchmarks.bench_parallel_pdf [--pages 300] [--workers 1 2 4 8 16] [--chunk-size 8]
+"""
+
+import argparse
+import io
+import os
+import time
+
+from fpdf import FPDF
+
+from benchmarks.bench_keyword_index import make_document
+from document_parser import DocumentParser
+
+
+LINES_PER_PAGE = 60
+
+
+def make_pdf(num_pages: int) -> bytes:
+    """Render a synthetic audit report with the given number of text pages"""
+    lines = make_document(num_pages * LINES_PER_PAGE).split("\n")
+    pdf = FPDF()
+    pdf.set_font("Arial", "", 8)
+    for start in range(0, len(lines), LINES_PER_PAGE):
+        pdf.add_page()
+        for line in lines[start:start + LINES_PER_PAGE]:
+            pdf.cell(0, 4, line, ln=True)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def _extract(data: bytes, workers: int, chunk_size: int) -> str:
+    file = io.BytesIO(data)
+    file.name = "benchmark.pdf"
+    return DocumentParser(workers=workers, chunk_size=chunk_size).extract_text(file)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--pages", type=int, default=300)
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    arg_parser.add_argument("--chunk-size", type=int, default=8)
+    args = arg_parser.parse_args()
+
+    data = make_pdf(args.pages)
+    print(f"{args.pages} pages, {len(data) / 1024:.0f} KiB, {os.cpu_count()} CPUs, "
+          f"chunk size {args.chunk_size}")
+    print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+
+    baseline = None
+    expected = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        text = _extract(data, workers, args.chunk_size)
+        elapsed = time.perf_counter() - start
+
+        if expected is None:
+            expected, baseline = text, elapsed
+        assert text == expected, f"{workers}-worker extraction differs from the first run"
+        print(f"{workers:>8} {elapsed:>9.2f} {args.pages / elapsed:>9.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
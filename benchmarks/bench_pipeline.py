@@ -0,0 +1,228 @@
+"""
+Benchmark: end-to-end stage timings on synthetic audit reports, kept in a
+JSON history so each run is checked against earlier runs of the same
+configuration.
+
+Stages are timed separately: extraction (DocumentParser.extract_text),
+identify_interventions, match_standards, calculate_costs and
+generate_report. Each is the median of --repeat runs on a fresh parser,
+matcher, fetcher and report generator, after one warm-up run.
+
+A stage is flagged as a regression when its median is more than
+--threshold slower than the median of the last --baseline-runs recorded
+runs with the same format and options, and at least --min-ms slower (so
+millisecond stages do not trip on noise). With --check the exit status is
+1 when anything regressed.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--formats pdf docx txt] [--pages 20]
+        [--density 0.2] [--chainage plus km ch range] [--units nos m sqm km]
+        [--repeat 3] [--history .cache/bench_pipeline_history.json]
+        [--threshold 0.2] [--min-ms 5] [--baseline-runs 3] [--check]
+    python -m benchmarks.bench_pipeline --compare-only [--history ...] [--check]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.synthetic_reports import CHAINAGE_FORMATS, QUANTITY_UNITS, REPORT_FORMATS, make_report
+from document_parser import DocumentParser
+from matching_engine import MatchingEngine
+from price_fetcher import PriceFetcher
+from report_generator import ReportGenerator
+
+
+STAGES = ('extraction', 'identify_interventions', 'match_standards', 'calculate_costs', 'generate_report')
+
+DEFAULT_HISTORY = os.path.join('.cache', 'bench_pipeline_history.json')
+
+
+def run_stages(data: bytes, report_format: str, workdir: str) -> Dict:
+    """Seconds per stage for one document, plus the item counts it produced"""
+    parser, matcher, fetcher = DocumentParser(), MatchingEngine(), PriceFetcher(location='Kerala', year=2023)
+    timings = {}
+
+    start = time.perf_counter()
+    upload = io.BytesIO(data)
+    upload.name = f"audit.{report_format}"
+    text = parser.extract_text(upload)
+    timings['extraction'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    interventions = parser.identify_interventions(text)
+    timings['identify_interventions'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matched = matcher.match_standards(interventions)
+    timings['match_standards'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    priced = fetcher.calculate_costs(matched)
+    timings['calculate_costs'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ReportGenerator().generate_report(priced, output_path=os.path.join(workdir, f"report_{report_format}.pdf"))
+    timings['generate_report'] = time.perf_counter() - start
+
+    return {'seconds': timings, 'interventions': len(interventions), 'priced': len(priced)}
+
+
+def benchmark_format(report_format: str, data: bytes, repeat: int) -> Dict:
+    """Median milliseconds per stage over repeat runs, after a warm-up run"""
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(None):
+        run_stages(data, report_format, workdir)
+        runs = [run_stages(data, report_format, workdir) for _ in range(repeat)]
+    return {
+        'bytes': len(data),
+        'interventions': runs[0]['interventions'],
+        'priced': runs[0]['priced'],
+        'stages_ms': {
+            stage: round(statistics.median(run['seconds'][stage] for run in runs) * 1000, 3)
+            for stage in STAGES
+        }
+    }
+
+
+def load_history(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_history(path: str, history: List[Dict]):
+    """Write the history through a temporary file, so a crash never truncates it"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=1)
+    os.replace(temp_path, path)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def find_regressions(history: List[Dict], run: Dict, threshold: float, min_ms: float,
+                     baseline_runs: int) -> List[Dict]:
+    """
+    Stages of run that are slower than the runs recorded before it
+
+    Only runs with the same options are compared, format by format.
+
+    Returns:
+        list: format, stage, baseline_ms, current_ms and slowdown (fraction)
+            of every regressed stage
+    """
+    regressions = []
+    earlier = [entry for entry in history if entry['options'] == run['options']]
+    for report_format, result in run['results'].items():
+        baseline = [entry['results'][report_format] for entry in earlier if report_format in entry['results']]
+        baseline = baseline[-baseline_runs:]
+        if not baseline:
+            continue
+        for stage, current_ms in result['stages_ms'].items():
+            baseline_ms = statistics.median(entry['stages_ms'][stage] for entry in baseline)
+            if current_ms > baseline_ms * (1 + threshold) and current_ms - baseline_ms >= min_ms:
+                regressions.append({
+                    'format': report_format,
+                    'stage': stage,
+                    'baseline_ms': baseline_ms,
+                    'current_ms': current_ms,
+                    'slowdown': current_ms / baseline_ms - 1 if baseline_ms else float('inf')
+                })
+    return regressions
+
+
+def print_run(run: Dict):
+    print(f"{run['timestamp']} commit {run['commit'] or 'unknown'}, options {run['options']}")
+    results = run['results']
+    print(f"{'':>26} " + " ".join(f"{report_format:>10}" for report_format in results))
+    print(f"{'size KB':>26} " + " ".join(f"{result['bytes'] / 1024:>10,.0f}" for result in results.values()))
+    print(f"{'interventions':>26} " + " ".join(f"{result['interventions']:>10}" for result in results.values()))
+    for stage in STAGES:
+        print(f"{stage + ' ms':>26} " + " ".join(f"{result['stages_ms'][stage]:>10.1f}" for result in results.values()))
+
+
+def print_regressions(regressions: List[Dict], threshold: float):
+    if not regressions:
+        print(f"No stage more than {threshold:.0%} slower than its baseline")
+        return
+    print(f"{len(regressions)} stage(s) more than {threshold:.0%} slower than their baseline:")
+    for regression in regressions:
+        print(f"  {regression['format']} {regression['stage']}: {regression['baseline_ms']:.1f} ms -> "
+              f"{regression['current_ms']:.1f} ms (+{regression['slowdown']:.0%})")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--formats', nargs='+', choices=REPORT_FORMATS, default=list(REPORT_FORMATS))
+    arg_parser.add_argument('--pages', type=int, default=20)
+    arg_parser.add_argument('--density', type=float, default=0.2, help="share of lines with an intervention")
+    arg_parser.add_argument('--chainage', nargs='+', choices=list(CHAINAGE_FORMATS), default=list(CHAINAGE_FORMATS))
+    arg_parser.add_argument('--units', nargs='+', choices=list(QUANTITY_UNITS), default=list(QUANTITY_UNITS))
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--history', default=DEFAULT_HISTORY, help="JSON file runs are appended to")
+    arg_parser.add_argument('--threshold', type=float, default=0.2, help="slowdown flagged as a regression")
+    arg_parser.add_argument('--min-ms', type=float, default=5.0, help="smallest slowdown flagged, in ms")
+    arg_parser.add_argument('--baseline-runs', type=int, default=3, help="earlier runs the baseline is the median of")
+    arg_parser.add_argument('--compare-only', action='store_true', help="check the last recorded run, run nothing")
+    arg_parser.add_argument('--check', action='store_true', help="exit with status 1 on a regression")
+    args = arg_parser.parse_args()
+
+    history = load_history(args.history)
+    if args.compare_only:
+        if not history:
+            sys.exit(f"No runs recorded in {args.history}")
+        run = history[-1]
+    else:
+        logging.disable(logging.WARNING)
+        options = {
+            'pages': args.pages,
+            'density': args.density,
+            'chainage': sorted(args.chainage),
+            'units': sorted(args.units),
+            'seed': args.seed,
+            'repeat': args.repeat
+        }
+        run = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'options': options,
+            'results': {}
+        }
+        for report_format in args.formats:
+            data = make_report(report_format, args.pages, density=args.density, chainage_formats=args.chainage,
+                               units=args.units, seed=args.seed)
+            run['results'][report_format] = benchmark_format(report_format, data, args.repeat)
+        history.append(run)
+        save_history(args.history, history)
+
+    print_run(run)
+    regressions = find_regressions(history[:-1], run, args.threshold, args.min_ms, args.baseline_runs)
+    print_regressions(regressions, args.threshold)
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
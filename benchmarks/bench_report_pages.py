@@ -0,0 +1,52 @@
+"""
+Benchmark: PDF report generation throughput in pages and rows per second
+(untraced run), and the peak memory traced while generating (separate run).
+
+Usage:
+    python -m benchmarks.bench_report_pages [--rows 1000 10000 100000]
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_columnar_pricing import make_matched_data
+from price_fetcher import PriceFetcher, PriceSummary
+from report_generator import ReportGenerator
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    fetcher = PriceFetcher(location='Kerala', year=2023)
+    print(f"{'rows':>9} {'pages':>7} {'seconds':>8} {'pages/s':>9} {'rows/s':>10} {'peak MB':>8} {'PDF MB':>7}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            priced = fetcher.calculate_costs_columnar(make_matched_data(rows, random.Random(rows))).to_dict('records')
+            summary = PriceSummary(priced)
+            report_path = os.path.join(workdir, f'report_{rows}.pdf')
+
+            generator = ReportGenerator()
+            start = time.perf_counter()
+            generator.generate_report(priced, summary=summary, output_path=report_path)
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            ReportGenerator().generate_report(priced, summary=summary, output_path=report_path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            pages = generator.pdf.page
+            print(f"{rows:>9} {pages:>7} {elapsed:>8.2f} {pages / elapsed:>9.1f} {rows / elapsed:>10,.0f} "
+                  f"{peak / 2**20:>8.1f} {os.path.getsize(report_path) / 2**20:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
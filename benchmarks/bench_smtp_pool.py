@@ -0,0 +1,127 @@
+"""
+Benchmark: SMTP sessions opened and wall time to email one report to many
+recipients, unpooled vs pooled send_email vs a single send_many batch.
+
+Runs against a local stand-in server (aiosmtpd if installed, otherwise the
+stdlib smtpd module) with an artificial per-connection setup delay standing
+in for the TCP + TLS + login round trips of a real provider.
+
+Usage:
+    python -W ignore -m benchmarks.bench_smtp_pool [--recipients 40] [--pdf-kb 200]
+        [--connect-ms 150]
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+
+from notification_service import AttachmentCache, NotificationService, SMTPConnectionPool
+
+
+@contextlib.contextmanager
+def local_smtp_server(connect_delay: float = 0.0, fail_rate: float = 0.0):
+    """
+    Yield (port, received) for a throwaway SMTP server on 127.0.0.1 that
+    answers 451 (try again later) to a fail_rate share of messages
+    """
+    received = []
+    chance = random.Random(0)
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import SMTP
+    except ImportError:
+        Controller = None
+
+    if Controller is not None:
+        class Handler:
+            async def handle_DATA(self, server, session, envelope):
+                if chance.random() < fail_rate:
+                    return '451 Try again later'
+                received.append(envelope.rcpt_tos)
+                return '250 OK'
+
+        class SlowSMTP(SMTP):
+            def connection_made(self, transport):
+                time.sleep(connect_delay)
+                super().connection_made(transport)
+
+        class SlowController(Controller):
+            def factory(self):
+                return SlowSMTP(self.handler)
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        controller = SlowController(Handler(), hostname='127.0.0.1', port=port)
+        controller.start()
+        try:
+            yield port, received
+        finally:
+            controller.stop()
+        return
+
+    import asyncore
+    import smtpd
+
+    class StandIn(smtpd.SMTPServer):
+        def handle_accepted(self, conn, addr):
+            time.sleep(connect_delay)
+            super().handle_accepted(conn, addr)
+
+        def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+            if chance.random() < fail_rate:
+                return '451 Try again later'
+            received.append(rcpttos)
+
+    server = StandIn(('127.0.0.1', 0), None)
+    loop = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.05}, daemon=True)
+    loop.start()
+    try:
+        yield server.socket.getsockname()[1], received
+    finally:
+        server.close()
+        loop.join()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--recipients', type=int, default=40)
+    arg_parser.add_argument('--pdf-kb', type=int, default=200)
+    arg_parser.add_argument('--connect-ms', type=float, default=150, help="simulated session setup cost")
+    args = arg_parser.parse_args()
+
+    recipients = [f"reviewer{i}@example.org" for i in range(args.recipients)]
+    pdf_data = os.urandom(args.pdf_kb * 1024)
+    print(f"{args.recipients} recipients, {args.pdf_kb} KB attachment, {args.connect_ms:.0f} ms per session setup")
+    print(f"{'mode':>16} {'sessions':>9} {'seconds':>8} {'emails/s':>9} {'delivered':>10}")
+    with tempfile.TemporaryDirectory() as workdir, local_smtp_server(args.connect_ms / 1000) as (port, received):
+        modes = {
+            'unpooled': (0, False),
+            'pooled': (240, False),
+            'send_many': (240, True)
+        }
+        for mode, (idle_timeout, batched) in modes.items():
+            received.clear()
+            pool = SMTPConnectionPool('127.0.0.1', port, security='none', idle_timeout=idle_timeout)
+            service = NotificationService(pool=pool, attachments=AttachmentCache(workdir))
+            service.smtp_security = 'none'
+            service.smtp_from_email = 'estimator@example.org'
+            with contextlib.redirect_stdout(None):
+                start = time.perf_counter()
+                if batched:
+                    service.send_many(recipients, "Report", "Attached.", pdf_data=pdf_data)
+                else:
+                    for recipient in recipients:
+                        service.send_email(recipient, "Report", "Attached.", pdf_data=pdf_data)
+                elapsed = time.perf_counter() - start
+                pool.close()
+            print(f"{mode:>16} {pool.opened:>9} {elapsed:>8.2f} {len(recipients) / elapsed:>9.1f} {len(received):>10}")
+
+
+if __name__ == '__main__':
+    main()
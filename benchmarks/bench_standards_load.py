@@ -0,0 +1,83 @@
+"""
+Benchmark: standards database load time, Excel vs. Feather snapshot.
+
+Reports in-process load time (pd.read_excel vs. the memory-mapped
+snapshot) and cold-start time of a fresh process constructing a
+MatchingEngine with and without the snapshot present.
+
+Usage:
+    python -m benchmarks.bench_standards_load [--rows 1000 10000 50000]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_batch_matcher import make_standards
+from standards_store import build_snapshot, hash_file, snapshot_path_for, StandardsStore
+
+STARTUP_SCRIPT = (
+    "import sys, time; start = time.perf_counter(); "
+    "from matching_engine import MatchingEngine; MatchingEngine(sys.argv[1]); "
+    "print(time.perf_counter() - start)"
+)
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _startup_time(source: str, repeat: int) -> float:
+    """Best wall time for a fresh interpreter to construct a MatchingEngine"""
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, source],
+            cwd=project_root, capture_output=True, text=True, check=True
+        )
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 50_000])
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>8} {'excel load':>11} {'snapshot':>9} {'speedup':>8} "
+          f"{'startup xlsx':>13} {'startup snap':>13}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            source = os.path.join(workdir, f"standards_{rows}.xlsx")
+            make_standards(rows, random.Random(rows)).to_excel(source, index=False)
+            snapshot = snapshot_path_for(source)
+
+            excel_time = _best_of(lambda: pd.read_excel(source), args.repeat)
+            build_snapshot(source)
+            digest = hash_file(source)
+            snapshot_time = _best_of(lambda: StandardsStore()._read_snapshot(source, digest), args.repeat)
+
+            startup_snapshot = _startup_time(source, args.repeat)
+            os.remove(snapshot)
+            # The first cold start rebuilds the snapshot, so time exactly one
+            startup_excel = _startup_time(source, 1)
+
+            print(f"{rows:>8} {excel_time:>10.3f}s {snapshot_time:>8.4f}s {excel_time / snapshot_time:>7.0f}x "
+                  f"{startup_excel:>12.3f}s {startup_snapshot:>12.3f}s")
+
+
+if __name__ == '__main__':
+    main()
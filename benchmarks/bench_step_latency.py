@@ -0,0 +1,76 @@
+"""
+Benchmark: latency of each app step (upload, analysis, pricing, report)
+for a small document, running the same backend calls the Streamlit
+sections make, with their progress callbacks attached.
+
+Usage:
+    python -m benchmarks.bench_step_latency [--lines 200] [--repeat 5]
+"""
+
+import argparse
+import io
+import logging
+import statistics
+import time
+
+from benchmarks.bench_keyword_index import make_document
+from document_parser import DocumentParser
+from matching_engine import MatchingEngine
+from price_fetcher import PricedEstimate
+from report_generator import ReportGenerator
+
+
+def _run_steps(document: bytes) -> dict:
+    """Milliseconds per step, plus how many progress updates each reported"""
+    timings, updates = {}, {}
+
+    def counter(step):
+        updates[step] = 0
+
+        def progress(done, total):
+            updates[step] += 1
+        return progress
+
+    start = time.perf_counter()
+    upload = io.BytesIO(document)
+    upload.name = 'audit.txt'
+    interventions = list(DocumentParser().iter_interventions(upload, counter('upload')))
+    timings['upload'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matched = MatchingEngine().match_standards_batch(interventions, counter('analysis'))
+    timings['analysis'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    estimate = PricedEstimate(matched, location='Kerala', year=2023, progress=counter('pricing'))
+    timings['pricing'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ReportGenerator().render_report(estimate.records, summary=estimate.summary, progress=counter('report'))
+    timings['report'] = time.perf_counter() - start
+
+    return {step: (seconds * 1000, updates[step]) for step, seconds in timings.items()}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--lines', type=int, default=200)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    document = make_document(args.lines, density=0.2).encode('utf-8')
+    _run_steps(document)  # warm-up: imports, standards load
+    runs = [_run_steps(document) for _ in range(args.repeat)]
+
+    print(f"{args.lines}-line document, median of {args.repeat} runs")
+    print(f"{'step':>10} {'ms':>9} {'progress updates':>17}")
+    for step in runs[0]:
+        median_ms = statistics.median(run[step][0] for run in runs)
+        print(f"{step:>10} {median_ms:>9.1f} {runs[0][step][1]:>17}")
+    total_ms = sum(statistics.median(run[step][0] for run in runs) for step in runs[0])
+    print(f"{'total':>10} {total_ms:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
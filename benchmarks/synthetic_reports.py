@@ -0,0 +1,174 @@
+"""
+Synthetic road safety audit reports in PDF, DOCX and TXT, for benchmarks
+and for trying the app without a real audit at hand.
+
+Pages carry a running header and footer, observation filler and, at the
+given density, intervention lines mixing the chainage and quantity
+formats found in real audits.
+
+Usage:
+    python -m benchmarks.synthetic_reports [--formats pdf docx txt] [--pages 20]
+        [--density 0.2] [--chainage plus km ch range] [--units nos m sqm km]
+        [--output-dir synthetic_reports]
+"""
+
+import argparse
+import io
+import os
+import random
+from typing import List, Sequence
+
+import docx
+from fpdf import FPDF
+
+from document_parser import DocumentParser
+
+
+REPORT_FORMATS = ('pdf', 'docx', 'txt')
+
+LINES_PER_PAGE = 60
+
+# How an intervention's position is written; km/m are filled in per line
+CHAINAGE_FORMATS = {
+    'plus': "chainage {km}+{m:03d}",
+    'km': "at km {km}.{tenth}",
+    'ch': "Ch {km}+{m:03d}",
+    'range': "from {km}+{m:03d} to {km}+{m_end:03d}",
+}
+
+# How an intervention's quantity is written; q is filled in per line
+QUANTITY_UNITS = {
+    'nos': "{q} nos",
+    'm': "{q:.1f} m",
+    'metre': "{q} metre",
+    'sqm': "{q:.1f} sqm",
+    'km': "{q:.2f} km",
+}
+
+INTERVENTION_TEMPLATES = [
+    "Provide {keyword} {position} - {quantity}",
+    "{position}: {keyword} missing, install {quantity}",
+    "Recommendation: repair {keyword} {position} ({quantity})",
+    "{keyword} to be provided on both sides {position}, {quantity} required",
+]
+
+FILLER_LINES = [
+    "The carriageway width is 7.0 m with earthen shoulders on both sides.",
+    "Traffic volume observed during the survey was moderate.",
+    "Visibility at the junction is restricted by roadside vegetation.",
+    "Refer to annexure for photographs of the site.",
+    "Heavy vehicles were seen overtaking on the approach to the bridge.",
+    "The audit team inspected the stretch during day and night conditions.",
+    "",
+]
+
+
+def make_pages(num_pages: int, density: float = 0.2, chainage_formats: Sequence[str] = tuple(CHAINAGE_FORMATS),
+               units: Sequence[str] = tuple(QUANTITY_UNITS), lines_per_page: int = LINES_PER_PAGE,
+               seed: int = 42) -> List[List[str]]:
+    """
+    Lines of a synthetic audit report, page by page
+
+    Args:
+        num_pages: Pages to generate
+        density: Share of body lines that recommend an intervention
+        chainage_formats: Keys of CHAINAGE_FORMATS to draw positions from
+        units: Keys of QUANTITY_UNITS to draw quantities from
+        lines_per_page: Lines per page, header and footer included
+        seed: Random seed; the same arguments always give the same report
+    """
+    rng = random.Random(seed)
+    keywords = DocumentParser().intervention_keywords
+    chainages = [CHAINAGE_FORMATS[name] for name in chainage_formats]
+    quantities = [QUANTITY_UNITS[name] for name in units]
+    road = f"NH-{rng.randint(1, 99)}"
+
+    pages = []
+    for page_number in range(1, num_pages + 1):
+        lines = [f"Road Safety Audit Report - {road}", ""]
+        for _ in range(lines_per_page - 4):
+            if rng.random() >= density:
+                lines.append(rng.choice(FILLER_LINES))
+                continue
+            km, m = rng.randint(0, 250), rng.randint(0, 899)
+            position = rng.choice(chainages).format(km=km, m=m, m_end=m + rng.randint(10, 100), tenth=m // 100)
+            quantity = rng.choice(quantities).format(q=rng.randint(1, 500) * rng.choice((1, 1.5, 0.25)))
+            lines.append(rng.choice(INTERVENTION_TEMPLATES).format(
+                keyword=rng.choice(keywords), position=position, quantity=quantity
+            ))
+        lines += ["", f"Page {page_number} of {num_pages}"]
+        pages.append(lines)
+    return pages
+
+
+def render_txt(pages: List[List[str]]) -> bytes:
+    """Pages separated by form feeds"""
+    return "\f".join("\n".join(lines) + "\n" for lines in pages).encode('utf-8')
+
+
+def render_pdf(pages: List[List[str]]) -> bytes:
+    """One PDF page per page of lines"""
+    pdf = FPDF()
+    pdf.set_auto_page_break(False)
+    pdf.set_font("Arial", "", 8)
+    for lines in pages:
+        pdf.add_page()
+        for line in lines:
+            pdf.cell(0, 4, line, ln=True)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def render_docx(pages: List[List[str]]) -> bytes:
+    """One paragraph per line, with a page break after every page"""
+    document = docx.Document()
+    for index, lines in enumerate(pages):
+        document.add_heading(lines[0], level=2)
+        for line in lines[1:]:
+            document.add_paragraph(line)
+        if index < len(pages) - 1:
+            document.add_page_break()
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+RENDERERS = {'pdf': render_pdf, 'docx': render_docx, 'txt': render_txt}
+
+
+def make_report(report_format: str, num_pages: int, **options) -> bytes:
+    """
+    A synthetic audit report as file contents
+
+    Args:
+        report_format: One of REPORT_FORMATS
+        num_pages: Pages to generate
+        options: density, chainage_formats, units, lines_per_page, seed (see make_pages)
+    """
+    if report_format not in RENDERERS:
+        raise ValueError(f"Unknown report format: {report_format}")
+    return RENDERERS[report_format](make_pages(num_pages, **options))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--formats', nargs='+', choices=REPORT_FORMATS, default=list(REPORT_FORMATS))
+    arg_parser.add_argument('--pages', type=int, default=20)
+    arg_parser.add_argument('--density', type=float, default=0.2, help="share of lines with an intervention")
+    arg_parser.add_argument('--chainage', nargs='+', choices=list(CHAINAGE_FORMATS), default=list(CHAINAGE_FORMATS))
+    arg_parser.add_argument('--units', nargs='+', choices=list(QUANTITY_UNITS), default=list(QUANTITY_UNITS))
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--output-dir', default='synthetic_reports')
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for report_format in args.formats:
+        data = make_report(report_format, args.pages, density=args.density, chainage_formats=args.chainage,
+                           units=args.units, seed=args.seed)
+        path = os.path.join(args.output_dir, f"audit_{args.pages}p_{args.density:g}.{report_format}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        print(f"{path}: {len(data) / 1024:,.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
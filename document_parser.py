@@ -1,15 +1,53 @@
 import PyPDF2
+import ahocorasick
+import codecs
 import docx
+import io
+import os
 import re
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Dict, Iterable, Iterator, Tuple
 import pdfplumber
 
+from intervention_table import INTERVENTION_COLUMNS, InterventionTable
+from telemetry import get_telemetry
+
+# Bump when extraction or intervention detection changes output, so cached
+# results from older parser versions are not reused
+PARSER_VERSION = "3"
+
+# Document opened by each PDF extraction worker process
+_worker_source = None
+
+
+def _init_pdf_worker(source):
+    """Remember the document (path or bytes) once per worker process"""
+    global _worker_source
+    _worker_source = source
+
+
+def _extract_pdf_chunk(page_range: Tuple[int, int]) -> List[str]:
+    """Extract the text of pages [start, stop) in a worker process"""
+    start, stop = page_range
+    if isinstance(_worker_source, str):
+        with open(_worker_source, 'rb') as file:
+            return list(DocumentParser()._iter_pdf_pages(file, start, stop))
+    return list(DocumentParser()._iter_pdf_pages(io.BytesIO(_worker_source), start, stop))
+
+
 class DocumentParser:
     """
     Extracts text from documents and identifies road safety interventions
     """
     
-    def __init__(self):
+    def __init__(self, workers: int = 1, chunk_size: int = 8):
+        """
+        Args:
+            workers: Processes used to extract PDF pages (1 = in-process)
+            chunk_size: Pages handed to a worker process at a time
+        """
+        self.workers = workers
+        self.chunk_size = chunk_size
         self.intervention_keywords = [
             'rumble strip', 'speed hump', 'speed breaker', 'signage', 'road marking',
             'guard rail', 'crash barrier', 'street light', 'road furniture',
@@ -18,12 +56,63 @@ class DocumentParser:
             'speed limit', 'road widening', 'intersection improvement', 'curve improvement',
             'shoulder paving', 'drainage', 'cattle catcher', 'solar blinker'
         ]
+        self._keyword_index = None
+        self._indexed_keywords = None
+    
+    def _get_keyword_index(self):
+        """
+        Return the keyword automaton, rebuilding it only when the keyword
+        list has changed since it was last built
+        """
+        keywords = tuple(self.intervention_keywords)
+        if self._keyword_index is None or keywords != self._indexed_keywords:
+            self._build_keyword_index(keywords)
+        return self._keyword_index
+    
+    def _build_keyword_index(self, keywords: Tuple[str, ...]):
+        """
+        Build an Aho-Corasick automaton over the keywords so the whole text
+        is scanned once, instead of once per keyword per line
+        """
+        automaton = ahocorasick.Automaton()
+        for rank, keyword in enumerate(keywords):
+            if keyword and not automaton.exists(keyword):
+                automaton.add_word(keyword, (rank, len(keyword)))
+        
+        if len(automaton):
+            automaton.make_automaton()
+        else:
+            automaton = False
+        
+        self._keyword_index = automaton
+        self._indexed_keywords = keywords
+    
+    def _iter_keyword_hits(self, text_lower: str):
+        """Yield (keyword_rank, start, end) for every keyword hit in lowercased text"""
+        automaton = self._get_keyword_index()
+        if not automaton:
+            return
+        
+        # Overlapping hits (e.g. "chevron signage") are all reported, ordered
+        # by where they end
+        for end, (rank, length) in automaton.iter(text_lower):
+            yield rank, end + 1 - length, end + 1
+    
+    def find_keyword_hits(self, text: str) -> List[Tuple[str, int, int]]:
+        """
+        Find every intervention keyword in a single pass over the text.
+        
+        Returns (keyword, start, end) tuples in text order, where keyword is
+        the entry from intervention_keywords and start/end is its span.
+        """
+        hits = sorted(self._iter_keyword_hits(text.lower()), key=lambda hit: hit[1])
+        return [(self._indexed_keywords[rank], start, end) for rank, start, end in hits]
     
     def extract_text(self, file) -> str:
         """
         Extract text from uploaded file based on file type
         """
-        file_extension = file.name.split('.')[-1].lower()
+        file_extension = self._get_extension(file)
         
         if file_extension == 'pdf':
             return self._extract_from_pdf(file)
@@ -34,73 +123,258 @@ class DocumentParser:
         else:
             raise ValueError(f"Unsupported file format: {file_extension}")
     
+    def iter_pages(self, file, progress: Callable[[int, int], None] = None) -> Iterator[str]:
+        """
+        Yield the document text one page at a time.
+        
+        PDFs yield one item per page, DOCX one per paragraph and TXT one per
+        block of complete lines, so only a single page is held in memory.
+        Joining the pages with newlines reproduces the lines of extract_text.
+        
+        Args:
+            progress: Called with (pages read, total pages) as pages are read
+        """
+        file_extension = self._get_extension(file)
+        
+        if file_extension == 'pdf':
+            if self.workers > 1:
+                pages = self._iter_pdf_pages_parallel(file, progress)
+            else:
+                pages = self._iter_pdf_pages(file, progress=progress)
+        elif file_extension == 'docx':
+            pages = self._iter_docx_paragraphs(file, progress)
+        elif file_extension == 'txt':
+            pages = self._iter_txt_blocks(file, progress=progress)
+        else:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+        
+        return get_telemetry().timed_iter('parser.pages', pages, format=file_extension)
+    
+    def iter_lines(self, file) -> Iterator[str]:
+        """Yield the document text line by line, reading one page at a time"""
+        for page in self.iter_pages(file):
+            yield from page.split('\n')
+    
+    def iter_interventions(self, file, progress: Callable[[int, int], None] = None) -> Iterator[Dict]:
+        """
+        Yield interventions as the document pages are parsed.
+        
+        Produces the same records, in the same order, as
+        identify_interventions(extract_text(file)).
+        """
+        # Includes the parser.pages time of reading the document
+        return get_telemetry().timed_iter(
+            'parser.interventions', self.identify_interventions_in_pages(self.iter_pages(file, progress))
+        )
+    
+    def extract_intervention_table(self, file, progress: Callable[[int, int], None] = None) -> InterventionTable:
+        """
+        Parse a document straight into a columnar InterventionTable, one
+        record at a time, without keeping a list of intervention dicts
+        """
+        return InterventionTable.from_records(self.iter_interventions(file, progress), INTERVENTION_COLUMNS)
+    
+    def _get_extension(self, file) -> str:
+        return file.name.split('.')[-1].lower()
+    
     def _extract_from_pdf(self, file) -> str:
         """Extract text from PDF using pdfplumber"""
-        text = ""
+        return "".join(page + "\n" for page in self.iter_pages(file))
+    
+    def _iter_pdf_pages(self, file, start: int = 0, stop: int = None,
+                        progress: Callable[[int, int], None] = None) -> Iterator[str]:
+        """Yield PDF page text, falling back to PyPDF2 for pages pdfplumber can't read"""
         try:
-            with pdfplumber.open(file) as pdf:
-                for page in pdf.pages:
-                    text += page.extract_text() + "\n"
-        except Exception as e:
-            # Fallback to PyPDF2
+            pdf = pdfplumber.open(file)
+        except Exception:
             file.seek(0)
             pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+            pages = pdf_reader.pages[start:stop]
+            for done, page in enumerate(pages, 1):
+                text = page.extract_text()
+                if progress:
+                    progress(done, len(pages))
+                yield text
+            return
+        
+        fallback_reader = None
+        with pdf:
+            pages = pdf.pages[start:stop]
+            for index, page in enumerate(pages, start):
+                try:
+                    text = page.extract_text()
+                except Exception:
+                    text = None
+                finally:
+                    # Drop the page's cached layout objects before moving on
+                    page.close()
+                
+                if text is None:
+                    if fallback_reader is None:
+                        fallback_reader = self._open_fallback_reader(file)
+                    text = fallback_reader.pages[index].extract_text()
+                    get_telemetry().count('parser.pdf_fallback_pages')
+                
+                if progress:
+                    progress(index - start + 1, len(pages))
+                yield text
+    
+    def _iter_pdf_pages_parallel(self, file, progress: Callable[[int, int], None] = None) -> Iterator[str]:
+        """
+        Yield PDF page text extracted by a pool of worker processes.
+        
+        Each worker opens the document itself, from the file path when there
+        is one on disk and otherwise from the uploaded bytes, and extracts a
+        contiguous chunk of pages. Chunks are yielded back in page order.
+        """
+        source = self._get_pdf_source(file)
+        try:
+            page_count = len(PyPDF2.PdfReader(source if isinstance(source, str) else io.BytesIO(source)).pages)
+        except Exception:
+            # Let the in-process reader deal with documents PyPDF2 can't index
+            yield from self._iter_pdf_pages(file, progress=progress)
+            return
+        
+        chunks = [(start, min(start + self.chunk_size, page_count))
+                  for start in range(0, page_count, self.chunk_size)]
+        if not chunks:
+            return
         
-        return text
+        workers = min(self.workers, len(chunks))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_worker,
+                                 initargs=(source,)) as executor:
+            for (_, stop), pages in zip(chunks, executor.map(_extract_pdf_chunk, chunks)):
+                if progress:
+                    progress(stop, page_count)
+                yield from pages
+    
+    def _get_pdf_source(self, file):
+        """Return a path workers can open, or the document bytes"""
+        try:
+            file.fileno()
+            if os.path.isfile(file.name):
+                return os.path.abspath(file.name)
+        except (AttributeError, OSError):
+            # In-memory uploads have no file descriptor
+            pass
+        
+        position = file.tell()
+        file.seek(0)
+        data = file.read()
+        file.seek(position)
+        return data
+    
+    def _open_fallback_reader(self, file) -> PyPDF2.PdfReader:
+        """Open an independent PyPDF2 reader without disturbing pdfplumber's stream"""
+        position = file.tell()
+        file.seek(0)
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
+        file.seek(position)
+        return pdf_reader
     
     def _extract_from_docx(self, file) -> str:
         """Extract text from DOCX file"""
+        return "".join(paragraph + "\n" for paragraph in self._iter_docx_paragraphs(file))
+    
+    def _iter_docx_paragraphs(self, file, progress: Callable[[int, int], None] = None) -> Iterator[str]:
+        """Yield DOCX paragraph text"""
         doc = docx.Document(file)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+        paragraphs = doc.paragraphs
+        for done, paragraph in enumerate(paragraphs, 1):
+            if progress:
+                progress(done, len(paragraphs))
+            yield paragraph.text
     
     def _extract_from_txt(self, file) -> str:
         """Extract text from TXT file"""
         return file.read().decode('utf-8')
     
+    def _iter_txt_blocks(self, file, block_size: int = 1 << 20,
+                         progress: Callable[[int, int], None] = None) -> Iterator[str]:
+        """Yield TXT content in blocks that end on a line break"""
+        if progress:
+            # Blocks still to read, from the remaining size of the file
+            position = file.tell()
+            total_blocks = max(1, -(-(file.seek(0, io.SEEK_END) - position) // block_size))
+            file.seek(position)
+        
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        pending = ""
+        blocks_read = 0
+        while True:
+            data = file.read(block_size)
+            pending += decoder.decode(data, final=not data)
+            if not data:
+                break
+            if progress:
+                blocks_read += 1
+                progress(blocks_read, total_blocks)
+            cut = pending.rfind('\n')
+            if cut >= 0:
+                yield pending[:cut]
+                pending = pending[cut + 1:]
+        yield pending
+    
     def identify_interventions(self, text: str) -> List[Dict]:
         """
         Identify road safety interventions from extracted text
         """
-        interventions = []
-        lines = text.split('\n')
+        return list(self.identify_interventions_in_pages([text]))
+    
+    def identify_interventions_in_pages(self, pages: Iterable[str]) -> Iterator[Dict]:
+        """
+        Identify interventions page by page, dropping duplicate descriptions
+        across the whole document
+        """
+        seen_descriptions = set()
         
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            
-            # Skip empty lines or very short lines
-            if len(line.strip()) < 10:
-                continue
+        for page in pages:
+            lines = page.split('\n')
             
-            # Check for intervention keywords
-            for keyword in self.intervention_keywords:
-                if keyword in line_lower:
-                    intervention = self._extract_intervention_details(line, lines, i)
-                    if intervention and intervention['description']:
-                        interventions.append(intervention)
-                    break  # Only match one keyword per line
-        
-        # Remove exact duplicates based on description
-        unique_interventions = []
-        seen_descriptions = set()
-        for intervention in interventions:
-            desc = intervention['description'].strip().lower()
-            if desc not in seen_descriptions and len(desc) > 10:
-                seen_descriptions.add(desc)
-                unique_interventions.append(intervention)
+            for i, keyword in self._first_keyword_per_line(page):
+                line = lines[i]
+                
+                # Skip empty lines or very short lines
+                if len(line.strip()) < 10:
+                    continue
+                
+                intervention = self._extract_intervention_details(line, lines, i, keyword)
+                if not intervention or not intervention['description']:
+                    continue
+                
+                # Remove exact duplicates based on description
+                desc = intervention['description'].strip().lower()
+                if desc not in seen_descriptions and len(desc) > 10:
+                    seen_descriptions.add(desc)
+                    yield intervention
+    
+    def _first_keyword_per_line(self, text: str) -> List[Tuple[int, str]]:
+        """
+        Map keyword hits onto line numbers, keeping only the keyword that
+        comes first in intervention_keywords for each line (one match per line)
+        """
+        text_lower = text.lower()
+        best_per_line = {}
+        line_index = 0
+        scanned = 0
+        for rank, start, _ in self._iter_keyword_hits(text_lower):
+            # Count line breaks between consecutive hits instead of walking
+            # every line of the document (keywords never span a line break, so
+            # hits that overlap on one line count zero)
+            line_index += text_lower.count('\n', scanned, start)
+            scanned = start
+            if rank < best_per_line.get(line_index, len(self._indexed_keywords)):
+                best_per_line[line_index] = rank
         
-        return unique_interventions
+        return [(i, self._indexed_keywords[rank]) for i, rank in best_per_line.items()]
     
-    def _extract_intervention_details(self, line: str, all_lines: List[str], index: int) -> Dict:
+    def _extract_intervention_details(self, line: str, all_lines: List[str], index: int,
+                                      keyword: str = None) -> Dict:
         """
         Extract detailed information about an intervention
         """
         intervention = {
-            'type': self._identify_intervention_type(line),
+            'type': keyword.title() if keyword else self._identify_intervention_type(line),
             'description': line.strip(),
             'location': self._extract_location(line),
             'chainage': self._extract_chainage(line),
@@ -112,11 +386,9 @@ class DocumentParser:
     
     def _identify_intervention_type(self, line: str) -> str:
         """Identify the type of intervention"""
-        line_lower = line.lower()
-        
-        for keyword in self.intervention_keywords:
-            if keyword in line_lower:
-                return keyword.title()
+        ranks = [rank for rank, _, _ in self._iter_keyword_hits(line.lower())]
+        if ranks:
+            return self._indexed_keywords[min(ranks)].title()
         
         return "Other"
     
@@ -0,0 +1,373 @@
+"""
+Email Outbox for Road Safety Estimator
+Persistent SQLite outbox that accepts emails instantly and delivers them
+from a background asyncio sender, retrying failed sends with exponential
+backoff
+"""
+
+import asyncio
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from notification_service import NotificationService, get_notification_service
+from telemetry import get_telemetry
+
+# Message states, in the order a message moves through them
+OUTBOX_STATES = ('queued', 'sending', 'retrying', 'sent', 'failed')
+
+# States a message can still leave; its email's content is kept while any message is in one
+PENDING_STATES = ('queued', 'sending', 'retrying')
+
+# Seconds the sender waits before trying again after a database error
+ERROR_RETRY_SECONDS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contents (
+    id TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    attachment_path TEXT,
+    attachment_name TEXT,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    content_id TEXT NOT NULL REFERENCES contents(id),
+    recipient TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    error TEXT,
+    created TEXT NOT NULL,
+    sent TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt);
+"""
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Autocommit connection; WAL lets the app read while the sender writes"""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _is_permanent(error: Exception) -> bool:
+    """
+    5xx replies (bad address, rejected credentials) and a lost attachment
+    will not succeed on retry
+    """
+    if isinstance(error, FileNotFoundError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and min(codes) >= 500
+    code = getattr(error, 'smtp_code', None)
+    return isinstance(code, int) and 500 <= code < 600
+
+
+class EmailOutbox:
+    """
+    Fire-and-forget email delivery with a persistent outbox.
+    
+    submit() writes one row per recipient and returns at once; a sender
+    thread running an asyncio loop claims due rows, groups recipients of
+    the same email into batches, and hands each batch to a thread that
+    sends it over a pooled SMTP session. Transient failures (timeouts,
+    dropped connections, 4xx replies) are retried after retry_base,
+    2 x retry_base, 4 x retry_base ... seconds, up to max_attempts; 5xx
+    replies fail the message immediately. Messages left mid-send when the
+    app stopped are retried when the outbox is next created.
+    
+    Once every message of an email is sent or failed, its content row and
+    saved attachment are deleted; the message rows stay as its delivery
+    record.
+    """
+    
+    def __init__(self, db_path: str = None, outbox_dir: str = None, service: NotificationService = None,
+                 concurrency: int = None, batch_size: int = 50, max_attempts: int = None,
+                 retry_base: float = None, retry_max: float = 3600):
+        """
+        Args:
+            db_path: SQLite outbox (default: outbox.sqlite3 in outbox_dir)
+            outbox_dir: Directory holding the outbox and saved attachments
+            service: Notification service to send through (default: the app's)
+            concurrency: Batches sent at the same time (default: the SMTP pool size)
+            batch_size: Recipients of one email sent per claimed batch
+            max_attempts: Sends tried before a message is marked failed
+            retry_base: Seconds before the first retry; doubles for each further one
+            retry_max: Longest wait between retries, in seconds
+        """
+        self.outbox_dir = Path(outbox_dir or os.getenv('OUTBOX_DIR', os.path.join('.cache', 'outbox')))
+        (self.outbox_dir / 'attachments').mkdir(parents=True, exist_ok=True)
+        self.db_path = str(db_path or os.getenv('OUTBOX_DB', self.outbox_dir / 'outbox.sqlite3'))
+        self.service = service or get_notification_service()
+        self.concurrency = concurrency or int(os.getenv('SMTP_POOL_SIZE', '2'))
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts or int(os.getenv('OUTBOX_MAX_ATTEMPTS', '6'))
+        self.retry_base = retry_base if retry_base is not None else float(os.getenv('OUTBOX_RETRY_SECONDS', '30'))
+        self.retry_max = retry_max
+        
+        with closing(_connect(self.db_path)) as conn:
+            conn.executescript(_SCHEMA)
+            # Messages that were mid-send when the app stopped go out again
+            conn.execute("UPDATE messages SET status = 'retrying' WHERE status = 'sending'")
+            content_ids = [row['id'] for row in conn.execute("SELECT id FROM contents")]
+        
+        self._conn = _connect(self.db_path)
+        # Emails finished before a crash could clean up after themselves
+        self._release_contents(content_ids)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='outbox-send')
+        self._loop = asyncio.new_event_loop()
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._serve(),),
+                                        name='outbox-sender', daemon=True)
+        self._thread.start()
+    
+    def submit(self, recipients: Iterable[str], subject: str, body: str, pdf_data: bytes = None,
+               pdf_name: str = 'report.pdf') -> List[str]:
+        """
+        Queue one email to each recipient; returns without waiting for SMTP
+        
+        Args:
+            recipients: Email addresses, each sent a separate copy
+            subject: Email subject
+            body: Email body text (sent as HTML too if it has markup)
+            pdf_data: PDF to attach (optional)
+            pdf_name: Attachment file name
+        
+        Returns:
+            list: Message id per recipient, in order
+        """
+        recipients = list(dict.fromkeys(recipients))
+        content_id = uuid.uuid4().hex
+        attachment_path = None
+        if pdf_data:
+            # One file per email, deleted with it; the attachment cache still
+            # encodes the same report only once
+            attachment_path = self.outbox_dir / 'attachments' / f"{content_id}.pdf"
+            temp_path = attachment_path.with_suffix('.tmp')
+            temp_path.write_bytes(pdf_data)
+            os.replace(temp_path, attachment_path)
+        
+        message_ids = [uuid.uuid4().hex for _ in recipients]
+        created = _now()
+        with closing(_connect(self.db_path)) as conn:
+            conn.execute("BEGIN")
+            conn.execute(
+                "INSERT INTO contents (id, subject, body, attachment_path, attachment_name, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content_id, subject, body, str(attachment_path) if attachment_path else None,
+                 pdf_name if attachment_path else None, created)
+            )
+            conn.executemany(
+                "INSERT INTO messages (id, content_id, recipient, status, next_attempt, created) "
+                "VALUES (?, ?, ?, 'queued', 0, ?)",
+                [(message_id, content_id, recipient, created) for message_id, recipient in zip(message_ids, recipients)]
+            )
+            conn.execute("COMMIT")
+        self._loop.call_soon_threadsafe(self._wake.set)
+        return message_ids
+    
+    def get_messages(self, message_ids: Iterable[str]) -> List[Dict]:
+        """Current state of the given messages, in the order given"""
+        message_ids = list(message_ids)
+        with closing(_connect(self.db_path)) as conn:
+            rows = {row['id']: dict(row) for row in conn.execute(
+                "SELECT m.*, c.subject FROM messages m LEFT JOIN contents c ON c.id = m.content_id "
+                f"WHERE m.id IN ({','.join('?' * len(message_ids))})",
+                message_ids
+            )}
+        return [rows[message_id] for message_id in message_ids if message_id in rows]
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of messages in each state"""
+        with closing(_connect(self.db_path)) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM messages GROUP BY status").fetchall())
+        return {state: counts.get(state, 0) for state in OUTBOX_STATES}
+    
+    def close(self, timeout: float = 30):
+        """Stop the sender after the batches in flight; unsent messages stay queued"""
+        def stop():
+            self._closing = True
+            self._wake.set()
+        
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(stop)
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+    
+    async def _serve(self):
+        """Keep up to concurrency batches in flight; sleep until a submit or the next retry is due"""
+        in_flight = set()
+        while True:
+            self._wake.clear()
+            try:
+                while not self._closing and len(in_flight) < self.concurrency:
+                    batch = self._claim_batch()
+                    if batch is None:
+                        break
+                    in_flight.add(asyncio.ensure_future(self._send_batch(*batch)))
+                due_in = self._next_due_in()
+            except Exception as e:
+                # e.g. "database is locked" past the busy timeout: keep the sender alive
+                get_telemetry().event('outbox.error', retry_in=ERROR_RETRY_SECONDS,
+                                      error_type=type(e).__name__, error=str(e))
+                due_in = ERROR_RETRY_SECONDS
+            if self._closing and not in_flight:
+                return
+            
+            wake = asyncio.ensure_future(self._wake.wait())
+            done, _ = await asyncio.wait(
+                in_flight | {wake}, timeout=due_in, return_when=asyncio.FIRST_COMPLETED
+            )
+            wake.cancel()
+            in_flight -= done
+    
+    def _claim_batch(self):
+        """Mark up to batch_size due messages of the oldest due email as sending"""
+        now = time.time()
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first = conn.execute(
+                "SELECT content_id FROM messages WHERE status IN ('queued', 'retrying') AND next_attempt <= ? "
+                "ORDER BY next_attempt, rowid LIMIT 1",
+                (now,)
+            ).fetchone()
+            if first is None:
+                conn.execute("COMMIT")
+                return None
+            rows = conn.execute(
+                "SELECT id, recipient, attempts FROM messages "
+                "WHERE content_id = ? AND status IN ('queued', 'retrying') AND next_attempt <= ? "
+                "ORDER BY rowid LIMIT ?",
+                (first['content_id'], now, self.batch_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE messages SET status = 'sending', attempts = attempts + 1 WHERE id = ?",
+                [(row['id'],) for row in rows]
+            )
+            content = conn.execute("SELECT * FROM contents WHERE id = ?", (first['content_id'],)).fetchone()
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return dict(content), [dict(row) for row in rows]
+    
+    def _next_due_in(self) -> Optional[float]:
+        """Seconds until the earliest retry, or None when nothing is waiting"""
+        row = self._conn.execute(
+            "SELECT MIN(next_attempt) FROM messages WHERE status IN ('queued', 'retrying')"
+        ).fetchone()
+        return None if row[0] is None else max(row[0] - time.time(), 0)
+    
+    async def _send_batch(self, content: Dict, rows: List[Dict]):
+        try:
+            outcomes = await self._loop.run_in_executor(self._executor, self._deliver, content, rows)
+        except Exception as e:
+            outcomes = {row['recipient']: e for row in rows}
+        
+        # The emails went out: keep trying to record that, or they would be sent again
+        while True:
+            try:
+                self._record(rows, outcomes)
+                break
+            except Exception as e:
+                get_telemetry().event('outbox.record_failed', retry_in=ERROR_RETRY_SECONDS,
+                                      error_type=type(e).__name__, error=str(e))
+                await asyncio.sleep(ERROR_RETRY_SECONDS)
+        try:
+            self._release_contents([content['id']])
+        except Exception as e:
+            get_telemetry().event('outbox.release_failed', content_id=content['id'],
+                                  error_type=type(e).__name__, error=str(e))
+    
+    def _deliver(self, content: Dict, rows: List[Dict]) -> Dict[str, Optional[Exception]]:
+        """Runs in a sender thread: encode the email once and send it to the batch"""
+        # build_messages sends without a missing attachment; an outbox email must not
+        if content['attachment_path'] and not os.path.exists(content['attachment_path']):
+            raise FileNotFoundError(f"Outbox attachment is missing: {content['attachment_path']}")
+        messages = self.service.build_messages(
+            content['subject'], content['body'], pdf_path=content['attachment_path'],
+            pdf_name=content['attachment_name']
+        )
+        return self.service.deliver(messages, [row['recipient'] for row in rows])
+    
+    def _record(self, rows: List[Dict], outcomes: Dict[str, Optional[Exception]]):
+        """Mark each message sent, failed, or due again after its backoff"""
+        now, sent = time.time(), _now()
+        updates = []
+        for row in rows:
+            error = outcomes.get(row['recipient'])
+            attempts = row['attempts'] + 1
+            if error is None:
+                updates.append(('sent', now, None, sent, row['id']))
+            elif _is_permanent(error) or attempts >= self.max_attempts:
+                updates.append(('failed', now, f"{type(error).__name__}: {error}", None, row['id']))
+            else:
+                delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+                updates.append(('retrying', now + delay, f"{type(error).__name__}: {error}", None, row['id']))
+        
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "UPDATE messages SET status = ?, next_attempt = ?, error = ?, sent = ? WHERE id = ?", updates
+            )
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+    
+    def _release_contents(self, content_ids: List[str]):
+        """Delete the content and attachment of each email with no message still pending"""
+        if not content_ids:
+            return
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            finished = conn.execute(
+                f"SELECT id, attachment_path FROM contents WHERE id IN ({','.join('?' * len(content_ids))}) "
+                f"AND NOT EXISTS (SELECT 1 FROM messages WHERE content_id = contents.id "
+                f"AND status IN ({','.join('?' * len(PENDING_STATES))}))",
+                list(content_ids) + list(PENDING_STATES)
+            ).fetchall()
+            conn.executemany("DELETE FROM contents WHERE id = ?", [(row['id'],) for row in finished])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        for row in finished:
+            if row['attachment_path']:
+                Path(row['attachment_path']).unlink(missing_ok=True)
+
+
+# Singleton instance; Streamlit sessions run in parallel threads, and a
+# second outbox would start a second sender on the same table
+_email_outbox = None
+_email_outbox_lock = threading.Lock()
+
+
+def get_email_outbox():
+    """Get or create email outbox singleton"""
+    global _email_outbox
+    with _email_outbox_lock:
+        if _email_outbox is None:
+            _email_outbox = EmailOutbox()
+        return _email_outbox
@@ -0,0 +1,199 @@
+"""
+Extraction Cache for Road Safety Estimator
+Disk-backed, content-addressed cache of extracted document text and
+identified interventions, so re-uploading the same report skips parsing
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from document_parser import PARSER_VERSION
+from telemetry import get_telemetry
+
+
+class ExtractionCache:
+    """
+    Size-bounded LRU cache of parsed documents keyed by SHA-256 of the file bytes.
+    
+    Each entry is a gzip-compressed JSON-lines file: one line per page of
+    text followed by a final line holding the interventions. Entries are
+    written page by page so the full text never has to be held in memory.
+    A hit refreshes the entry's modification time, which is what eviction
+    orders by.
+    """
+    
+    ENTRY_SUFFIX = '.jsonl.gz'
+    
+    def __init__(self, cache_dir: str = None, max_bytes: int = None):
+        """Initialize the cache directory and size limit"""
+        self.cache_dir = Path(cache_dir or os.getenv('EXTRACTION_CACHE_DIR', os.path.join('.cache', 'extraction')))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv('EXTRACTION_CACHE_MAX_MB', '256')) * 1024 * 1024
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def key_for(self, data: bytes, file_name: str) -> str:
+        """Build the cache key from the document bytes, its type and the parser version"""
+        digest = hashlib.sha256(data)
+        digest.update(f"|{Path(file_name).suffix.lower()}|{PARSER_VERSION}".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def get(self, key: str, preview_chars: int = 0) -> Optional[Dict]:
+        """
+        Look up a parsed document
+        
+        Only the first preview_chars of the text are decoded; callers that
+        need all of it read the pages with iter_pages.
+        
+        Args:
+            key: Cache key from key_for
+            preview_chars: Characters of text to return as the preview
+        
+        Returns:
+            dict: {'preview': str, 'interventions': list} or None on a miss
+        """
+        path = self._entry_path(key)
+        try:
+            preview = []
+            preview_length = 0
+            interventions = None
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('{"p"'):
+                        if preview_length < preview_chars:
+                            page = json.loads(line)['p'] + "\n"
+                            preview.append(page)
+                            preview_length += len(page)
+                        continue
+                    interventions = json.loads(line)['i']
+            if interventions is None:
+                raise ValueError("incomplete cache entry")
+            os.utime(path)
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except (OSError, EOFError, ValueError, KeyError):
+            # Corrupt or truncated entry: drop it and treat as a miss
+            path.unlink(missing_ok=True)
+            self._count('misses')
+            return None
+        
+        self._count('hits')
+        return {
+            'preview': "".join(preview)[:preview_chars],
+            'interventions': interventions
+        }
+    
+    def iter_pages(self, key: str) -> Iterator[str]:
+        """
+        Text of a cached document page by page, without holding it all in memory
+        
+        Raises:
+            FileNotFoundError: If the document is not cached
+        """
+        with gzip.open(self._entry_path(key), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('{"p"'):
+                    yield json.loads(line)['p']
+    
+    def open_writer(self, key: str) -> 'ExtractionCacheWriter':
+        """Start a new entry that pages are appended to as they are extracted"""
+        return ExtractionCacheWriter(self, key)
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size, for sizing the cache"""
+        entries = list(self._iter_entries())
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'size_bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes
+        }
+    
+    def clear(self):
+        """Remove every cache entry"""
+        for path, _, _ in self._iter_entries():
+            path.unlink(missing_ok=True)
+    
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.ENTRY_SUFFIX}"
+    
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+        get_telemetry().count(f"extraction_cache.{counter}", amount)
+    
+    def _iter_entries(self):
+        """Yield (path, size, last_used) for each entry"""
+        for path in self.cache_dir.glob(f"*{self.ENTRY_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+    
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._iter_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+
+
+class ExtractionCacheWriter:
+    """Writes one cache entry page by page; nothing is visible until commit()"""
+    
+    def __init__(self, cache: ExtractionCache, key: str):
+        self.cache = cache
+        self.key = key
+        self._temp_path = cache.cache_dir / f".{key}.{uuid.uuid4().hex}.tmp"
+        self._file = gzip.open(self._temp_path, 'wt', encoding='utf-8')
+    
+    def add_page(self, text: str):
+        """Append one page of extracted text"""
+        self._file.write(json.dumps({'p': text}) + "\n")
+    
+    def commit(self, interventions: List[Dict]):
+        """Finish the entry, publish it atomically and enforce the size limit"""
+        self._file.write(json.dumps({'i': interventions}) + "\n")
+        self._file.close()
+        os.replace(self._temp_path, self.cache._entry_path(self.key))
+        self.cache._evict()
+    
+    def discard(self):
+        """Abandon the entry (e.g. extraction failed)"""
+        self._file.close()
+        self._temp_path.unlink(missing_ok=True)
+
+
+# Singleton instance
+_extraction_cache = None
+
+
+def get_extraction_cache():
+    """Get or create extraction cache singleton"""
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = ExtractionCache()
+    return _extraction_cache
@@ -0,0 +1,135 @@
+"""
+Intervention Table for Road Safety Estimator
+Columnar container passed between parsing, matching, pricing and
+reporting, so each stage adds columns instead of copying every record
+"""
+
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Columns of the records DocumentParser produces, in record order
+INTERVENTION_COLUMNS = ('type', 'description', 'location', 'chainage', 'quantity', 'unit')
+
+
+class InterventionTable:
+    """
+    Interventions stored as equal-length NumPy columns, one row per item.
+    
+    Text columns are object arrays and amounts are float64. Tables derived
+    from one another share column arrays; adding or replacing a column
+    never touches the others, and filtering rows gathers each column once.
+    """
+    
+    def __init__(self, columns: Dict[str, np.ndarray] = None):
+        """
+        Args:
+            columns: Column name -> array, all of the same length
+        """
+        self._columns: Dict[str, np.ndarray] = {}
+        self._length = 0
+        for name, values in (columns or {}).items():
+            if not self._columns:
+                self._length = len(values)
+            self.add_column(name, values)
+    
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], columns: Sequence[str] = None) -> 'InterventionTable':
+        """
+        Build a table from dicts, e.g. DocumentParser.iter_interventions(),
+        consuming them one at a time
+        
+        Args:
+            records: Intervention dicts
+            columns: Columns to keep (default: keys of the first record);
+                keys missing from a record become None
+        """
+        values: Dict[str, List] = {name: [] for name in columns} if columns else None
+        for record in records:
+            if values is None:
+                values = {name: [] for name in record}
+            for name, column in values.items():
+                column.append(record.get(name))
+        
+        return cls({name: _to_array(column) for name, column in (values or {}).items()})
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+    
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._columns[name]
+    
+    @property
+    def column_names(self) -> List[str]:
+        return list(self._columns)
+    
+    def get(self, name: str, default=None) -> np.ndarray:
+        """Column by name, or a column filled with default if it is missing"""
+        if name in self._columns:
+            return self._columns[name]
+        return _full(self._length, default)
+    
+    def add_column(self, name: str, values):
+        """Add or replace a column; a scalar value is repeated for every row"""
+        if np.ndim(values) == 0:
+            values = _full(self._length, values)
+        elif not isinstance(values, np.ndarray):
+            values = _to_array(list(values))
+        if len(values) != self._length:
+            raise ValueError(f"Column '{name}' has {len(values)} rows, table has {self._length}")
+        self._columns[name] = values
+    
+    def rename_column(self, old_name: str, new_name: str):
+        """Rename a column in place, keeping its position"""
+        self._columns = {
+            (new_name if name == old_name else name): values for name, values in self._columns.items()
+        }
+    
+    def filter(self, mask: np.ndarray) -> 'InterventionTable':
+        """
+        New table with the rows where mask is True. Shares every column
+        with this table when no row is dropped.
+        """
+        if mask.all():
+            return InterventionTable(dict(self._columns))
+        return InterventionTable({name: values[mask] for name, values in self._columns.items()})
+    
+    def iter_records(self) -> Iterator[Dict]:
+        """Yield each row as a dict, for consumers that work item by item"""
+        names = list(self._columns)
+        for row in zip(*(values.tolist() for values in self._columns.values())):
+            yield dict(zip(names, row))
+    
+    def to_records(self) -> List[Dict]:
+        """Rows as the list of dicts the record-based APIs use"""
+        return list(self.iter_records())
+    
+    def to_frame(self) -> pd.DataFrame:
+        """Columns as a DataFrame"""
+        return pd.DataFrame(self._columns, copy=False)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+
+
+def _to_array(values: List) -> np.ndarray:
+    """Numbers become int64/float64 columns, anything else an object column"""
+    if values and all(_is_number(value) for value in values):
+        return np.array(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _full(length: int, value) -> np.ndarray:
+    """Column repeating one value"""
+    if _is_number(value):
+        return np.full(length, value)
+    array = np.empty(length, dtype=object)
+    array.fill(value)
+    return array
@@ -0,0 +1,497 @@
+"""
+Job Queue for Road Safety Estimator
+Persistent SQLite job table and a pool of background worker processes
+that parse, match, price and report uploaded documents outside the
+Streamlit script thread
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from document_parser import DocumentParser
+from extraction_cache import get_extraction_cache
+from matching_engine import MatchingEngine
+from price_fetcher import PricedEstimate
+from report_generator import ReportGenerator
+from telemetry import get_telemetry
+
+# Pipeline stages of a job, in the order they run
+JOB_STAGES = ('parse', 'match', 'price', 'report')
+
+# Characters of extracted text kept with a result for the analysis preview
+TEXT_PREVIEW_CHARS = 1000
+
+# Minimum seconds between progress writes of a running stage
+PROGRESS_INTERVAL = 0.25
+
+# Seconds between liveness writes of a running job, and the age after
+# which a running job whose process cannot be seen is taken to be dead
+HEARTBEAT_INTERVAL = 10
+STALE_AFTER = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    error TEXT,
+    created TEXT NOT NULL,
+    started TEXT,
+    finished TEXT,
+    worker_host TEXT,
+    worker_pid INTEGER,
+    heartbeat REAL
+)
+"""
+
+# Job runner of each worker process, built once per worker
+_worker_runner = None
+
+
+def _init_worker(db_path: str, jobs_dir: str):
+    """Build the parser and matcher once per worker process"""
+    global _worker_runner
+    _worker_runner = JobRunner(db_path, jobs_dir)
+
+
+def _run_in_worker(job_id: str):
+    _worker_runner.run(job_id)
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Autocommit connection; WAL lets the app read while workers write"""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process of this machine is still running"""
+    if os.name == 'nt':
+        # os.kill would terminate it; leave the decision to the heartbeat
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _json_default(value):
+    """Encode the NumPy scalars that standards columns carry into records"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JobRunner:
+    """
+    Runs queued jobs inside a worker process: DocumentParser ->
+    MatchingEngine -> PricedEstimate -> ReportGenerator, writing stage
+    progress to the job table as it goes
+    """
+    
+    def __init__(self, db_path: str, jobs_dir: str):
+        self.db_path = db_path
+        self.jobs_dir = Path(jobs_dir)
+        self.parser = DocumentParser()
+        self.matcher = MatchingEngine()
+    
+    def run(self, job_id: str):
+        """Claim a queued job and run every stage; results go to the job directory"""
+        with closing(_connect(self.db_path)) as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', started = ?, stage = ?, done = 0, total = 0, "
+                "worker_host = ?, worker_pid = ?, heartbeat = ? WHERE id = ? AND status = 'queued'",
+                (_now(), JOB_STAGES[0], socket.gethostname(), os.getpid(), time.time(), job_id)
+            ).rowcount
+            if not claimed:
+                return
+            row = conn.execute("SELECT file_name, options FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            
+            stop_heartbeat = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, stop_heartbeat), daemon=True)
+            heartbeat.start()
+            try:
+                summary = self._process(conn, job_id, row['file_name'], json.loads(row['options']))
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', summary = ?, finished = ? WHERE id = ?",
+                    (json.dumps(summary), _now(), job_id)
+                )
+            except Exception as e:
+                get_telemetry().event('job.failed', job_id=job_id, error_type=type(e).__name__, error=str(e))
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                    (f"{type(e).__name__}: {e}", _now(), job_id)
+                )
+            finally:
+                stop_heartbeat.set()
+                heartbeat.join()
+    
+    def _heartbeat(self, job_id: str, stop: threading.Event):
+        """Mark a running job as alive until stop is set, so other processes leave it alone"""
+        with closing(_connect(self.db_path)) as conn:
+            while not stop.wait(HEARTBEAT_INTERVAL):
+                conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'",
+                             (time.time(), job_id))
+    
+    def _process(self, conn: sqlite3.Connection, job_id: str, file_name: str, options: Dict) -> Dict:
+        job_dir = self.jobs_dir / job_id
+        source_path = job_dir / file_name
+        
+        # Parse, reusing the extraction cache the app shares
+        cache = get_extraction_cache()
+        cache_key = cache.key_for(source_path.read_bytes(), file_name)
+        cached = cache.get(cache_key, preview_chars=TEXT_PREVIEW_CHARS)
+        if cached is not None:
+            interventions = cached['interventions']
+            extracted_text = cached['preview']
+        else:
+            preview_pages = []
+            cache_writer = cache.open_writer(cache_key)
+            
+            def pages_with_preview(file):
+                for page in self.parser.iter_pages(file, self._stage_progress(conn, job_id, 'parse')):
+                    if sum(map(len, preview_pages)) < TEXT_PREVIEW_CHARS:
+                        preview_pages.append(page[:TEXT_PREVIEW_CHARS])
+                    cache_writer.add_page(page)
+                    yield page
+            
+            try:
+                with open(source_path, 'rb') as file:
+                    interventions = list(self.parser.identify_interventions_in_pages(pages_with_preview(file)))
+            except Exception:
+                cache_writer.discard()
+                raise
+            cache_writer.commit(interventions)
+            extracted_text = "\n".join(preview_pages)[:TEXT_PREVIEW_CHARS]
+        
+        matched_data = self.matcher.match_standards_batch(
+            interventions, self._stage_progress(conn, job_id, 'match')
+        )
+        estimate = PricedEstimate(
+            matched_data, options['location'], options['year'], self._stage_progress(conn, job_id, 'price')
+        )
+        report_path = ReportGenerator().generate_report(
+            data=estimate.records,
+            project_name=options['project_name'],
+            summary=estimate.summary,
+            output_path=str(job_dir / 'report.pdf'),
+            progress=self._stage_progress(conn, job_id, 'report')
+        )
+        
+        result = {
+            'interventions': interventions,
+            'extracted_text': extracted_text,
+            'matched_data': matched_data,
+            'report_path': os.path.abspath(report_path),
+            'extraction_cache_hit': cached is not None
+        }
+        temp_path = job_dir / 'result.json.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, default=_json_default)
+        os.replace(temp_path, job_dir / 'result.json')
+        
+        return {
+            'interventions': len(interventions),
+            'matched': estimate.summary.total_items,
+            'grand_total': estimate.summary.grand_total
+        }
+    
+    def _stage_progress(self, conn: sqlite3.Connection, job_id: str, stage: str) -> Callable[[int, int], None]:
+        """Progress callback that records (done, total) of a stage, at most every PROGRESS_INTERVAL"""
+        conn.execute("UPDATE jobs SET stage = ?, done = 0, total = 0 WHERE id = ?", (stage, job_id))
+        last_write = 0.0
+        
+        def update(done: int, total: int):
+            nonlocal last_write
+            now = time.monotonic()
+            if done >= total or now - last_write >= PROGRESS_INTERVAL:
+                last_write = now
+                conn.execute("UPDATE jobs SET done = ?, total = ? WHERE id = ?", (done, total, job_id))
+        
+        return update
+
+
+class JobQueue:
+    """
+    Background document processing with a persistent job table.
+    
+    Uploaded bytes are saved under jobs_dir and a row is added to the
+    SQLite table; worker processes claim rows, update their stage progress
+    and write results next to the upload. The app only reads the table,
+    so a page reload or a lost browser session never loses a job, and jobs
+    left queued or running when the server stopped are resumed when the
+    queue is next created.
+    """
+    
+    def __init__(self, db_path: str = None, jobs_dir: str = None, workers: int = None):
+        """
+        Args:
+            db_path: SQLite job table (default: jobs.sqlite3 in jobs_dir)
+            jobs_dir: Directory holding each job's upload and results
+            workers: Documents processed at the same time
+        """
+        self.jobs_dir = Path(jobs_dir or os.getenv('JOB_DIR', os.path.join('.cache', 'jobs')))
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(db_path or os.getenv('JOB_DB', self.jobs_dir / 'jobs.sqlite3'))
+        self.workers = workers or int(os.getenv('JOB_WORKERS', str(min(4, os.cpu_count() or 1))))
+        
+        self._lock = threading.Lock()
+        self._executor = None
+        self._isolation_pools = set()
+        self._stopped = threading.Event()
+        with closing(_connect(self.db_path)) as conn:
+            conn.execute(_SCHEMA)
+        self._resume()
+        
+        # Jobs of a process that dies later are picked up while this one runs
+        threading.Thread(target=self._watch_stale, daemon=True).start()
+    
+    def submit(self, data: bytes, file_name: str, location: str = "Tamil Nadu", year: int = 2024,
+               project_name: str = None) -> str:
+        """
+        Queue a document for processing
+        
+        Args:
+            data: Document bytes
+            file_name: Original file name; its extension selects the parser
+            location: State/UT used for pricing
+            year: Price reference year
+            project_name: Project named in the report (default: the file name)
+        
+        Returns:
+            str: Job id
+        """
+        job_id = uuid.uuid4().hex
+        file_name = Path(file_name).name
+        job_dir = self.jobs_dir / job_id
+        job_dir.mkdir()
+        (job_dir / file_name).write_bytes(data)
+        
+        options = {
+            'location': location,
+            'year': year,
+            'project_name': project_name or Path(file_name).stem
+        }
+        with closing(_connect(self.db_path)) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, file_name, options, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, file_name, json.dumps(options), _now())
+            )
+        self._dispatch(job_id)
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Current state of a job, or None if it does not exist"""
+        with closing(_connect(self.db_path)) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+    
+    def list_jobs(self, limit: int = 20, job_ids: Sequence[str] = None) -> List[Dict]:
+        """
+        Most recently submitted jobs first
+        
+        Args:
+            limit: Jobs returned at most
+            job_ids: Only these jobs, e.g. the ones a session submitted
+                (default: every job in the table)
+        """
+        query, params = "SELECT * FROM jobs", []
+        if job_ids is not None:
+            job_ids = list(job_ids)
+            if not job_ids:
+                return []
+            query += f" WHERE id IN ({', '.join('?' * len(job_ids))})"
+            params += job_ids
+        with closing(_connect(self.db_path)) as conn:
+            rows = conn.execute(f"{query} ORDER BY created DESC, rowid DESC LIMIT ?", params + [limit]).fetchall()
+        return [self._to_job(row) for row in rows]
+    
+    def load_result(self, job_id: str) -> Dict:
+        """
+        Results of a finished job
+        
+        Returns:
+            dict: interventions, extracted_text (preview), matched_data,
+                report_path and extraction_cache_hit
+        """
+        with open(self.jobs_dir / job_id / 'result.json', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes; unfinished jobs resume with the next queue"""
+        self._stopped.set()
+        with self._lock:
+            executors = list(self._isolation_pools) + ([self._executor] if self._executor is not None else [])
+            self._executor = None
+            self._isolation_pools.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+    
+    def _resume(self):
+        """Requeue jobs interrupted by a restart and dispatch everything queued"""
+        self._requeue_stale()
+        with closing(_connect(self.db_path)) as conn:
+            job_ids = [row['id'] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created, rowid"
+            )]
+        for job_id in job_ids:
+            self._dispatch(job_id)
+    
+    def _requeue_stale(self) -> List[str]:
+        """
+        Put running jobs whose worker is gone back in the queue. A job
+        still owned by a live process (another app or API server sharing
+        the table) is left running.
+        
+        Returns:
+            list: Ids of the requeued jobs
+        """
+        host, now = socket.gethostname(), time.time()
+        requeued = []
+        with closing(_connect(self.db_path)) as conn:
+            running = conn.execute(
+                "SELECT id, worker_host, worker_pid, heartbeat FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            for row in running:
+                dead = row['worker_host'] == host and row['worker_pid'] and not _pid_alive(row['worker_pid'])
+                if not dead and row['heartbeat'] is not None and now - row['heartbeat'] < STALE_AFTER:
+                    continue
+                # Only if no heartbeat arrived since it was read
+                if conn.execute(
+                    "UPDATE jobs SET status = 'queued', stage = NULL, done = 0, total = 0, worker_pid = NULL "
+                    "WHERE id = ? AND status = 'running' AND heartbeat IS ?",
+                    (row['id'], row['heartbeat'])
+                ).rowcount:
+                    get_telemetry().event('job.requeued', job_id=row['id'], worker_pid=row['worker_pid'])
+                    requeued.append(row['id'])
+        return requeued
+    
+    def _watch_stale(self):
+        while not self._stopped.wait(STALE_AFTER / 2):
+            try:
+                for job_id in self._requeue_stale():
+                    self._dispatch(job_id)
+            except Exception as e:
+                get_telemetry().event('job.stale_check_failed', error_type=type(e).__name__, error=str(e))
+    
+    def _dispatch(self, job_id: str, isolated: bool = False):
+        """Submit a job to the shared pool, or with isolated to a one-worker pool of its own"""
+        with self._lock:
+            if isolated:
+                executor = self._new_pool(1)
+                self._isolation_pools.add(executor)
+            else:
+                if self._executor is None:
+                    self._executor = self._new_pool(self.workers)
+                executor = self._executor
+            future = executor.submit(_run_in_worker, job_id)
+        future.add_done_callback(lambda future: self._on_worker_done(job_id, executor, isolated, future))
+    
+    def _new_pool(self, workers: int) -> ProcessPoolExecutor:
+        # Spawn rather than fork: the Streamlit server is multi-threaded
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.db_path, str(self.jobs_dir))
+        )
+    
+    def _on_worker_done(self, job_id: str, executor: ProcessPoolExecutor, isolated: bool, future):
+        """
+        Handle a job whose worker process died. A dying worker breaks its
+        pool and every job the pool still held, so the culprit is unknown:
+        jobs that never started go back to the shared pool, and jobs that
+        were running are rerun each on a one-worker pool of its own. Only a
+        job that breaks its own pool is failed.
+        """
+        if isolated:
+            with self._lock:
+                self._isolation_pools.discard(executor)
+            executor.shutdown(wait=False)
+        error = future.exception() if not future.cancelled() else None
+        if error is None:
+            return
+        
+        if isinstance(error, BrokenProcessPool):
+            with self._lock:
+                # Replace the shared pool once, however many of its jobs report it
+                if self._executor is executor:
+                    self._executor = None
+                    executor.shutdown(wait=False, cancel_futures=True)
+            if not isolated:
+                if not self._stopped.is_set():
+                    self._retry_after_crash(job_id)
+                return
+        
+        with closing(_connect(self.db_path)) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (f"{type(error).__name__}: {error}", _now(), job_id)
+            )
+    
+    def _retry_after_crash(self, job_id: str):
+        """Resubmit a job lost with a broken shared pool"""
+        with closing(_connect(self.db_path)) as conn:
+            was_running = conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, done = 0, total = 0, worker_pid = NULL "
+                "WHERE id = ? AND status = 'running'",
+                (job_id,)
+            ).rowcount
+            queued = was_running or conn.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND status = 'queued'", (job_id,)
+            ).fetchone()
+        if was_running:
+            get_telemetry().event('job.requeued', job_id=job_id, reason='pool_broken')
+        if queued:
+            self._dispatch(job_id, isolated=bool(was_running))
+    
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        job['summary'] = json.loads(job['summary']) if job['summary'] else None
+        return job
+
+
+# Singleton instance; Streamlit sessions run in parallel threads, and a
+# second queue would start a second worker pool
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Get or create job queue singleton"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
@@ -1,20 +1,63 @@
+import numpy as np
 import pandas as pd
-from fuzzywuzzy import fuzz, process
-from typing import List, Dict
+from fuzzywuzzy import fuzz, process, utils
+from rapidfuzz.distance import Indel
+from rapidfuzz.process import cdist
+from typing import Callable, Iterable, List, Dict
 import os
 
+from intervention_table import InterventionTable
+from ngram_index import NGramIndex
+from standards_store import get_standards_store
+from telemetry import get_telemetry, traced
+
+# Marks a memo cache miss (None is a cached "no match")
+_NOT_CACHED = object()
+
+# Distinct types scored per similarity matrix; bounds its memory and sets
+# how often batch matching reports progress
+SCORING_CHUNK = 1024
+
 class MatchingEngine:
     """
     Matches identified interventions with IRC standards and specifications
     """
     
-    def __init__(self, database_path='GPT_Input_DB.xlsx'):
+    def __init__(self, database_path='GPT_Input_DB.xlsx', pruning_min_rows: int = 500,
+                 candidate_limit: int = 50, verify_pruning: bool = False,
+                 match_cache_size: int = 4096):
+        """
+        Args:
+            database_path: IRC standards workbook
+            pruning_min_rows: Standards tables at least this large are searched
+                through the n-gram candidate index instead of a full scan;
+                the best match is the same either way
+            candidate_limit: Candidates fuzzy-scored per query when pruning
+            verify_pruning: Check mode; also run the full scan and count
+                queries where pruning changed the best match. The match memo
+                is not used, so every query is checked
+            match_cache_size: Distinct queries whose best match is remembered,
+                in a memo shared by every engine of the process (0 disables
+                it for this engine)
+        """
         self.database_path = database_path
+        self.pruning_min_rows = pruning_min_rows
+        self.candidate_limit = candidate_limit
+        self.verify_pruning = verify_pruning
+        self.pruning_stats = {'queries': 0, 'mismatches': 0}
+        self.match_cache_size = match_cache_size
+        self.match_cache_stats = {'hits': 0, 'misses': 0}
         self.irc_database = None
+        self.database_version = None
+        self._choice_index = None
         self.load_database()
     
+    @traced('matcher.load_database', items=None)
     def load_database(self):
         """Load the IRC standards database"""
+        self._choice_index = None
+        store = get_standards_store()
+        
         # Check if database exists in parent directory
         db_paths = [
             self.database_path,
@@ -22,18 +65,21 @@ class MatchingEngine:
             os.path.join('..', '..', self.database_path)
         ]
         
+        # The store parses each file once per process and remembers files
+        # that failed to parse, so repeat constructions cost a stat() per path
         for path in db_paths:
             if os.path.exists(path):
-                try:
-                    self.irc_database = pd.read_excel(path)
-                    print(f"Database loaded from: {path}")
+                database = store.load(path)
+                if database is not None:
+                    self.irc_database = database
+                    self.database_version = store.get_version(path)
+                    get_telemetry().event('matcher.database', path=path, standards=len(database))
                     return
-                except Exception as e:
-                    print(f"Error loading database from {path}: {e}")
         
         # Create a default database if file not found
-        print("Creating default IRC standards database...")
-        self.irc_database = self._create_default_database()
+        self.irc_database = store.get_default_database(self._create_default_database)
+        self.database_version = 'default'
+        get_telemetry().event('matcher.database', path='default', standards=len(self.irc_database))
     
     def _create_default_database(self) -> pd.DataFrame:
         """Create a default IRC standards database"""
@@ -85,6 +131,7 @@ class MatchingEngine:
         
         return pd.DataFrame(data)
     
+    @traced('matcher.match', mode='single')
     def match_standards(self, interventions: List[Dict]) -> List[Dict]:
         """
         Match interventions with IRC standards from database
@@ -118,25 +165,314 @@ class MatchingEngine:
         """
         intervention_type = intervention['type']
         
+        # Interventions share a handful of types: score each one only once
+        cache_key = (self._prepare_query(intervention_type), self.database_version)
+        row = self._get_cached_match(cache_key)
+        if row is _NOT_CACHED:
+            row = self._search_best_row(intervention_type)
+            self._cache_match(cache_key, row)
+        
+        return None if row is None else self._get_row(row)
+    
+    def _search_best_row(self, intervention_type: str):
+        """Row position of the best matching standard, or None below the threshold"""
         # Get all intervention types from database
-        db_types = self.irc_database['Intervention Type'].tolist()
+        choice_index = self._get_choice_index()
+        db_types = choice_index['names']
+        
+        # Use fuzzy matching to find best match, shortlisting candidates
+        # through the n-gram index on large standards tables
+        if len(db_types) >= self.pruning_min_rows:
+            best_match = self._find_best_candidate(intervention_type, db_types)
+        else:
+            best_match = process.extractOne(
+                intervention_type,
+                db_types,
+                scorer=fuzz.token_sort_ratio
+            )
         
-        # Use fuzzy matching to find best match
+        if best_match and best_match[1] > 60:  # 60% match threshold
+            # Get the matching row from database
+            return choice_index['rows_by_name'][best_match[0]]
+        
+        return None
+    
+    def _find_best_candidate(self, intervention_type: str, db_types: List[str]):
+        """
+        Fuzzy-score the rows the n-gram index shortlists, then every other
+        row whose score bound reaches the shortlist's best (or the match
+        threshold), so the result is always that of a full scan.
+        
+        In verify_pruning mode the full scan runs as well; any query where
+        pruning would have changed the best match is counted and reported,
+        and the full-scan result is used.
+        """
+        query = self._prepare_query(intervention_type)
+        rows = self._get_ngram_index().candidates(query, self.candidate_limit)
         best_match = process.extractOne(
             intervention_type,
-            db_types,
+            [db_types[row] for row in rows],
             scorer=fuzz.token_sort_ratio
         )
         
-        if best_match and best_match[1] > 60:  # 60% match threshold
-            # Get the matching row from database
-            match_idx = self.irc_database[
-                self.irc_database['Intervention Type'] == best_match[0]
-            ].index[0]
+        # A row outside the shortlist can only win if its bound reaches the best score so far;
+        # below the threshold (60) there is no match to lose
+        floor = max(best_match[1] if best_match else 0, 61)
+        remaining = np.setdiff1d(np.flatnonzero(self._score_bounds(query) >= floor), rows)
+        if len(remaining):
+            rows = np.union1d(rows, remaining)
+            best_match = process.extractOne(
+                intervention_type,
+                [db_types[row] for row in rows],
+                scorer=fuzz.token_sort_ratio
+            )
+        get_telemetry().count('matcher.pruning.scored', len(rows))
+        
+        if self.verify_pruning:
+            exact_match = process.extractOne(intervention_type, db_types, scorer=fuzz.token_sort_ratio)
+            self.pruning_stats['queries'] += 1
+            # Below the threshold both mean "no match", whichever row scored best
+            outcome, exact_outcome = (
+                match[:2] if match and match[1] > 60 else None for match in (best_match, exact_match)
+            )
+            if outcome != exact_outcome:
+                self.pruning_stats['mismatches'] += 1
+                get_telemetry().count('matcher.pruning.mismatches')
+                get_telemetry().event('matcher.pruning.mismatch', query=intervention_type,
+                                      pruned=best_match, exact=exact_match)
+                return exact_match
+        
+        return best_match
+    
+    @traced('matcher.match', mode='batch')
+    def match_standards_batch(self, interventions: List[Dict],
+                              progress: Callable[[int, int], None] = None) -> List[Dict]:
+        """
+        Match interventions with IRC standards in one batched scoring pass.
+        
+        Scores distinct intervention types against every standard with
+        similarity matrices instead of one extractOne call per intervention.
+        Returns the same results as match_standards.
+        
+        Args:
+            progress: Called with (types resolved, distinct types) as
+                chunks of types are scored
+        """
+        if not interventions:
+            return []
+        
+        best_rows = self._resolve_best_rows((intervention['type'] for intervention in interventions), progress)
+        
+        matched_data = []
+        for intervention in interventions:
+            row = best_rows[intervention['type']]
+            if row is None:
+                continue
             
-            return self.irc_database.iloc[match_idx].to_dict()
+            match = self._get_row(row)
+            
+            matched_data.append({
+                'intervention_type': intervention['type'],
+                'description': intervention['description'],
+                'location': intervention.get('location', ''),
+                'chainage': intervention.get('chainage', ''),
+                'quantity': intervention.get('quantity', 1.0),
+                'unit': match['Unit'],
+                'irc_code': match['IRC Code'],
+                'specification': match['Specification'],
+                'standard_rate': match['Standard Rate'],
+                'category': match['Category']
+            })
         
-        return None
+        return matched_data
+    
+    @traced('matcher.match', mode='table')
+    def match_standards_table(self, table: InterventionTable,
+                              progress: Callable[[int, int], None] = None) -> InterventionTable:
+        """
+        Match an InterventionTable with IRC standards, column-wise.
+        
+        Returns a table of the matched rows (sharing the input's columns when
+        every row matched) with 'type' renamed to 'intervention_type' and the
+        standard's unit, irc_code, specification, standard_rate and category
+        added as columns. Same rows and values as match_standards_batch.
+        """
+        codes, types = pd.factorize(table['type'])
+        best_rows = self._resolve_best_rows(types, progress)
+        rows = np.array([-1 if best_rows[t] is None else best_rows[t] for t in types], dtype=np.int64)
+        # Code -1 marks a missing type: unmatched, not the last distinct type
+        rows = np.where(codes >= 0, rows[codes] if len(rows) else -1, -1)
+        
+        matched = table.filter(rows >= 0)
+        rows = rows[rows >= 0]
+        matched.rename_column('type', 'intervention_type')
+        for column, default in (('location', ''), ('chainage', ''), ('quantity', 1.0)):
+            if column not in matched:
+                matched.add_column(column, default)
+        
+        for column, database_column in (
+            ('unit', 'Unit'),
+            ('irc_code', 'IRC Code'),
+            ('specification', 'Specification'),
+            ('standard_rate', 'Standard Rate'),
+            ('category', 'Category')
+        ):
+            matched.add_column(column, self.irc_database[database_column].to_numpy()[rows])
+        
+        return matched
+    
+    def _resolve_best_rows(self, intervention_types: Iterable[str],
+                           progress: Callable[[int, int], None] = None) -> Dict:
+        """
+        Best standards row (or None) for each distinct intervention type,
+        from the memo cache or batched similarity matrices for the rest
+        """
+        choices = self._get_choice_index()['choices']
+        
+        # Resolve each distinct type once, from the memo cache when possible
+        best_rows = {}
+        pending_types = []
+        pending_queries = []
+        for intervention_type in intervention_types:
+            if intervention_type in best_rows:
+                continue
+            query = self._prepare_query(intervention_type)
+            row = self._get_cached_match((query, self.database_version))
+            best_rows[intervention_type] = row
+            if row is _NOT_CACHED:
+                pending_types.append(intervention_type)
+                pending_queries.append(query)
+        
+        cached = len(best_rows) - len(pending_types)
+        for chunk_start in range(0, len(pending_queries), SCORING_CHUNK):
+            chunk_types = pending_types[chunk_start:chunk_start + SCORING_CHUNK]
+            chunk_queries = pending_queries[chunk_start:chunk_start + SCORING_CHUNK]
+            if choices:
+                similarity = cdist(chunk_queries, choices, scorer=Indel.normalized_similarity, dtype=np.float64)
+                # Same integer scores as fuzz.token_sort_ratio (round half to even);
+                # argmax then picks the first of tied choices, like extractOne
+                scores = np.round(100 * similarity)
+                rows = scores.argmax(axis=1)
+                best_scores = scores[np.arange(len(chunk_queries)), rows]
+            
+            for i, (intervention_type, query) in enumerate(zip(chunk_types, chunk_queries)):
+                row = int(rows[i]) if choices and best_scores[i] > 60 else None  # 60% match threshold
+                best_rows[intervention_type] = row
+                self._cache_match((query, self.database_version), row)
+            
+            if progress:
+                progress(cached + chunk_start + len(chunk_queries), len(best_rows))
+        
+        if progress and not pending_queries:
+            progress(len(best_rows), len(best_rows))
+        
+        return best_rows
+    
+    def get_match_cache_info(self) -> Dict:
+        """Memo cache counters of this engine, to confirm repeated types are collapsed"""
+        lookups = self.match_cache_stats['hits'] + self.match_cache_stats['misses']
+        memo = self._get_match_memo()
+        return {
+            **self.match_cache_stats,
+            'hit_rate': self.match_cache_stats['hits'] / lookups if lookups else 0.0,
+            'size': len(memo) if memo is not None else 0,
+            'max_size': memo.max_size if memo is not None else 0
+        }
+    
+    def _get_match_memo(self):
+        # A remembered match would skip the check verify_pruning is for
+        if self.match_cache_size <= 0 or self.verify_pruning:
+            return None
+        return get_standards_store().get_match_memo(self.match_cache_size)
+    
+    def _get_cached_match(self, key):
+        """Remembered best row for a (query, database version) key, or _NOT_CACHED"""
+        memo = self._get_match_memo()
+        row = memo.get(key, _NOT_CACHED) if memo is not None else _NOT_CACHED
+        if row is _NOT_CACHED:
+            self.match_cache_stats['misses'] += 1
+            get_telemetry().count('matcher.memo.misses')
+        else:
+            self.match_cache_stats['hits'] += 1
+            get_telemetry().count('matcher.memo.hits')
+        return row
+    
+    def _cache_match(self, key, row):
+        """Remember a best row, evicting the least recently used entry when full"""
+        memo = self._get_match_memo()
+        if memo is not None:
+            memo.put(key, row)
+    
+    def _get_choice_index(self):
+        """
+        Return the standards names (raw and prepared for scoring), the first
+        row of each name, and a cache of row dicts, built once per loaded
+        database
+        """
+        if self._choice_index is None:
+            names = self.irc_database['Intervention Type'].tolist()
+            rows_by_name = {}
+            for row, name in enumerate(names):
+                rows_by_name.setdefault(name, row)
+            
+            self._choice_index = {
+                'names': names,
+                'choices': [self._sort_tokens(utils.full_process(name, force_ascii=True)) for name in names],
+                'rows_by_name': rows_by_name,
+                'records': {},
+                'ngram_index': None,
+                'char_counts': None
+            }
+        return self._choice_index
+    
+    def _get_row(self, row: int) -> Dict:
+        """Row of the database as a dict, converted once per row"""
+        records = self._get_choice_index()['records']
+        if row not in records:
+            records[row] = self.irc_database.iloc[row].to_dict()
+        return records[row]
+    
+    def _score_bounds(self, query: str) -> np.ndarray:
+        """
+        Upper bound of token_sort_ratio(query, name) for every row.
+        
+        The score is 100 * 2 * LCS / (total length) of the prepared strings,
+        and a common subsequence cannot use a character more often than
+        both strings contain it, so the shared character counts bound it.
+        """
+        choice_index = self._get_choice_index()
+        if choice_index['char_counts'] is None:
+            counts = np.array([
+                np.bincount(np.frombuffer(choice.encode('ascii'), dtype=np.uint8), minlength=128)
+                for choice in choice_index['choices']
+            ], dtype=np.uint16).reshape(-1, 128)
+            # Prepared names are ASCII letters, digits and spaces: keep the columns in use
+            alphabet = np.flatnonzero(counts.any(axis=0))
+            choice_index['char_counts'] = (alphabet, counts[:, alphabet], counts.sum(axis=1))
+        
+        alphabet, counts, lengths = choice_index['char_counts']
+        query_counts = np.bincount(np.frombuffer(query.encode('ascii'), dtype=np.uint8), minlength=128)[alphabet]
+        shared = np.minimum(counts, query_counts).sum(axis=1)
+        total = lengths + len(query)
+        return np.round(100 * np.divide(2 * shared, total, out=np.zeros(len(total)), where=total > 0))
+    
+    def _get_ngram_index(self) -> NGramIndex:
+        """Build the candidate index over names and specifications on first use"""
+        choice_index = self._get_choice_index()
+        if choice_index['ngram_index'] is None:
+            specifications = [
+                utils.full_process(str(text), force_ascii=True)
+                for text in self.irc_database['Specification'].tolist()
+            ]
+            choice_index['ngram_index'] = NGramIndex(choice_index['choices'], specifications)
+        return choice_index['ngram_index']
+    
+    def _prepare_query(self, query: str) -> str:
+        """Normalize a query exactly as process.extractOne does for token_sort_ratio"""
+        return self._sort_tokens(utils.full_process(utils.full_process(query), force_ascii=True))
+    
+    def _sort_tokens(self, text: str) -> str:
+        return " ".join(sorted(text.split())).strip()
     
     def get_specifications(self, intervention_type: str) -> Dict:
         """
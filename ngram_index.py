@@ -0,0 +1,82 @@
+"""
+N-gram Index for Road Safety Estimator
+Inverted index over IRC standards names and specifications, used to
+shortlist candidates before full fuzzy scoring on large standards tables
+"""
+
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+
+class NGramIndex:
+    """
+    Character n-gram index over standards names plus a word index over
+    their specifications.
+    
+    A row is scored by the Dice coefficient of its name n-grams with the
+    query's (so long names sharing a short query are not favored), plus a
+    smaller bonus per shared specification word. Only the best-scoring rows
+    are returned for fuzzy scoring. Strings are expected to be normalized
+    already.
+    """
+    
+    def __init__(self, names: List[str], specifications: List[str] = None, n: int = 3,
+                 specification_weight: float = 0.2):
+        """
+        Args:
+            names: Normalized standards names, one per row
+            specifications: Normalized specification text, one per row (optional)
+            n: Character n-gram length
+            specification_weight: Bonus when every query word appears in a
+                row's specification (Dice scores range from 0 to 1)
+        """
+        self.n = n
+        self.size = len(names)
+        self.specification_weight = specification_weight
+        
+        name_grams = [self.ngrams(name) for name in names]
+        self._name_gram_counts = np.array([len(grams) for grams in name_grams], dtype=np.float32)
+        self._name_postings = self._build_postings(name_grams)
+        self._specification_postings = self._build_postings(
+            set(text.split()) for text in (specifications or [])
+        )
+    
+    def ngrams(self, text: str) -> set:
+        """Character n-grams of text, padded so short words still produce grams"""
+        padded = f" {text} "
+        return {padded[i:i + self.n] for i in range(len(padded) - self.n + 1)}
+    
+    def candidates(self, query: str, limit: int = 50) -> np.ndarray:
+        """
+        Return up to `limit` row positions that overlap the query most,
+        in ascending row order (so ties resolve as in a full scan)
+        """
+        query_grams = self.ngrams(query)
+        shared = np.zeros(self.size, dtype=np.float32)
+        for gram in query_grams:
+            rows = self._name_postings.get(gram)
+            if rows is not None:
+                shared[rows] += 1
+        scores = 2 * shared / (self._name_gram_counts + len(query_grams))
+        
+        query_words = set(query.split())
+        for word in query_words:
+            rows = self._specification_postings.get(word)
+            if rows is not None:
+                scores[rows] += self.specification_weight / len(query_words)
+        
+        matching = np.flatnonzero(scores)
+        if len(matching) > limit:
+            # Stable sort keeps the earlier row among equal scores, as a full scan would
+            top = np.argsort(-scores[matching], kind='stable')[:limit]
+            matching = np.sort(matching[top])
+        return matching
+    
+    def _build_postings(self, rows_of_terms) -> Dict[str, np.ndarray]:
+        postings = defaultdict(list)
+        for row, terms in enumerate(rows_of_terms):
+            for term in terms:
+                postings[term].append(row)
+        return {term: np.array(rows, dtype=np.int64) for term, rows in postings.items()}
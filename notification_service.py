@@ -3,27 +3,471 @@ Notification Service for Road Safety Estimator
 Handles Email notifications with SMTP integration (Gmail supported)
 """
 
+import base64
+import hashlib
+import io
+import re
+import shutil
 import smtplib
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import contextmanager
+from email.generator import BytesGenerator
+from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 import os
 
+from telemetry import get_telemetry, traced
+
+# Source bytes base64-encoded per read: a multiple of 57, so every line
+# of the encoded body is a full 76 characters
+ENCODE_CHUNK_BYTES = 57 * 16384
+
+# Encoded attachment bytes written to the socket per send call
+SEND_CHUNK_BYTES = 1 << 20
+
+# Room left in a split part's message for the headers and text parts
+SPLIT_HEADROOM_BYTES = 64 * 1024
+
+# Cache entries used this recently are never evicted, since a message
+# still being sent may be streaming them
+EVICT_GRACE_SECONDS = 300
+
+
+class SMTPConnectionPool:
+    """
+    Authenticated SMTP sessions kept open between sends.
+    
+    Opening a session costs a TCP connect, a TLS handshake and a login, so
+    sessions go back to the pool after use and are reused until they have
+    been idle for idle_timeout seconds. A session idle for more than
+    NOOP_AFTER seconds is checked with NOOP before it is handed out. The
+    transport that last connected is tried first next time, so a network
+    that blocks STARTTLS on 587 pays for that timeout once, not per email.
+    
+    security is 'auto' (STARTTLS on port, falling back to SSL on 465),
+    'starttls', 'ssl' (on port) or 'none' (plain SMTP, e.g. a local relay
+    or test stand-in; login only if the server offers AUTH).
+    """
+    
+    NOOP_AFTER = 10
+    
+    def __init__(self, server: str, port: int, username: str = '', password: str = '',
+                 security: str = 'auto', size: int = 2, idle_timeout: float = 240, timeout: float = 30):
+        """
+        Args:
+            server: SMTP host
+            port: SMTP port
+            username: Login user (no login when empty)
+            password: Login password
+            security: 'auto', 'starttls', 'ssl' or 'none'
+            size: Sessions open at the same time; further callers wait
+            idle_timeout: Seconds an unused session is kept (0 = never reuse)
+            timeout: Socket timeout in seconds
+        """
+        if security not in ('auto', 'starttls', 'ssl', 'none'):
+            raise ValueError(f"Unknown SMTP security mode: {security}")
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.transport = None
+        self.opened = 0
+        
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(size, 1))
+        self._idle = []
+    
+    @contextmanager
+    def connection(self):
+        """
+        Borrow an authenticated session. It returns to the pool when the
+        block exits normally and is closed if the block raises.
+        """
+        with self._slots:
+            conn = self._checkout()
+            try:
+                yield conn
+            except BaseException:
+                self._discard(conn)
+                raise
+            if self.idle_timeout > 0:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+    
+    def close(self):
+        """Log out of every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+    
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            idle_for = time.monotonic() - last_used
+            if idle_for > self.idle_timeout:
+                self._discard(conn)
+                continue
+            if idle_for > self.NOOP_AFTER:
+                try:
+                    if conn.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP refused")
+                except (smtplib.SMTPException, OSError):
+                    self._discard(conn)
+                    continue
+            get_telemetry().count('smtp.sessions.hits')
+            return conn
+        get_telemetry().count('smtp.sessions.misses')
+        return self._open()
+    
+    def _transports(self):
+        """(kind, port) pairs to try, the one that last worked first"""
+        if self.security == 'auto':
+            transports = [('starttls', self.port), ('ssl', 465)]
+        else:
+            transports = [(self.security, self.port)]
+        if self.transport in transports:
+            transports.remove(self.transport)
+            transports.insert(0, self.transport)
+        return transports
+    
+    def _open(self) -> smtplib.SMTP:
+        """Connect and log in over the first transport that works"""
+        telemetry = get_telemetry()
+        last_error = None
+        for kind, port in self._transports():
+            telemetry.event('email.connect', server=self.server, port=port, transport=kind)
+            conn = None
+            try:
+                if kind == 'ssl':
+                    conn = smtplib.SMTP_SSL(self.server, port, timeout=self.timeout)
+                else:
+                    conn = smtplib.SMTP(self.server, port, timeout=self.timeout)
+                    if kind == 'starttls':
+                        conn.starttls()
+                if self.username and (kind != 'none' or conn.has_extn('auth')):
+                    telemetry.event('email.login', username=self.username)
+                    conn.login(self.username, self.password)
+            except smtplib.SMTPAuthenticationError:
+                # Wrong credentials fail the same way on every transport
+                self._discard(conn)
+                raise
+            except (smtplib.SMTPException, OSError) as e:
+                telemetry.event('email.transport_failed', transport=kind, port=port, error=str(e))
+                self._discard(conn)
+                last_error = e
+                continue
+            
+            self.transport = (kind, port)
+            self.opened += 1
+            return conn
+        raise last_error
+    
+    @staticmethod
+    def _discard(conn):
+        if conn is None:
+            return
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+
+class EncodedMessage:
+    """
+    One email in SMTP DATA form. The headers and text parts are encoded
+    once; the attachment body is streamed from the attachment cache on
+    each send, so sending a 50 MB report never holds it in memory.
+    """
+    
+    def __init__(self, head: bytes, attachment_path: Optional[Path] = None, tail: bytes = b''):
+        """
+        Args:
+            head: Everything before the attachment body, minus the To header
+            attachment_path: Encoded attachment body (optional)
+            tail: Everything after the attachment body
+        """
+        self.head = head
+        self.attachment_path = attachment_path
+        self.tail = tail if tail.endswith(b'\r\n') else tail + b'\r\n'
+    
+    @property
+    def size(self) -> int:
+        """Bytes sent per recipient"""
+        attachment_size = self.attachment_path.stat().st_size if self.attachment_path else 0
+        return len(self.head) + attachment_size + len(self.tail)
+    
+    def send(self, conn: smtplib.SMTP, from_addr: str, recipient: str):
+        """
+        Send to one recipient on an open session, raising the same
+        exceptions as smtplib's sendmail
+        """
+        conn.ehlo_or_helo_if_needed()
+        code, resp = conn.mail(from_addr)
+        if code != 250:
+            self._abort(conn, code)
+            raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+        code, resp = conn.rcpt(recipient)
+        if code not in (250, 251):
+            self._abort(conn, code)
+            raise smtplib.SMTPRecipientsRefused({recipient: (code, resp)})
+        code, resp = conn.docmd('data')
+        if code != 354:
+            self._abort(conn, code)
+            raise smtplib.SMTPDataError(code, resp)
+        
+        conn.send(f"To: {recipient}\r\n".encode('ascii') + self.head)
+        if self.attachment_path:
+            # Keeps the body recent in the attachment cache while it is in use
+            os.utime(self.attachment_path)
+            with open(self.attachment_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(SEND_CHUNK_BYTES), b''):
+                    conn.send(chunk)
+        conn.send(self.tail + b'.\r\n')
+        code, resp = conn.getreply()
+        if code != 250:
+            self._abort(conn, code)
+            raise smtplib.SMTPDataError(code, resp)
+    
+    @staticmethod
+    def _abort(conn: smtplib.SMTP, code: int):
+        """Leave the session ready for the next message, as sendmail does"""
+        if code == 421:
+            conn.close()
+            return
+        try:
+            conn.rset()
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+
+class AttachmentCache:
+    """
+    Base64-encoded attachment bodies on disk, keyed by the SHA-256 of the
+    PDF, so a report sent again (to more recipients, or from the outbox
+    after a restart) is encoded once.
+    
+    A PDF larger than compress_above bytes is sent zipped; one (after
+    zipping) whose encoded email would be larger than split_above bytes is
+    cut into numbered parts, each sent as its own email of at most
+    split_above bytes, for providers that cap message size (Gmail: 25 MB).
+    Either is off when 0.
+    
+    The cache is bounded to max_bytes like the extraction cache: a hit
+    refreshes the entry's modification time and the least recently used
+    entries are deleted once it grows past the limit.
+    """
+    
+    def __init__(self, cache_dir: str = None, compress_above: int = None, split_above: int = None,
+                 max_bytes: int = None):
+        """
+        Args:
+            cache_dir: Directory of encoded bodies (default: .cache/attachments)
+            compress_above: Zip PDFs larger than this many bytes (default: ATTACHMENT_COMPRESS_MB)
+            split_above: Split attachments whose email would be larger than
+                this many bytes (default: ATTACHMENT_SPLIT_MB)
+            max_bytes: Size limit of the cache (default: ATTACHMENT_CACHE_MAX_MB, 1024)
+        """
+        self.cache_dir = Path(cache_dir or os.getenv('ATTACHMENT_CACHE_DIR', os.path.join('.cache', 'attachments')))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if compress_above is None:
+            compress_above = int(float(os.getenv('ATTACHMENT_COMPRESS_MB', '0')) * 2**20)
+        if split_above is None:
+            split_above = int(float(os.getenv('ATTACHMENT_SPLIT_MB', '0')) * 2**20)
+        self.compress_above = compress_above
+        self.split_above = split_above
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv('ATTACHMENT_CACHE_MAX_MB', '1024')) * 1024 * 1024
+        self._evict_lock = threading.Lock()
+        
+        # (path, size, mtime) -> SHA-256, so a file is hashed once while unchanged
+        self._digests = {}
+    
+    def encode(self, name: str, pdf_path: str = None, pdf_data: bytes = None) -> List[Tuple[str, str, Path]]:
+        """
+        Encoded body of the PDF, from the cache or written to it
+        
+        Args:
+            name: Attachment file name
+            pdf_path: PDF file, read in chunks
+            pdf_data: PDF bytes, used instead of pdf_path if given
+        
+        Returns:
+            list: (file name, MIME subtype, encoded body path) per attachment
+                part; one entry unless the attachment was split
+        """
+        digest, size = self._digest(pdf_path, pdf_data)
+        subtype = 'pdf'
+        
+        def source():
+            return open(pdf_path, 'rb') if pdf_data is None else io.BytesIO(pdf_data)
+        
+        if self.compress_above and size > self.compress_above:
+            # The file name inside the archive is part of the zip, so part of its key
+            zip_key = f"{digest}.{hashlib.sha256(name.encode('utf-8')).hexdigest()[:12]}.zip"
+            zip_path = self.cache_dir / zip_key
+            try:
+                os.utime(zip_path)
+            except FileNotFoundError:
+                temp_path = self.cache_dir / f"{zip_key}.{uuid.uuid4().hex}.tmp"
+                with source() as src, zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    with archive.open(name, 'w', force_zip64=True) as dest:
+                        shutil.copyfileobj(src, dest, ENCODE_CHUNK_BYTES)
+                os.replace(temp_path, zip_path)
+            
+            # PDF streams are usually deflated already; keep the zip only if it saves space
+            if zip_path.stat().st_size < size:
+                name, subtype, digest = f"{name}.zip", 'zip', zip_key
+                size = zip_path.stat().st_size
+                
+                def source():
+                    return open(zip_path, 'rb')
+        
+        if self.split_above and self.encoded_size(size) > self.split_above - SPLIT_HEADROOM_BYTES:
+            part_bytes = self.part_bytes()
+            count = -(-size // part_bytes)
+            parts = [
+                (f"{name}.{index + 1:03d}", 'octet-stream',
+                 self._encoded(f"{digest}.{part_bytes}.{index + 1}of{count}", source, index * part_bytes, part_bytes))
+                for index in range(count)
+            ]
+        else:
+            parts = [(name, subtype, self._encoded(digest, source, 0, size))]
+        self._evict()
+        return parts
+    
+    @staticmethod
+    def encoded_size(size: int) -> int:
+        """Bytes of the encoded body of size source bytes: 76-character base64 lines joined by CRLF"""
+        if size <= 0:
+            return 0
+        lines = -(-size // 57)
+        return -(-size // 3) * 4 + 2 * (lines - 1)
+    
+    def part_bytes(self) -> int:
+        """
+        Source bytes per split part: whole 57-byte lines, as many as fit in
+        split_above once the part is encoded and SPLIT_HEADROOM_BYTES are
+        left for the headers and text parts
+        """
+        lines = (self.split_above - SPLIT_HEADROOM_BYTES + 2) // 78
+        return 57 * max(lines, 1)
+    
+    def _digest(self, pdf_path: str = None, pdf_data: bytes = None) -> Tuple[str, int]:
+        if pdf_data is not None:
+            return hashlib.sha256(pdf_data).hexdigest(), len(pdf_data)
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            sha = hashlib.sha256()
+            with open(pdf_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(ENCODE_CHUNK_BYTES), b''):
+                    sha.update(chunk)
+            self._digests[key] = sha.hexdigest()
+        return self._digests[key], stat.st_size
+    
+    def _encoded(self, key: str, source, offset: int, length: int) -> Path:
+        """Base64 of length bytes of source from offset, as CRLF lines of 76 characters"""
+        encoded_path = self.cache_dir / f"{key}.b64"
+        try:
+            os.utime(encoded_path)
+            get_telemetry().count('attachments.hits')
+            return encoded_path
+        except FileNotFoundError:
+            pass
+        get_telemetry().count('attachments.misses')
+        
+        temp_path = self.cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        with source() as src, open(temp_path, 'wb') as dest:
+            src.seek(offset)
+            remaining, separator = length, b''
+            while remaining > 0:
+                chunk = src.read(min(ENCODE_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                dest.write(separator + base64.encodebytes(chunk).rstrip(b'\n').replace(b'\n', b'\r\n'))
+                separator = b'\r\n'
+        os.replace(temp_path, encoded_path)
+        return encoded_path
+    
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix not in ('.b64', '.zip'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        
+        recent = time.time() - EVICT_GRACE_SECONDS
+        evicted = 0
+        with self._evict_lock:
+            for last_used, size, path in sorted(entries):
+                if total <= self.max_bytes or last_used > recent:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                evicted += 1
+        if evicted:
+            get_telemetry().count('attachments.evictions', evicted)
+
 
 class NotificationService:
     """Service for sending email notifications with PDF attachments"""
     
-    def __init__(self):
-        """Initialize notification service with SMTP configurations"""
+    def __init__(self, pool: SMTPConnectionPool = None, attachments: AttachmentCache = None):
+        """
+        Initialize notification service with SMTP configurations
+        
+        Args:
+            pool: SMTP sessions to send through (default: built from the
+                SMTP_* environment variables)
+            attachments: Cache of encoded attachments (default: built from
+                the ATTACHMENT_* environment variables)
+        """
         # Email SMTP Configuration
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
         self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
         self.smtp_username = os.getenv('SMTP_USERNAME', '')
         self.smtp_password = os.getenv('SMTP_PASSWORD', '')
         self.smtp_from_email = os.getenv('SMTP_FROM_EMAIL', self.smtp_username)
+        self.smtp_security = os.getenv('SMTP_SECURITY', 'auto').lower()
+        
+        # Clean password (remove any spaces)
+        self.pool = pool or SMTPConnectionPool(
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_username,
+            self.smtp_password.replace(' ', ''),
+            security=self.smtp_security,
+            size=int(os.getenv('SMTP_POOL_SIZE', '2')),
+            idle_timeout=float(os.getenv('SMTP_IDLE_TIMEOUT', '240')),
+            timeout=float(os.getenv('SMTP_TIMEOUT', '30'))
+        )
+        self.attachments = attachments or AttachmentCache()
     
-    def send_email(self, to_email, subject, body, pdf_path=None):
+    def send_email(self, to_email, subject, body, pdf_path=None, pdf_data=None, pdf_name=None):
         """
         Send email with optional PDF attachment
         
@@ -32,90 +476,185 @@ class NotificationService:
             subject (str): Email subject
             body (str): Email body text
             pdf_path (str): Path to PDF file to attach (optional)
+            pdf_data (bytes): PDF to attach from memory instead of a file (optional)
+            pdf_name (str): Attachment file name (default: the name of
+                pdf_path, or report.pdf)
             
         Returns:
             tuple: (success: bool, message: str)
         """
-        try:
-            # Check if SMTP is configured
-            if not self.smtp_username or not self.smtp_password:
-                return False, "SMTP credentials not configured. Please set SMTP_USERNAME and SMTP_PASSWORD environment variables."
-            
-            # Clean password (remove any spaces)
-            clean_password = self.smtp_password.replace(' ', '')
-            
-            print(f"📧 DEBUG: Attempting to send email to {to_email}")
-            print(f"📧 DEBUG: PDF Path: {pdf_path}")
-            print(f"📧 DEBUG: PDF Exists: {Path(pdf_path).exists() if pdf_path else 'No PDF'}")
-            
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.smtp_from_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add body as both plain text and HTML
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Create HTML version if body contains HTML
-            if '<html>' in body.lower() or '<br>' in body.lower():
-                msg.attach(MIMEText(body, 'html'))
+        return self.send_many([to_email], subject, body, pdf_path, pdf_data, pdf_name)[to_email]
+    
+    @traced('email.send')
+    def send_many(self, recipients: Iterable[str], subject, body, pdf_path=None, pdf_data=None,
+                  pdf_name=None) -> Dict[str, Tuple[bool, str]]:
+        """
+        Send the same email to each recipient over one pooled SMTP session
+        
+        The message and its attachment are encoded once. A recipient the
+        server refuses does not stop the others; if the session drops
+        part-way, a new one picks up with the next unsent recipient.
+        
+        Args:
+            recipients: Email addresses, each sent a separate copy
+            subject, body, pdf_path, pdf_data, pdf_name: As for send_email
             
-            # Attach PDF if provided
-            if pdf_path and Path(pdf_path).exists():
-                print(f"📧 DEBUG: Attaching PDF: {Path(pdf_path).name}")
-                with open(pdf_path, 'rb') as f:
-                    pdf_attachment = MIMEApplication(f.read(), _subtype='pdf')
-                    pdf_attachment.add_header('Content-Disposition', 'attachment', 
-                                            filename=Path(pdf_path).name)
-                    msg.attach(pdf_attachment)
+        Returns:
+            dict: recipient -> (success: bool, message: str)
+        """
+        pending = list(dict.fromkeys(recipients))
+        
+        # Check if SMTP is configured
+        if not self.is_email_configured():
+            error = "SMTP credentials not configured. Please set SMTP_USERNAME and SMTP_PASSWORD environment variables."
+            return {recipient: (False, error) for recipient in pending}
+        
+        try:
+            get_telemetry().event('email.request', recipients=len(pending), pdf_path=pdf_path,
+                                  pdf_bytes=len(pdf_data) if pdf_data else 0)
+            messages = self.build_messages(subject, body, pdf_path, pdf_data, pdf_name)
+        except Exception as e:
+            get_telemetry().event('email.error', error_type=type(e).__name__, error=str(e))
+            return {recipient: (False, f"Error sending email: {e}") for recipient in pending}
+        
+        results = {}
+        for recipient, error in self.deliver(messages, pending).items():
+            if error is None:
+                results[recipient] = (True, f"Email sent successfully to {recipient}")
             else:
-                print(f"📧 DEBUG: No PDF attachment (path: {pdf_path})")
-            
-            # Try connecting to SMTP server with timeout and retry logic
-            print(f"📧 DEBUG: Connecting to {self.smtp_server}:{self.smtp_port}")
-            
+                results[recipient] = (False, self._describe_error(error))
+        sent = sum(success for success, _ in results.values())
+        get_telemetry().count('email.sent', sent)
+        get_telemetry().count('email.failed', len(results) - sent)
+        return results
+    
+    def deliver(self, messages: Sequence[EncodedMessage], recipients: Iterable[str]) -> Dict[str, Optional[Exception]]:
+        """
+        Send built messages to each recipient over one pooled session
+        
+        A recipient the server refuses does not stop the others; if the
+        session drops part-way, a new one picks up with the next unsent
+        recipient.
+        
+        Args:
+            messages: Emails from build_messages, all sent to every recipient
+            recipients: Email addresses, each sent a separate copy
+        
+        Returns:
+            dict: recipient -> None if delivered, else the exception that stopped it
+        """
+        pending = list(dict.fromkeys(recipients))
+        outcomes = {}
+        reconnects = 0
+        while pending:
+            sent_before = len(outcomes)
             try:
-                # Try port 587 with STARTTLS first
-                with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30) as server:
-                    server.starttls()
-                    print(f"📧 DEBUG: Logging in as {self.smtp_username}")
-                    server.login(self.smtp_username, clean_password)
-                    print(f"📧 DEBUG: Sending message...")
-                    server.send_message(msg)
-                print(f"📧 DEBUG: ✅ Email sent successfully!")
-                return True, f"Email sent successfully to {to_email}"
-                
-            except Exception as port_587_error:
-                print(f"📧 DEBUG: Port 587 failed: {port_587_error}")
-                print(f"📧 DEBUG: Trying alternative port 465 (SSL)...")
-                
-                # Try port 465 with SSL as fallback
-                with smtplib.SMTP_SSL(self.smtp_server, 465, timeout=30) as server:
-                    print(f"📧 DEBUG: Logging in as {self.smtp_username}")
-                    server.login(self.smtp_username, clean_password)
-                    print(f"📧 DEBUG: Sending message...")
-                    server.send_message(msg)
-                
-                print(f"📧 DEBUG: ✅ Email sent successfully via SSL!")
-                return True, f"Email sent successfully to {to_email}"
-            
-        except smtplib.SMTPAuthenticationError as e:
-            print(f"📧 DEBUG: ❌ Authentication failed: {e}")
-            return False, "SMTP authentication failed. Please check your email credentials."
-        except smtplib.SMTPException as e:
-            print(f"📧 DEBUG: ❌ SMTP error: {e}")
-            return False, f"SMTP error: {str(e)}"
-        except Exception as e:
-            print(f"📧 DEBUG: ❌ General error: {e}")
-            error_msg = str(e)
-            if "10060" in error_msg or "timed out" in error_msg.lower():
-                return False, "Connection timeout. Please check: 1) Your firewall/antivirus settings, 2) Network connection, 3) Try disabling VPN if active"
-            return False, f"Error sending email: {error_msg}"
+                with self.pool.connection() as server:
+                    while pending:
+                        recipient = pending[0]
+                        try:
+                            for message in messages:
+                                message.send(server, self.smtp_from_email, recipient)
+                            outcomes[recipient] = None
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+                            get_telemetry().event('email.refused', recipient=recipient, error=str(e))
+                            outcomes[recipient] = e
+                        pending.pop(0)
+            except Exception as e:
+                if len(outcomes) > sent_before:
+                    reconnects = 0
+                if isinstance(e, smtplib.SMTPServerDisconnected) and reconnects < 1:
+                    # A pooled session can go stale between sends: retry once on a fresh one
+                    get_telemetry().event('email.reconnect', error=str(e))
+                    reconnects += 1
+                    continue
+                for recipient in pending:
+                    outcomes[recipient] = e
+                break
+        
+        return outcomes
+    
+    def build_messages(self, subject, body, pdf_path=None, pdf_data=None, pdf_name=None) -> List[EncodedMessage]:
+        """
+        Encode an email for deliver: one message, or one per part when the
+        attachment cache splits a large PDF
+        
+        Args:
+            subject (str): Email subject
+            body (str): Email body text; also sent as HTML if it has markup
+            pdf_path (str): Path to PDF file to attach (optional)
+            pdf_data (bytes): PDF to attach from memory instead of a file (optional)
+            pdf_name (str): Attachment file name (default: the name of
+                pdf_path, or report.pdf)
+        
+        Returns:
+            list: Messages sent to every recipient, in order
+        """
+        # Attach PDF if provided
+        if pdf_data or (pdf_path and Path(pdf_path).exists()):
+            pdf_name = pdf_name or (Path(pdf_path).name if pdf_path else 'report.pdf')
+            with get_telemetry().span('email.encode') as span:
+                attachments = self.attachments.encode(pdf_name, pdf_path, pdf_data)
+                span.set(name=pdf_name, parts=len(attachments))
+        else:
+            attachments = [None]
+        
+        messages = []
+        for index, attachment in enumerate(attachments, 1):
+            if len(attachments) > 1:
+                messages.append(self._encode_message(f"{subject} (part {index} of {len(attachments)})", body, attachment))
+            else:
+                messages.append(self._encode_message(subject, body, attachment))
+        return messages
+    
+    def _encode_message(self, subject, body, attachment: Optional[Tuple[str, str, Path]]) -> EncodedMessage:
+        """Flatten the headers and text parts, leaving a slot for the cached attachment body"""
+        # Create message
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.smtp_from_email
+        msg['Subject'] = subject
+        
+        # Add body as both plain text and HTML
+        msg.attach(MIMEText(body, 'plain'))
+        
+        # Create HTML version if body contains HTML
+        if '<html>' in body.lower() or '<br>' in body.lower():
+            msg.attach(MIMEText(body, 'html'))
+        
+        marker = uuid.uuid4().hex.encode('ascii')
+        if attachment is not None:
+            file_name, subtype, _ = attachment
+            part = MIMEBase('application', subtype)
+            part['Content-Transfer-Encoding'] = 'base64'
+            part.add_header('Content-Disposition', 'attachment', filename=file_name)
+            part.set_payload(marker.decode('ascii'))
+            msg.attach(part)
+        
+        flat = io.BytesIO()
+        BytesGenerator(flat, mangle_from_=False, policy=msg.policy.clone(linesep='\r\n')).flatten(msg)
+        # Dot-stuff as smtplib does; base64 lines never start with a dot
+        flat = re.sub(rb'(?m)^\.', b'..', flat.getvalue())
+        if attachment is None:
+            return EncodedMessage(flat)
+        head, tail = flat.split(marker)
+        return EncodedMessage(head, attachment[2], tail)
+    
+    def _describe_error(self, e: Exception) -> str:
+        """User-facing message for a failed send"""
+        get_telemetry().event('email.error', error_type=type(e).__name__, error=str(e))
+        if isinstance(e, smtplib.SMTPAuthenticationError):
+            return "SMTP authentication failed. Please check your email credentials."
+        if isinstance(e, smtplib.SMTPException):
+            return f"SMTP error: {str(e)}"
+        error_msg = str(e)
+        if "10060" in error_msg or "timed out" in error_msg.lower():
+            return "Connection timeout. Please check: 1) Your firewall/antivirus settings, 2) Network connection, 3) Try disabling VPN if active"
+        return f"Error sending email: {error_msg}"
     
     def is_email_configured(self):
         """Check if email service is properly configured"""
-        return bool(self.smtp_username and self.smtp_password)
+        # A plain local relay may not need credentials
+        return bool(self.smtp_username and self.smtp_password) or self.smtp_security == 'none'
     
     def get_configuration_instructions(self):
         """Get instructions for configuring the email service"""
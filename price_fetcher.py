@@ -1,7 +1,20 @@
+import numpy as np
 import pandas as pd
-from typing import List, Dict
+from typing import Callable, Iterable, List, Dict, Sequence, Tuple, Union
 from datetime import datetime
 
+from intervention_table import InterventionTable
+from telemetry import get_telemetry, traced
+
+# GST applied on top of every adjusted cost
+GST_RATE = 0.18
+
+# Assumed annual inflation for year adjustment
+INFLATION_RATE = 0.05
+
+# Rows priced between progress reports
+PROGRESS_ROWS = 1000
+
 class PriceFetcher:
     """
     Fetches prices and calculates total costs for interventions
@@ -61,21 +74,27 @@ class PriceFetcher:
             "Lakshadweep": 1.30,
         }
     
-    def calculate_costs(self, matched_data: List[Dict]) -> List[Dict]:
+    @traced('pricer.price', mode='rows')
+    def calculate_costs(self, matched_data: List[Dict],
+                        progress: Callable[[int, int], None] = None) -> List[Dict]:
         """
         Calculate total costs for all interventions
+        
+        Args:
+            progress: Called with (rows priced, total rows) as pricing proceeds
         """
         priced_data = []
         
+        # The factors are the same for every item
+        location_factor = self.get_location_factor()
+        inflation_factor = self.get_inflation_factor()
+        
         for item in matched_data:
             # Get base rate
             base_rate = item.get('standard_rate', 0)
             
-            # Apply location adjustment
-            adjusted_rate = self._apply_location_adjustment(base_rate)
-            
-            # Apply year adjustment (inflation)
-            adjusted_rate = self._apply_year_adjustment(adjusted_rate)
+            # Apply location adjustment, then year adjustment (inflation)
+            adjusted_rate = base_rate * location_factor * inflation_factor
             
             # Calculate quantity
             quantity = item.get('quantity', 1.0)
@@ -84,7 +103,7 @@ class PriceFetcher:
             total_cost = adjusted_rate * quantity
             
             # Add GST (18%)
-            gst_amount = total_cost * 0.18
+            gst_amount = total_cost * GST_RATE
             total_with_gst = total_cost + gst_amount
             
             # Create priced item
@@ -99,28 +118,160 @@ class PriceFetcher:
             }
             
             priced_data.append(priced_item)
+            
+            if progress and (len(priced_data) % PROGRESS_ROWS == 0 or len(priced_data) == len(matched_data)):
+                progress(len(priced_data), len(matched_data))
         
         return priced_data
     
+    @traced('pricer.price', mode='columnar')
+    def calculate_costs_columnar(self, rates: Union[pd.DataFrame, np.ndarray],
+                                 quantities: np.ndarray = None) -> pd.DataFrame:
+        """
+        Calculate costs for many line items at once with array operations
+        
+        Gives the same figures as calculate_costs, to the paisa, without a
+        per-item loop. Use it for corridor-wide estimates with many items.
+        
+        Args:
+            rates: DataFrame of matched data (standard_rate and quantity
+                columns), or an array of base rates
+            quantities: Array of quantities when rates is an array
+                (defaults to 1.0 each)
+        
+        Returns:
+            DataFrame: Input columns plus adjusted_rate, total_cost,
+                gst_amount, total_with_gst, location and price_year
+        """
+        if isinstance(rates, pd.DataFrame):
+            priced = rates.copy()
+            base_rates, quantities = self._get_rates_and_quantities(priced)
+        else:
+            base_rates = np.asarray(rates, dtype=np.float64)
+            quantities = np.ones(len(base_rates)) if quantities is None \
+                else np.asarray(quantities, dtype=np.float64)
+            priced = pd.DataFrame({'standard_rate': base_rates, 'quantity': quantities})
+        
+        for column, values in self._price_columns(base_rates, quantities).items():
+            priced[column] = values
+        priced['location'] = self.location
+        priced['price_year'] = self.year
+        
+        return priced
+    
+    @traced('pricer.price', mode='table')
+    def calculate_costs_table(self, table: InterventionTable) -> InterventionTable:
+        """
+        Price a matched InterventionTable in place, adding adjusted_rate,
+        total_cost, gst_amount, total_with_gst, location and price_year
+        columns with the same figures as calculate_costs
+        """
+        base_rates, quantities = self._get_rates_and_quantities(table)
+        for column, values in self._price_columns(base_rates, quantities).items():
+            table.add_column(column, values)
+        table.add_column('location', self.location)
+        table.add_column('price_year', self.year)
+        
+        return table
+    
+    def _price_columns(self, base_rates: np.ndarray, quantities: np.ndarray) -> Dict[str, np.ndarray]:
+        """Rounded priced columns for arrays of base rates and quantities"""
+        # Same operation order as calculate_costs so every float matches
+        adjusted_rate = base_rates * self.get_location_factor() * self.get_inflation_factor()
+        total_cost = adjusted_rate * quantities
+        gst_amount = total_cost * GST_RATE
+        total_with_gst = total_cost + gst_amount
+        
+        return {
+            'adjusted_rate': round_currency(adjusted_rate),
+            'total_cost': round_currency(total_cost),
+            'gst_amount': round_currency(gst_amount),
+            'total_with_gst': round_currency(total_with_gst)
+        }
+    
+    def price_scenarios(self, matched_data: Union[List[Dict], pd.DataFrame],
+                        scenarios: Iterable[Tuple[str, int]] = None) -> pd.DataFrame:
+        """
+        Price one matched set under many (location, year) scenarios at once
+        
+        Every item is priced under every scenario in a single broadcast over
+        an items x scenarios matrix, rounded per item like calculate_costs,
+        so each scenario's totals equal those of a PriceFetcher built for it.
+        
+        Args:
+            matched_data: Matched interventions (list of dicts or DataFrame)
+            scenarios: (location, year) pairs; defaults to every known
+                location at this fetcher's year
+        
+        Returns:
+            DataFrame: One row per scenario with location, price_year,
+                location_factor, inflation_factor, total_cost, gst_amount
+                and total_with_gst
+        """
+        if scenarios is None:
+            scenarios = [(location, self.year) for location in self.price_adjustment_factors]
+        scenarios = list(scenarios)
+        
+        if isinstance(matched_data, pd.DataFrame):
+            base_rates, quantities = self._get_rates_and_quantities(matched_data)
+        else:
+            base_rates = np.fromiter((item.get('standard_rate', 0) for item in matched_data),
+                                     dtype=np.float64, count=len(matched_data))
+            quantities = np.fromiter((item.get('quantity', 1.0) for item in matched_data),
+                                     dtype=np.float64, count=len(matched_data))
+        
+        location_factors = np.array([self.get_location_factor(location) for location, _ in scenarios])
+        inflation_factors = np.array([self.get_inflation_factor(year) for _, year in scenarios])
+        
+        # Items down, scenarios across; same operation order as calculate_costs
+        adjusted_rate = base_rates[:, None] * location_factors * inflation_factors
+        total_cost = adjusted_rate * quantities[:, None]
+        gst_amount = total_cost * GST_RATE
+        total_with_gst = total_cost + gst_amount
+        
+        return pd.DataFrame({
+            'location': [location for location, _ in scenarios],
+            'price_year': [year for _, year in scenarios],
+            'location_factor': location_factors,
+            'inflation_factor': inflation_factors,
+            'total_cost': round_currency(total_cost).sum(axis=0),
+            'gst_amount': round_currency(gst_amount).sum(axis=0),
+            'total_with_gst': round_currency(total_with_gst).sum(axis=0)
+        })
+    
+    def get_location_factor(self, location: str = None) -> float:
+        """
+        Regional price multiplier for a location (default: the selected one)
+        """
+        return self.price_adjustment_factors.get(location or self.location, 1.0)
+    
+    def get_inflation_factor(self, year: int = None) -> float:
+        """
+        Inflation multiplier from a price year (default: the selected one)
+        to the current year
+        """
+        years_diff = datetime.now().year - (year or self.year)
+        return (1 + INFLATION_RATE) ** years_diff
+    
+    def _get_rates_and_quantities(self, data: Union[pd.DataFrame, InterventionTable]) -> Tuple[np.ndarray, np.ndarray]:
+        """Base rates and quantities of matched data, with calculate_costs' defaults"""
+        base_rates = np.asarray(data['standard_rate'], dtype=np.float64) \
+            if 'standard_rate' in data else np.zeros(len(data))
+        quantities = np.asarray(data['quantity'], dtype=np.float64) \
+            if 'quantity' in data else np.ones(len(data))
+        return base_rates, quantities
+    
     def _apply_location_adjustment(self, base_rate: float) -> float:
         """
         Apply location-based price adjustment
         """
-        factor = self.price_adjustment_factors.get(self.location, 1.0)
-        return base_rate * factor
+        return base_rate * self.get_location_factor()
     
     def _apply_year_adjustment(self, rate: float) -> float:
         """
         Apply inflation adjustment based on year
         """
-        current_year = datetime.now().year
-        years_diff = current_year - self.year
-        
-        # Assume 5% annual inflation
-        inflation_rate = 0.05
-        adjustment_factor = (1 + inflation_rate) ** years_diff
-        
-        return rate * adjustment_factor
+        return rate * self.get_inflation_factor()
     
     def get_price_summary(self, priced_data: List[Dict]) -> Dict:
         """
@@ -129,51 +280,314 @@ class PriceFetcher:
         if not priced_data:
             return {}
         
-        df = pd.DataFrame(priced_data)
-        
-        summary = {
-            'total_items': len(df),
-            'total_cost_before_gst': df['total_cost'].sum(),
-            'total_gst': df['gst_amount'].sum(),
-            'total_cost_with_gst': df['total_with_gst'].sum(),
-            'average_cost_per_item': df['total_cost'].mean(),
-            'category_breakdown': df.groupby('category')['total_with_gst'].sum().to_dict()
-        }
-        
-        return summary
+        return PriceSummary(priced_data).to_dict()
     
     def get_category_costs(self, priced_data: List[Dict]) -> pd.DataFrame:
         """
         Get costs grouped by category
         """
-        df = pd.DataFrame(priced_data)
-        
-        category_summary = df.groupby('category').agg({
-            'total_cost': 'sum',
-            'gst_amount': 'sum',
-            'total_with_gst': 'sum',
-            'intervention_type': 'count'
-        }).rename(columns={'intervention_type': 'count'})
-        
-        return category_summary
+        return PriceSummary(priced_data).category_frame()
     
-    def export_to_excel(self, priced_data: List[Dict], filename: str = "cost_estimate.xlsx"):
+    def export_to_excel(self, priced_data: Union[List[Dict], InterventionTable], filename: str = "cost_estimate.xlsx"):
         """
         Export priced data to Excel
         """
-        df = pd.DataFrame(priced_data)
+        df = priced_data.to_frame() if isinstance(priced_data, InterventionTable) else pd.DataFrame(priced_data)
         
         with pd.ExcelWriter(filename, engine='openpyxl') as writer:
             # Main data sheet
             df.to_excel(writer, sheet_name='Detailed Estimate', index=False)
             
             # Summary sheet
-            summary_df = self.get_category_costs(priced_data)
+            price_summary = PriceSummary(priced_data)
+            summary_df = price_summary.category_frame()
             summary_df.to_excel(writer, sheet_name='Category Summary')
             
             # Price summary
-            price_summary = self.get_price_summary(priced_data)
-            summary_data = pd.DataFrame([price_summary])
+            summary_data = pd.DataFrame([price_summary.to_dict()])
             summary_data.to_excel(writer, sheet_name='Overall Summary', index=False)
         
         return filename
+
+
+class PriceSummary:
+    """
+    Totals of one priced dataset, computed in a single pass
+    
+    Holds the item count, subtotal, GST, grand total and per-category
+    totals that the pricing page, report and email all show, so each of
+    them reads the same figures instead of re-aggregating the items.
+    Amounts are whole paise and are summed as integer paise, so totals are
+    exact and do not depend on the order items are added in.
+    """
+    
+    # Per-item amounts that are summed overall and per category
+    AMOUNTS = ('total_cost', 'gst_amount', 'total_with_gst')
+    
+    def __init__(self, priced_data: Union[List[Dict], InterventionTable]):
+        """
+        Args:
+            priced_data: Priced items (from calculate_costs or PricedEstimate),
+                or a priced InterventionTable
+        """
+        self.total_items = 0
+        self._paise = dict.fromkeys(self.AMOUNTS, 0)
+        self._category_paise: Dict[str, Dict] = {}
+        
+        if isinstance(priced_data, InterventionTable):
+            self._add_table(priced_data)
+            return
+        
+        for item in priced_data:
+            self.total_items += 1
+            category = self._get_category_paise(item.get('category'))
+            for amount in self.AMOUNTS:
+                paise = round(item.get(amount, 0) * 100)
+                self._paise[amount] += paise
+                if category is not None:
+                    category[amount] += paise
+            if category is not None:
+                category['count'] += 1
+    
+    @property
+    def totals(self) -> Dict[str, float]:
+        return {amount: paise / 100 for amount, paise in self._paise.items()}
+    
+    @property
+    def category_totals(self) -> Dict[str, Dict]:
+        """Per category: amount totals in rupees and the item count"""
+        return {
+            category: {
+                **{amount: totals[amount] / 100 for amount in self.AMOUNTS},
+                'count': totals['count']
+            }
+            for category, totals in self._category_paise.items()
+        }
+    
+    @property
+    def subtotal(self) -> float:
+        return self._paise['total_cost'] / 100
+    
+    @property
+    def total_gst(self) -> float:
+        return self._paise['gst_amount'] / 100
+    
+    @property
+    def grand_total(self) -> float:
+        return self._paise['total_with_gst'] / 100
+    
+    @property
+    def average_cost_per_item(self) -> float:
+        return self.subtotal / self.total_items if self.total_items else 0.0
+    
+    def apply_change(self, category: str, changes: Dict[str, float]):
+        """Adjust the totals for one item whose amounts changed by `changes`"""
+        category_paise = self._get_category_paise(category)
+        for amount, delta in changes.items():
+            paise = round(delta * 100)
+            self._paise[amount] += paise
+            if category_paise is not None:
+                category_paise[amount] += paise
+    
+    def to_dict(self) -> Dict:
+        """Summary in the get_price_summary format"""
+        return {
+            'total_items': self.total_items,
+            'total_cost_before_gst': self.subtotal,
+            'total_gst': self.total_gst,
+            'total_cost_with_gst': self.grand_total,
+            'average_cost_per_item': self.average_cost_per_item,
+            'category_breakdown': {
+                category: totals['total_with_gst'] for category, totals in sorted(self.category_totals.items())
+            }
+        }
+    
+    def category_frame(self) -> pd.DataFrame:
+        """Category totals in the get_category_costs format"""
+        frame = pd.DataFrame.from_dict(
+            self.category_totals, orient='index', columns=[*self.AMOUNTS, 'count']
+        ).sort_index()
+        frame.index.name = 'category'
+        return frame
+    
+    @classmethod
+    def from_columns(cls, codes: np.ndarray, categories: Sequence, columns: Dict[str, np.ndarray]) -> 'PriceSummary':
+        """
+        Totals of priced amount columns, without building item dicts
+        
+        Args:
+            codes: Index into categories of each item's category, -1 for none
+                (as from pd.factorize)
+            categories: Distinct categories
+            columns: Rounded total_cost, gst_amount and total_with_gst per item
+        """
+        summary = cls([])
+        summary._add_columns(codes, categories, columns)
+        return summary
+    
+    def _add_table(self, table: InterventionTable):
+        """Column-wise totals of a priced table"""
+        codes, categories = pd.factorize(table.get('category'))
+        self._add_columns(codes, categories, {amount: table.get(amount, 0) for amount in self.AMOUNTS}, len(table))
+    
+    def _add_columns(self, codes: np.ndarray, categories: Sequence, columns: Dict, total_items: int = None):
+        self.total_items = len(codes) if total_items is None else total_items
+        has_category = codes >= 0
+        for category in categories:
+            self._get_category_paise(category)
+        
+        for amount in self.AMOUNTS:
+            paise = np.rint(np.asarray(columns[amount], dtype=np.float64) * 100).astype(np.int64)
+            self._paise[amount] = int(paise.sum())
+            per_category = np.zeros(len(categories), dtype=np.int64)
+            np.add.at(per_category, codes[has_category], paise[has_category])
+            for category, total in zip(categories, per_category.tolist()):
+                self._category_paise[category][amount] = total
+        
+        counts = np.bincount(codes[has_category], minlength=len(categories))
+        for category, count in zip(categories, counts.tolist()):
+            self._category_paise[category]['count'] = count
+    
+    def _get_category_paise(self, category) -> Dict:
+        """Running paise totals for a category, or None for items without one"""
+        if category is None or category != category:  # missing or NaN
+            return None
+        if category not in self._category_paise:
+            self._category_paise[category] = {**dict.fromkeys(self.AMOUNTS, 0), 'count': 0}
+        return self._category_paise[category]
+
+
+class PricedEstimate:
+    """
+    Priced interventions that can be re-priced in place
+    
+    Keeps every item's base rate, quantity and category code as columns
+    next to the location and inflation factors applied to them. A location
+    or year change rescales all rows from the base rates with one array
+    operation and totals the new columns with array operations too; since
+    every row's rounded amounts change, the totals cannot be scaled exactly
+    from the old ones. A quantity change re-prices that row alone and
+    adjusts `summary`. `records` holds the same dicts calculate_costs
+    returns and is updated in place.
+    """
+    
+    def __init__(self, matched_data: List[Dict], location: str = "Tamil Nadu", year: int = 2024,
+                 progress: Callable[[int, int], None] = None):
+        """
+        Args:
+            matched_data: Matched interventions to price
+            location: State/UT whose price factor applies
+            year: Price reference year for inflation adjustment
+            progress: Called with (rows priced, total rows) while pricing
+        """
+        self.fetcher = PriceFetcher(location=location, year=year)
+        self.matched_data = matched_data
+        self.records = [{**item} for item in matched_data]
+        self.base_rates = np.fromiter((item.get('standard_rate', 0) for item in matched_data),
+                                      dtype=np.float64, count=len(matched_data))
+        self.quantities = np.fromiter((item.get('quantity', 1.0) for item in matched_data),
+                                      dtype=np.float64, count=len(matched_data))
+        self.category_codes, self.categories = pd.factorize(
+            pd.Series([item.get('category') for item in matched_data], dtype=object)
+        )
+        self.location_factor = None
+        self.inflation_factor = None
+        self.summary = None
+        self._reprice(progress)
+    
+    @property
+    def location(self) -> str:
+        return self.fetcher.location
+    
+    @property
+    def year(self) -> int:
+        return self.fetcher.year
+    
+    def rescale(self, location: str = None, year: int = None,
+                progress: Callable[[int, int], None] = None) -> bool:
+        """
+        Re-price every item for a new location and/or year
+        
+        Returns:
+            bool: True if the factors changed and costs were recomputed
+        """
+        self.fetcher.location = location or self.fetcher.location
+        self.fetcher.year = year or self.fetcher.year
+        
+        if (self.fetcher.get_location_factor() == self.location_factor
+                and self.fetcher.get_inflation_factor() == self.inflation_factor):
+            # Same multipliers (e.g. another state at 1.00): only relabel
+            for record in self.records:
+                record['location'] = self.location
+                record['price_year'] = self.year
+            if progress:
+                progress(len(self.records), len(self.records))
+            return False
+        
+        self._reprice(progress)
+        return True
+    
+    def update_quantity(self, index: int, quantity: float):
+        """Re-price one item for a new quantity and adjust the totals"""
+        record = self.records[index]
+        self.quantities[index] = quantity
+        
+        # Same arithmetic as calculate_costs, for this row only
+        adjusted_rate = float(self.base_rates[index]) * self.location_factor * self.inflation_factor
+        total_cost = adjusted_rate * quantity
+        gst_amount = total_cost * GST_RATE
+        priced = {
+            'total_cost': round(total_cost, 2),
+            'gst_amount': round(gst_amount, 2),
+            'total_with_gst': round(total_cost + gst_amount, 2)
+        }
+        
+        self.summary.apply_change(
+            record.get('category'), {column: value - record[column] for column, value in priced.items()}
+        )
+        record.update(priced, quantity=quantity)
+    
+    @traced('pricer.price', items=None, mode='estimate')
+    def _reprice(self, progress: Callable[[int, int], None] = None):
+        """Recompute every row from the base rates and current factors"""
+        get_telemetry().count('pricer.price.items', len(self.records), mode='estimate')
+        self.location_factor = self.fetcher.get_location_factor()
+        self.inflation_factor = self.fetcher.get_inflation_factor()
+        
+        adjusted_rate = self.base_rates * self.location_factor * self.inflation_factor
+        total_cost = adjusted_rate * self.quantities
+        gst_amount = total_cost * GST_RATE
+        columns = {
+            'adjusted_rate': round_currency(adjusted_rate),
+            'total_cost': round_currency(total_cost),
+            'gst_amount': round_currency(gst_amount),
+            'total_with_gst': round_currency(total_cost + gst_amount)
+        }
+        self.summary = PriceSummary.from_columns(self.category_codes, self.categories, columns)
+        
+        names = list(columns) + ['location', 'price_year']
+        rows = zip(*(values.tolist() for values in columns.values()))
+        labels = (self.location, self.year)
+        for i, (record, values) in enumerate(zip(self.records, rows)):
+            record.update(zip(names, values + labels))
+            if progress and ((i + 1) % PROGRESS_ROWS == 0 or i + 1 == len(self.records)):
+                progress(i + 1, len(self.records))
+
+
+def round_currency(values: np.ndarray) -> np.ndarray:
+    """
+    Round to 2 decimals exactly as Python's round() does
+    
+    np.round scales by 100 first, which can tip values lying within
+    floating-point error of a half paisa the other way. Those few values
+    (and ones too large to scale exactly) are rounded with round() instead.
+    """
+    scaled = values * 100
+    rounded = np.round(scaled) / 100
+    
+    distance_from_half = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5)
+    ambiguous = (distance_from_half <= np.abs(scaled) * 1e-15) | (np.abs(scaled) >= 2 ** 52)
+    for index in zip(*np.nonzero(ambiguous)):
+        rounded[index] = round(float(values[index]), 2)
+    
+    return rounded
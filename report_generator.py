@@ -1,16 +1,213 @@
-from fpdf import FPDF
+from fpdf import FPDF, FPDF_VERSION
 import pandas as pd
-from typing import List, Dict
+import io
+import os
+import shutil
+import tempfile
+from typing import Callable, Iterable, Iterator, List, Dict, Sequence, Union
 from datetime import datetime
 import plotly.graph_objects as go
 import plotly.express as px
+from intervention_table import InterventionTable
+from price_fetcher import PriceSummary
+from telemetry import get_telemetry, traced
 
-class PDF(FPDF):
-    """Extended FPDF class with Unicode support"""
-    def __init__(self):
+# Unicode characters the core PDF fonts cannot draw, and their stand-ins
+TEXT_REPLACEMENTS = {
+    '\u2022': '-',  # Bullet point
+    '\u2013': '-',  # En dash
+    '\u2014': '--', # Em dash
+    '\u2018': "'",  # Left single quote
+    '\u2019': "'",  # Right single quote
+    '\u201c': '"',  # Left double quote
+    '\u201d': '"',  # Right double quote
+    '\u20b9': 'Rs.',# Rupee symbol
+}
+
+# Page content kept in memory while a report is drawn; beyond this it
+# spills to a temporary file
+REPORT_SPOOL_MEMORY_BYTES = int(os.getenv('REPORT_SPOOL_MEMORY_MB', '64')) * 1024 * 1024
+
+# Rows of the detailed estimate gathered and formatted at a time
+TABLE_CHUNK_ROWS = 1000
+
+# Column widths (mm) of the detailed estimate table
+ESTIMATE_COLUMN_WIDTHS = (10, 50, 30, 20, 20, 30, 30)
+
+# The FPDF release whose internals (_out, _endpage, the document buffer and
+# page strings) StreamingPDF replaces; pinned in requirements.txt
+STREAMING_FPDF_VERSION = '1.7.2'
+
+# Characters escaped in PDF text strings, as FPDF._escape does
+_PDF_ESCAPES = str.maketrans({'\\': '\\\\', ')': '\\)', '(': '\\(', '\r': '\\r'})
+
+
+class _Latin1Table(dict):
+    """
+    str.translate table that applies TEXT_REPLACEMENTS and drops every
+    other character outside Latin-1, filled in as characters are first seen
+    """
+    
+    def __missing__(self, code: int):
+        value = code if code < 256 else None
+        self[code] = value
+        return value
+
+
+_LATIN1_TABLE = _Latin1Table(str.maketrans(TEXT_REPLACEMENTS))
+
+
+class _SpooledPage:
+    """Content of a finished page, kept in a spool file until the PDF is written"""
+    
+    def __init__(self, spool, offset: int, length: int):
+        self.spool = spool
+        self.offset = offset
+        self.length = length
+    
+    def encode(self, encoding: str = 'latin-1') -> bytes:
+        # FPDF._putpages only ever encodes a page's content before compressing it
+        self.spool.seek(self.offset)
+        return self.spool.read(self.length)
+
+
+class _FileBuffer:
+    """Stands in for FPDF's document buffer string, writing to a file as it grows"""
+    
+    def __init__(self, file):
+        self.file = file
+        self.length = 0
+    
+    def __iadd__(self, text: str) -> '_FileBuffer':
+        data = text.encode('latin-1')
+        self.file.write(data)
+        self.length += len(data)
+        return self
+    
+    def __len__(self) -> int:
+        return self.length
+
+
+class StreamingPDF(FPDF):
+    """
+    FPDF that never builds its pages or the finished document as strings.
+    
+    FPDF appends each drawing command to a page string and then the whole
+    document to one buffer string, and both grow by concatenation, which
+    is quadratic in the report size. Here commands are collected in a list
+    and each finished page goes to a spool that stays in memory up to
+    spool_max_bytes and then spills to a temporary file. output() streams
+    the document straight to a file and output_bytes() to an in-memory
+    buffer. The PDF produced is the same, and is kept so later output
+    calls return it again. Page number aliases (alias_nb_pages) and
+    uncompressed pages are not supported and raise.
+    """
+    
+    def __init__(self, spool_max_bytes: int = REPORT_SPOOL_MEMORY_BYTES):
+        if FPDF_VERSION != STREAMING_FPDF_VERSION:
+            raise RuntimeError(
+                f"StreamingPDF replaces internals of fpdf {STREAMING_FPDF_VERSION}, found {FPDF_VERSION}; "
+                f"install the version pinned in requirements.txt"
+            )
         super().__init__()
-        self.add_page()
+        self._page_lines = []
+        self._spool_max_bytes = spool_max_bytes
+        self._spool = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes)
+        self._document = None
+    
+    def alias_nb_pages(self, alias='{nb}'):
+        # Finished pages are spooled bytes, so there is no page string to substitute in
+        raise NotImplementedError("StreamingPDF does not support page number aliases")
+    
+    def set_compression(self, compress):
+        if not compress:
+            # FPDF writes uncompressed page strings to the document as they are
+            raise NotImplementedError("StreamingPDF only writes compressed pages")
+        super().set_compression(compress)
+    
+    def output(self, name: str = '', dest: str = ''):
+        """Write the PDF to the file name, or return it as a string with dest='S'"""
+        if dest.upper() == 'S':
+            return self.output_bytes().decode('latin-1')
+        with open(name, 'wb') as file:
+            self._write_document(file)
+        return ''
+    
+    def output_bytes(self) -> bytes:
+        """The finished PDF, rendered into memory"""
+        buffer = io.BytesIO()
+        self._write_document(buffer)
+        return buffer.getvalue()
+    
+    def _write_document(self, file):
+        """Copy the finished document to file, rendering it on the first call"""
+        if self._document is None:
+            self._document = tempfile.SpooledTemporaryFile(max_size=self._spool_max_bytes)
+            self.buffer = _FileBuffer(self._document)
+            self.close()
+            self._spool.close()
+        self._document.seek(0)
+        shutil.copyfileobj(self._document, file)
+
+    def table_rows(self, widths: Sequence[float], h: float, rows: Iterable[Sequence[str]]):
+        """
+        Draw rows of bordered, left-aligned text cells.
         
+        Produces exactly what cell(w, h, text, 1) for each value followed by
+        ln() would, breaking pages the same way, but computes the geometry
+        and writes the drawing commands once per row instead of going
+        through cell() for every value.
+        """
+        if self.unifontsubset or self.underline or self.color_flag or self.ws:
+            # Styles only cell() knows how to draw
+            for row in rows:
+                for w, text in zip(widths, row):
+                    self.cell(w, h, text, 1)
+                self.ln()
+            return
+        
+        k = self.k
+        xs = []
+        x = self.l_margin
+        for w in widths:
+            xs.append(x)
+            x += w
+        rects = [(x * k, w * k, -h * k) for x, w in zip(xs, widths)]
+        text_xs = [(x + self.c_margin) * k for x in xs]
+        
+        for row in rows:
+            if self.y + h > self.page_break_trigger and not self.in_footer and self.accept_page_break():
+                self.add_page(self.cur_orientation)
+            top = (self.h - self.y) * k
+            baseline = (self.h - (self.y + .5 * h + .3 * self.font_size)) * k
+            for (rect_x, rect_w, rect_h), text_x, text in zip(rects, text_xs, row):
+                s = '%.2f %.2f %.2f %.2f re S ' % (rect_x, top, rect_w, rect_h)
+                if text != '':
+                    s += 'BT %.2f %.2f Td (%s) Tj ET' % (text_x, baseline, text.translate(_PDF_ESCAPES))
+                self._out(s)
+            self.lasth = h
+            self.x = self.l_margin
+            self.y += h
+    
+    def _out(self, s):
+        if self.state != 2:
+            super()._out(s)
+        elif isinstance(s, str):
+            self._page_lines.append(s)
+        elif isinstance(s, bytes):
+            self._page_lines.append(s.decode('latin-1'))
+        else:
+            self._page_lines.append(str(s))
+    
+    def _endpage(self):
+        content = ("\n".join(self._page_lines) + "\n").encode('latin-1')
+        self._page_lines = []
+        offset = self._spool.seek(0, 2)
+        self._spool.write(content)
+        self.pages[self.page] = _SpooledPage(self._spool, offset, len(content))
+        super()._endpage()
+
+
 class ReportGenerator:
     """
     Generates comprehensive PDF reports with cost breakdowns and IRC citations
@@ -20,62 +217,104 @@ class ReportGenerator:
         self.pdf = None
     
     def _clean_text(self, text: str) -> str:
-        """Remove or replace Unicode characters that FPDF can't handle"""
+        """Replace or remove Unicode characters that FPDF can't handle, in one pass"""
         if not isinstance(text, str):
             return str(text)
-        # Replace common Unicode characters
-        replacements = {
-            '\u2022': '-',  # Bullet point
-            '\u2013': '-',  # En dash
-            '\u2014': '--', # Em dash
-            '\u2018': "'",  # Left single quote
-            '\u2019': "'",  # Right single quote
-            '\u201c': '"',  # Left double quote
-            '\u201d': '"',  # Right double quote
-            '\u20b9': 'Rs.',# Rupee symbol
-        }
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        # Remove any remaining non-Latin-1 characters
-        text = text.encode('latin-1', 'ignore').decode('latin-1')
-        return text
-    
+        return text.translate(_LATIN1_TABLE)
+
+    @traced('report.render', items=None, output='file')
     def generate_report(
         self,
-        data: List[Dict],
+        data: Union[List[Dict], InterventionTable],
         title: str = "Road Safety Audit Cost Estimate",
         project_name: str = "Highway Safety Improvement",
         consultant: str = "",
         date: str = None,
         include_citations: bool = True,
-        include_charts: bool = True
+        include_charts: bool = True,
+        summary: PriceSummary = None,
+        output_path: str = None,
+        progress: Callable[[int, int], None] = None
     ) -> str:
         """
-        Generate a comprehensive PDF report
+        Generate a comprehensive PDF report and save it to disk
+        
+        For very large reports, or where a file is wanted anyway (batch and
+        background jobs); render_report returns the PDF without a file.
+        
+        Args:
+            data: Priced items, or a priced InterventionTable
+            summary: Totals of data, if already computed by the caller
+            output_path: Where to save the PDF (default: a timestamped
+                file in the working directory)
+            progress: Called with (sections written, total sections)
+        """
+        self._build_report(data, title, project_name, consultant, date, include_citations, summary, progress)
+        
+        # Save PDF
+        filename = output_path or f"road_safety_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        self.pdf.output(filename)
+        
+        return filename
+    
+    @traced('report.render', items=None, output='memory')
+    def render_report(
+        self,
+        data: Union[List[Dict], InterventionTable],
+        title: str = "Road Safety Audit Cost Estimate",
+        project_name: str = "Highway Safety Improvement",
+        consultant: str = "",
+        date: str = None,
+        include_citations: bool = True,
+        include_charts: bool = True,
+        summary: PriceSummary = None,
+        progress: Callable[[int, int], None] = None
+    ) -> bytes:
         """
+        Generate a comprehensive PDF report in memory
+        
+        The returned bytes can be handed to a download button and an email
+        attachment as they are. Takes the same arguments as generate_report.
+        
+        Returns:
+            bytes: The PDF document
+        """
+        self._build_report(data, title, project_name, consultant, date, include_citations, summary, progress)
+        return self.pdf.output_bytes()
+    
+    def _build_report(self, data, title: str, project_name: str, consultant: str, date: str,
+                      include_citations: bool, summary: PriceSummary, progress: Callable[[int, int], None]):
+        """Draw every report section into a new self.pdf"""
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
+        if summary is None:
+            summary = PriceSummary(data)
         
         # Initialize PDF
-        self.pdf = FPDF()
+        self.pdf = StreamingPDF()
         self.pdf.add_page()
         
         # Generate report sections
-        self._add_cover_page(title, project_name, consultant, date)
-        self._add_executive_summary(data)
-        self._add_detailed_estimate(data)
+        sections = [
+            lambda: self._add_cover_page(title, project_name, consultant, date),
+            lambda: self._add_executive_summary(summary),
+            lambda: self._add_detailed_estimate(data)
+        ]
         
         if include_citations:
-            self._add_irc_citations(data)
+            sections.append(lambda: self._add_irc_citations(data))
         
-        self._add_cost_summary(data)
+        sections.append(lambda: self._add_cost_summary(summary))
         
-        # Save PDF
-        filename = f"road_safety_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        self.pdf.output(filename)
+        for done, add_section in enumerate(sections, 1):
+            add_section()
+            if progress:
+                progress(done, len(sections))
         
-        return filename
-    
+        telemetry = get_telemetry()
+        telemetry.count('report.rows', len(data))
+        telemetry.count('report.pages', self.pdf.page)
+
     def _add_cover_page(self, title: str, project: str, consultant: str, date: str):
         """Add cover page to report"""
         self.pdf.set_font("Arial", "B", 24)
@@ -94,17 +333,15 @@ class ReportGenerator:
         
         self.pdf.add_page()
     
-    def _add_executive_summary(self, data: List[Dict]):
+    def _add_executive_summary(self, summary: PriceSummary):
         """Add executive summary section"""
         self.pdf.set_font("Arial", "B", 16)
         self.pdf.cell(0, 10, "Executive Summary", ln=True)
         self.pdf.ln(5)
         
-        df = pd.DataFrame(data)
-        
-        # Calculate summary statistics
-        total_items = len(df)
-        total_cost = df['total_with_gst'].sum() if 'total_with_gst' in df.columns else 0
+        # Summary statistics
+        total_items = summary.total_items
+        total_cost = summary.grand_total
         
         self.pdf.set_font("Arial", "", 11)
         
@@ -121,7 +358,7 @@ and specifications.
         self.pdf.multi_cell(0, 6, self._clean_text(summary_text.strip()))
         self.pdf.ln(10)
     
-    def _add_detailed_estimate(self, data: List[Dict]):
+    def _add_detailed_estimate(self, data: Union[List[Dict], InterventionTable]):
         """Add detailed cost estimate table"""
         self.pdf.add_page()
         self.pdf.set_font("Arial", "B", 14)
@@ -130,38 +367,48 @@ and specifications.
         
         # Table header
         self.pdf.set_font("Arial", "B", 8)
-        self.pdf.cell(10, 8, "No.", 1)
-        self.pdf.cell(50, 8, "Intervention", 1)
-        self.pdf.cell(30, 8, "Location", 1)
-        self.pdf.cell(20, 8, "Qty", 1)
-        self.pdf.cell(20, 8, "Unit", 1)
-        self.pdf.cell(30, 8, "Rate (Rs.)", 1)
-        self.pdf.cell(30, 8, "Cost (Rs.)", 1)
+        headers = ("No.", "Intervention", "Location", "Qty", "Unit", "Rate (Rs.)", "Cost (Rs.)")
+        for width, header in zip(ESTIMATE_COLUMN_WIDTHS, headers):
+            self.pdf.cell(width, 8, header, 1)
         self.pdf.ln()
         
-        # Table data
+        # Table data, formatted and drawn a chunk of rows at a time
         self.pdf.set_font("Arial", "", 7)
-        
-        for i, item in enumerate(data, 1):
-            intervention = self._clean_text(item.get('intervention_type', ''))[:25]
-            location = self._clean_text(item.get('location', ''))[:15]
-            quantity = item.get('quantity', 0)
-            unit = self._clean_text(item.get('unit', ''))
-            rate = item.get('adjusted_rate', 0)
-            cost = item.get('total_with_gst', 0)
-            
-            self.pdf.cell(10, 7, str(i), 1)
-            self.pdf.cell(50, 7, intervention, 1)
-            self.pdf.cell(30, 7, location, 1)
-            self.pdf.cell(20, 7, f"{quantity:.2f}", 1)
-            self.pdf.cell(20, 7, unit, 1)
-            self.pdf.cell(30, 7, f"{rate:,.2f}", 1)
-            self.pdf.cell(30, 7, f"{cost:,.2f}", 1)
-            self.pdf.ln()
+        for rows in self._iter_estimate_rows(data):
+            self.pdf.table_rows(ESTIMATE_COLUMN_WIDTHS, 7, rows)
         
         self.pdf.ln(5)
     
-    def _add_irc_citations(self, data: List[Dict]):
+    def _iter_estimate_rows(self, data: Union[List[Dict], InterventionTable]) -> Iterator[List[tuple]]:
+        """Cell texts of the detailed estimate, TABLE_CHUNK_ROWS rows at a time"""
+        # Types, locations and units repeat across rows: clean each value once
+        cleaned = {}
+        
+        def clean(value) -> str:
+            try:
+                return cleaned[value]
+            except KeyError:
+                cleaned[value] = self._clean_text(value)
+                return cleaned[value]
+            except TypeError:
+                return self._clean_text(value)
+        
+        columns = (('intervention_type', ''), ('location', ''), ('quantity', 0), ('unit', ''),
+                   ('adjusted_rate', 0), ('total_with_gst', 0))
+        for start in range(0, len(data), TABLE_CHUNK_ROWS):
+            stop = start + TABLE_CHUNK_ROWS
+            if isinstance(data, InterventionTable):
+                values = [data.get(name, default)[start:stop].tolist() for name, default in columns]
+            else:
+                values = [[item.get(name, default) for item in data[start:stop]] for name, default in columns]
+            
+            yield [
+                (str(i), clean(intervention)[:25], clean(location)[:15], f"{quantity:.2f}", clean(unit),
+                 f"{rate:,.2f}", f"{cost:,.2f}")
+                for i, intervention, location, quantity, unit, rate, cost in zip(range(start + 1, stop + 1), *values)
+            ]
+
+    def _add_irc_citations(self, data: Union[List[Dict], InterventionTable]):
         """Add IRC code citations"""
         self.pdf.add_page()
         self.pdf.set_font("Arial", "B", 14)
@@ -170,9 +417,13 @@ and specifications.
         
         # Get unique IRC codes
         irc_codes = set()
-        for item in data:
-            if 'irc_code' in item:
-                irc_codes.add(item['irc_code'])
+        if isinstance(data, InterventionTable):
+            if 'irc_code' in data:
+                irc_codes.update(data['irc_code'].tolist())
+        else:
+            for item in data:
+                if 'irc_code' in item:
+                    irc_codes.add(item['irc_code'])
         
         self.pdf.set_font("Arial", "", 10)
         
@@ -191,17 +442,15 @@ and specifications.
             self.pdf.multi_cell(0, 6, self._clean_text(f"- {code}: {description}"))
             self.pdf.ln(2)
     
-    def _add_cost_summary(self, data: List[Dict]):
+    def _add_cost_summary(self, summary: PriceSummary):
         """Add cost summary section"""
         self.pdf.add_page()
         self.pdf.set_font("Arial", "B", 14)
         self.pdf.cell(0, 10, "Cost Summary", ln=True)
         self.pdf.ln(5)
         
-        df = pd.DataFrame(data)
-        
         # Category-wise summary
-        if 'category' in df.columns:
+        if summary.category_totals:
             self.pdf.set_font("Arial", "B", 11)
             self.pdf.cell(0, 8, "Category-wise Breakdown:", ln=True)
             self.pdf.ln(2)
@@ -213,24 +462,19 @@ and specifications.
             self.pdf.ln()
             
             self.pdf.set_font("Arial", "", 9)
-            category_summary = df.groupby('category').agg({
-                'total_with_gst': 'sum',
-                'intervention_type': 'count'
-            })
-            
-            for category, row in category_summary.iterrows():
+            for category, totals in sorted(summary.category_totals.items()):
                 self.pdf.cell(100, 7, self._clean_text(str(category)), 1)
-                self.pdf.cell(40, 7, str(row['intervention_type']), 1)
-                self.pdf.cell(50, 7, f"{row['total_with_gst']:,.2f}", 1)
+                self.pdf.cell(40, 7, str(totals['count']), 1)
+                self.pdf.cell(50, 7, f"{totals['total_with_gst']:,.2f}", 1)
                 self.pdf.ln()
         
         # Grand total
         self.pdf.ln(10)
         self.pdf.set_font("Arial", "B", 12)
         
-        subtotal = df['total_cost'].sum() if 'total_cost' in df.columns else 0
-        gst = df['gst_amount'].sum() if 'gst_amount' in df.columns else 0
-        total = df['total_with_gst'].sum() if 'total_with_gst' in df.columns else 0
+        subtotal = summary.subtotal
+        gst = summary.total_gst
+        total = summary.grand_total
         
         self.pdf.cell(140, 8, "Subtotal:", 1)
         self.pdf.cell(50, 8, f"Rs. {subtotal:,.2f}", 1)
@@ -0,0 +1,266 @@
+"""
+Standards Store for Road Safety Estimator
+Process-wide cache of the IRC standards database, shared by every
+MatchingEngine across Streamlit sessions and reruns
+"""
+
+import argparse
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from telemetry import get_telemetry
+
+# Schema metadata key holding the SHA-256 of the source a snapshot was built from
+SNAPSHOT_SOURCE_KEY = b'source_sha256'
+
+
+class _StoreEntry:
+    """What is known about one database file: its signature and parse result"""
+    
+    def __init__(self, signature, digest, database, error):
+        self.signature = signature
+        self.digest = digest
+        self.database = database
+        self.error = error
+
+
+class MatchMemo:
+    """
+    Least recently used memo of best standards rows, keyed by (prepared
+    query, database version), so every MatchingEngine of the process
+    reuses the matches of earlier requests
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._rows.get(key, default)
+            if row is not default:
+                self._rows.move_to_end(key)
+            return row
+    
+    def put(self, key, row):
+        with self._lock:
+            self._rows[key] = row
+            while len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class StandardsStore:
+    """
+    Loads each standards file once and reuses it until the file changes.
+    
+    A file is re-checked with a cheap stat() on every request. Only when its
+    mtime or size changes is it hashed, and only when the hash changes is it
+    parsed again. Failed parses are remembered too, so a bad file is not
+    re-read on every request.
+    
+    Parsing prefers a Feather snapshot next to the source (see
+    build_snapshot) and only falls back to Excel when the snapshot is
+    missing or was built from a different version of the source.
+    """
+    
+    def __init__(self):
+        """Initialize an empty store"""
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _StoreEntry] = {}
+        self._default_database = None
+        self._match_memo = None
+    
+    def load(self, path: str) -> Optional[pd.DataFrame]:
+        """
+        Return the parsed database at path
+        
+        Returns:
+            DataFrame, or None if the file is missing or could not be parsed
+        """
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        
+        telemetry = get_telemetry()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.signature == signature:
+                telemetry.count('standards.store.hits')
+                return entry.database
+            
+            digest = hash_file(path)
+            if entry is not None and entry.digest == digest:
+                # Touched but unchanged: keep the previous result
+                entry.signature = signature
+                telemetry.count('standards.store.hits')
+                return entry.database
+            
+            telemetry.count('standards.store.misses')
+            database, error = self._read_snapshot(path, digest), None
+            if database is None:
+                try:
+                    with telemetry.span('standards.parse', source='excel'):
+                        database = pd.read_excel(path)
+                    telemetry.event('standards.loaded', source='excel', path=path)
+                    self._write_snapshot(database, path, digest)
+                except Exception as e:
+                    error = str(e)
+                    telemetry.event('standards.load_failed', path=path, error_type=type(e).__name__, error=str(e))
+            
+            self._entries[path] = _StoreEntry(signature, digest, database, error)
+            return database
+    
+    def get_version(self, path: str) -> Optional[str]:
+        """Content hash of the last successfully loaded version of path"""
+        entry = self._entries.get(os.path.abspath(path))
+        if entry is None or entry.database is None:
+            return None
+        return entry.digest
+    
+    def get_error(self, path: str) -> Optional[str]:
+        """Parse error remembered for path, if its current version failed to load"""
+        entry = self._entries.get(os.path.abspath(path))
+        return entry.error if entry is not None else None
+    
+    def get_default_database(self, factory: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Build the built-in default database once and share it"""
+        with self._lock:
+            if self._default_database is None:
+                get_telemetry().event('standards.loaded', source='default')
+                self._default_database = factory()
+            return self._default_database
+    
+    def get_match_memo(self, max_size: int) -> MatchMemo:
+        """
+        The process-wide match memo, holding at least max_size entries
+        
+        Entries are keyed by database version, so a changed database is
+        never answered from matches against the old one.
+        """
+        with self._lock:
+            if self._match_memo is None:
+                self._match_memo = MatchMemo(max_size)
+            elif max_size > self._match_memo.max_size:
+                self._match_memo.max_size = max_size
+            return self._match_memo
+    
+    def clear(self):
+        """Forget every loaded database and remembered match"""
+        with self._lock:
+            self._entries.clear()
+            self._default_database = None
+            if self._match_memo is not None:
+                self._match_memo.clear()
+    
+    def _read_snapshot(self, path: str, digest: str) -> Optional[pd.DataFrame]:
+        """Load the snapshot for path if it was built from this exact source"""
+        snapshot_path = snapshot_path_for(path)
+        if not os.path.exists(snapshot_path):
+            return None
+        try:
+            table = feather.read_table(snapshot_path, memory_map=True)
+        except (OSError, pa.ArrowException) as e:
+            get_telemetry().event('standards.snapshot_unreadable', path=snapshot_path,
+                                  error_type=type(e).__name__, error=str(e))
+            return None
+        
+        metadata = table.schema.metadata or {}
+        if metadata.get(SNAPSHOT_SOURCE_KEY) != digest.encode('ascii'):
+            return None
+        
+        # The table is memory-mapped; converting it is the actual read
+        with get_telemetry().span('standards.parse', source='snapshot'):
+            database = table.to_pandas()
+        get_telemetry().event('standards.loaded', source='snapshot', path=snapshot_path)
+        return database
+    
+    def _write_snapshot(self, database: pd.DataFrame, path: str, digest: str):
+        """Refresh the snapshot after a slow Excel load; failures only cost speed"""
+        try:
+            write_snapshot(database, snapshot_path_for(path), digest)
+        except (OSError, pa.ArrowException) as e:
+            get_telemetry().event('standards.snapshot_write_failed', path=path,
+                                  error_type=type(e).__name__, error=str(e))
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_path_for(source_path: str) -> str:
+    """Snapshot file that sits next to a standards source, e.g. GPT_Input_DB.feather"""
+    return os.path.splitext(source_path)[0] + '.feather'
+
+
+def write_snapshot(database: pd.DataFrame, snapshot_path: str, source_digest: str):
+    """
+    Write the database as an uncompressed Feather file so it can be
+    memory-mapped, tagged with the hash of the source it came from
+    """
+    table = pa.Table.from_pandas(database, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SNAPSHOT_SOURCE_KEY] = source_digest.encode('ascii')
+    table = table.replace_schema_metadata(metadata)
+    
+    temp_path = f"{snapshot_path}.tmp"
+    feather.write_feather(table, temp_path, compression='uncompressed')
+    os.replace(temp_path, snapshot_path)
+
+
+def build_snapshot(source_path: str) -> str:
+    """
+    Import step: convert a standards workbook into its Feather snapshot,
+    written next to it where StandardsStore.load looks for it
+    
+    Returns:
+        str: Path of the written snapshot
+    """
+    snapshot_path = snapshot_path_for(source_path)
+    database = pd.read_excel(source_path)
+    write_snapshot(database, snapshot_path, hash_file(source_path))
+    return snapshot_path
+
+
+# Singleton instance
+_standards_store = None
+
+
+def get_standards_store():
+    """Get or create standards store singleton"""
+    global _standards_store
+    if _standards_store is None:
+        _standards_store = StandardsStore()
+    return _standards_store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the fast-loading snapshot of an IRC standards workbook")
+    parser.add_argument('source', nargs='?', default='GPT_Input_DB.xlsx', help="standards workbook (.xlsx)")
+    args = parser.parse_args()
+    try:
+        print(f"Snapshot written to: {build_snapshot(args.source)}")
+    except Exception as e:
+        parser.exit(1, f"Error building snapshot from {args.source}: {e}\n")
@@ -0,0 +1,358 @@
+"""
+Telemetry for Road Safety Estimator
+Spans, counters and events for the pipeline stages, exported as
+Prometheus text or JSON lines. Disabled unless TELEMETRY is set, and
+then every call returns at once.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# Upper bounds (seconds) of the span duration histogram buckets
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+# Recent events kept in memory for the developer panel
+EVENT_HISTORY = 200
+
+# Prefix of every exported Prometheus metric
+METRIC_PREFIX = 'road_safety_'
+
+
+class _NoopSpan:
+    """Returned by span() while telemetry is disabled"""
+    
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+    
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    Wall time of one stage. Attributes given to set() go to the JSON lines
+    log; an 'items' attribute is also added to the <name>.items counter.
+    """
+    
+    __slots__ = ('telemetry', 'name', 'labels', 'attrs', 'start')
+    
+    def __init__(self, telemetry: 'Telemetry', name: str, labels: Dict):
+        self.telemetry = telemetry
+        self.name = name
+        self.labels = labels
+        self.attrs = {}
+        self.start = None
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.record_span(self.name, time.perf_counter() - self.start, self.labels, self.attrs,
+                                   error=exc_type.__name__ if exc_type else None)
+        return False
+    
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Telemetry:
+    """
+    In-process registry of span timings and counters.
+    
+    Spans aggregate into a duration histogram per (name, labels); counters
+    add up per (name, labels). Counters named <x>.hits and <x>.misses are
+    reported together as the hit rate of <x>. With a JSON lines path, each
+    finished span, counter increment and event is also appended to that
+    file, so worker processes (background jobs, API workers) can write to
+    one log that aggregate_json_lines() reads back.
+    """
+    
+    def __init__(self, enabled: bool = None, echo: bool = None, jsonl_path: str = None):
+        """
+        Args:
+            enabled: Record anything at all (default: TELEMETRY is 1/true/on/debug)
+            echo: Print events and spans as they happen (default: TELEMETRY=debug)
+            jsonl_path: File each record is appended to (default: TELEMETRY_JSONL)
+        """
+        mode = os.getenv('TELEMETRY', '').lower()
+        self.enabled = enabled if enabled is not None else mode in ('1', 'true', 'on', 'debug')
+        self.echo = echo if echo is not None else mode == 'debug'
+        self.jsonl_path = jsonl_path if jsonl_path is not None else os.getenv('TELEMETRY_JSONL') or None
+        
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._spans = {}
+        self._events = deque(maxlen=EVENT_HISTORY)
+        self._jsonl = None
+    
+    def span(self, name: str, **labels):
+        """
+        Time a block: `with telemetry.span('matcher.match', mode='batch') as span:`
+        
+        Args:
+            name: Dotted stage name
+            labels: Low-cardinality dimensions (file format, mode)
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, labels)
+    
+    def timed_iter(self, name: str, iterator: Iterable, **labels) -> Iterator:
+        """
+        Time a lazy stage: the span covers the time spent producing items,
+        not the consumer's time between them, and counts the items
+        """
+        if not self.enabled:
+            return iterator
+        return self._timed_iter(name, iter(iterator), labels)
+    
+    def count(self, name: str, value: float = 1, **labels):
+        """Add value to a counter"""
+        if not self.enabled or not value:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self.jsonl_path:
+            self._write({'type': 'count', 'name': name, 'labels': labels, 'value': value})
+    
+    def event(self, name: str, **fields):
+        """Record something that happened, with its details"""
+        if not self.enabled:
+            return
+        record = {'type': 'event', 'name': name, 'fields': fields}
+        with self._lock:
+            self._events.append({'ts': time.time(), **record})
+        if self.echo:
+            details = ' '.join(f"{key}={value}" for key, value in fields.items())
+            print(f"[{name}] {details}")
+        if self.jsonl_path:
+            self._write(record)
+    
+    def record_span(self, name: str, seconds: float, labels: Dict = None, attrs: Dict = None, error: str = None):
+        """Add a finished span's duration to its histogram"""
+        labels = labels or {}
+        attrs = attrs or {}
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            stats = self._spans.get(key)
+            if stats is None:
+                stats = self._spans[key] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(SPAN_BUCKETS)}
+            stats['count'] += 1
+            stats['sum'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            for i, bound in enumerate(SPAN_BUCKETS):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+        
+        if 'items' in attrs:
+            self.count(f"{name}.items", attrs['items'], **labels)
+        if error:
+            self.count(f"{name}.errors", **labels)
+        if self.echo:
+            details = ' '.join(f"{key}={value}" for key, value in {**labels, **attrs}.items())
+            print(f"[{name}] {seconds * 1000:.1f} ms {details}".rstrip())
+        if self.jsonl_path:
+            self._write({'type': 'span', 'name': name, 'labels': labels, 'seconds': seconds,
+                         'attrs': attrs, 'error': error})
+    
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """
+        Current metrics
+        
+        Returns:
+            dict: 'spans' (name, labels, count, total_seconds, mean_ms,
+                max_ms), 'counters' (name, labels, value), 'hit_rates'
+                (name, hits, misses, hit_rate) and recent 'events'
+        """
+        with self._lock:
+            spans = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': stats['count'],
+                    'total_seconds': stats['sum'],
+                    'mean_ms': stats['sum'] / stats['count'] * 1000,
+                    'max_ms': stats['max'] * 1000
+                }
+                for (name, labels), stats in sorted(self._spans.items())
+            ]
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            events = list(self._events)
+        
+        totals = {}
+        for counter in counters:
+            totals[counter['name']] = totals.get(counter['name'], 0) + counter['value']
+        hit_rates = []
+        for prefix in sorted({name.rsplit('.', 1)[0] for name in totals if name.endswith(('.hits', '.misses'))}):
+            hits, misses = totals.get(f"{prefix}.hits", 0), totals.get(f"{prefix}.misses", 0)
+            hit_rates.append({'name': prefix, 'hits': hits, 'misses': misses,
+                              'hit_rate': hits / (hits + misses) if hits + misses else 0.0})
+        return {'spans': spans, 'counters': counters, 'hit_rates': hit_rates, 'events': events}
+    
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            spans = sorted(self._spans.items())
+            counters = sorted(self._counters.items())
+        
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"{_metric_name(name)}_total"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+        
+        for (name, labels), stats in spans:
+            metric = f"{_metric_name(name)}_seconds"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, observed in zip(SPAN_BUCKETS, stats['buckets']):
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {observed}")
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {stats['count']}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {stats['sum']:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {stats['count']}")
+        
+        return "\n".join(lines) + "\n" if lines else ""
+    
+    def to_json_lines(self) -> str:
+        """Metrics as JSON lines: one object per span series and per counter"""
+        snapshot = self.snapshot()
+        records = [{'type': 'span', **span} for span in snapshot['spans']]
+        records += [{'type': 'counter', **counter} for counter in snapshot['counters']]
+        return "".join(json.dumps(record) + "\n" for record in records)
+    
+    def reset(self):
+        """Drop every recorded metric and event"""
+        with self._lock:
+            self._counters.clear()
+            self._spans.clear()
+            self._events.clear()
+    
+    def _timed_iter(self, name: str, iterator: Iterator, labels: Dict) -> Iterator:
+        elapsed, items, error = 0.0, 0, None
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - start
+                    break
+                except BaseException as e:
+                    elapsed += time.perf_counter() - start
+                    error = type(e).__name__
+                    raise
+                elapsed += time.perf_counter() - start
+                items += 1
+                yield item
+        finally:
+            self.record_span(name, elapsed, labels, {'items': items}, error=error)
+    
+    def _write(self, record: Dict):
+        """Append one record to the JSON lines log"""
+        line = json.dumps({'ts': time.time(), 'pid': os.getpid(), **record}, default=str) + "\n"
+        with self._lock:
+            if self._jsonl is None:
+                self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8', buffering=1)
+            self._jsonl.write(line)
+
+
+def aggregate_json_lines(path: str) -> Telemetry:
+    """
+    Rebuild metrics from a JSON lines log written by any number of
+    processes
+    
+    Returns:
+        Telemetry: An enabled registry holding the logged spans, counters
+            and most recent events
+    """
+    telemetry = Telemetry(enabled=True, echo=False, jsonl_path='')
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line still being written
+            if record.get('type') == 'span':
+                # Item and error counts were logged as counter records of their own
+                telemetry.record_span(record['name'], record['seconds'], record['labels'])
+            elif record.get('type') == 'count':
+                telemetry.count(record['name'], record['value'], **record['labels'])
+            elif record.get('type') == 'event':
+                telemetry._events.append(record)
+    return telemetry
+
+
+def traced(name: str, items: Optional[Callable] = len, **labels):
+    """
+    Decorator timing every call of a function as a span
+    
+    Args:
+        name: Dotted stage name
+        items: Applied to the return value to count the items produced
+            (None: the call has no item count)
+        labels: Span labels
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            telemetry = get_telemetry()
+            if not telemetry.enabled:
+                return function(*args, **kwargs)
+            with telemetry.span(name, **labels) as span:
+                result = function(*args, **kwargs)
+                if items is not None:
+                    span.set(items=items(result))
+            return result
+        return wrapper
+    return decorate
+
+
+def _metric_name(name: str) -> str:
+    return METRIC_PREFIX + ''.join(c if c.isalnum() else '_' for c in name)
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+# Singleton instance, shared by every module of the process
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry():
+    """Get or create telemetry singleton"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = Telemetry()
+    return _telemetry
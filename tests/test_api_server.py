@@ -0,0 +1,111 @@
+"""Tests for request parsing in the API server: request heads and sized and chunked bodies"""
+
+import asyncio
+
+import pytest
+
+from api_server import EstimatorApi, HttpError, RequestBody
+
+
+def read_body(data: bytes, headers: dict, max_bytes: int = 1 << 20, eof: bool = True):
+    """Body bytes as RequestBody reads them, and the bytes it left unread"""
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        if eof:
+            reader.feed_eof()
+        body = RequestBody(reader, headers)
+        content = await body.read(max_bytes)
+        assert body.complete
+        rest = await reader.read() if eof else b''
+        return content, rest
+    return asyncio.run(run())
+
+
+CHUNKED = {'transfer-encoding': 'chunked'}
+
+
+def test_chunked_body_is_joined_and_the_next_request_left_unread():
+    data = b"4\r\nWiki\r\n5;name=value\r\npedia\r\nE\r\n in\r\n\r\nchunks.\r\n0\r\n\r\nGET /health HTTP/1.1\r\n"
+    assert read_body(data, CHUNKED) == (b"Wikipedia in\r\n\r\nchunks.", b"GET /health HTTP/1.1\r\n")
+
+
+def test_chunked_trailers_are_skipped():
+    data = b"3\r\nabc\r\n0\r\nExpires: never\r\nX-Checksum: 1\r\n\r\nNEXT"
+    assert read_body(data, CHUNKED) == (b"abc", b"NEXT")
+
+
+def test_empty_chunked_body():
+    assert read_body(b"0\r\n\r\n", CHUNKED) == (b"", b"")
+
+
+def test_large_chunks_are_read_in_pieces():
+    payload = bytes(range(256)) * 8192  # 2 MB, more than one UPLOAD_CHUNK
+    data = f"{len(payload):x}\r\n".encode() + payload + b"\r\n0\r\n\r\n"
+    assert read_body(data, CHUNKED, max_bytes=len(payload))[0] == payload
+
+
+@pytest.mark.parametrize('data', [
+    b"zz\r\nabc\r\n0\r\n\r\n",  # size is not hex
+    b"-5\r\nabcde\r\n0\r\n\r\n",  # negative size
+    b"3\r\nabcXY0\r\n\r\n",  # chunk not followed by CRLF
+    b"5\r\nabc",  # connection closed mid-chunk
+    b"3\r\nabc\r\n",  # connection closed before the last chunk
+])
+def test_malformed_chunked_body_is_rejected(data):
+    with pytest.raises(HttpError) as error:
+        read_body(data, CHUNKED)
+    assert error.value.status == 400
+
+
+def test_chunked_body_over_the_limit_is_rejected():
+    data = b"6\r\nabcdef\r\n6\r\nghijkl\r\n0\r\n\r\n"
+    with pytest.raises(HttpError) as error:
+        read_body(data, CHUNKED, max_bytes=10)
+    assert error.value.status == 413
+
+
+def test_sized_body():
+    assert read_body(b"hello worldNEXT", {'content-length': '11'}) == (b"hello world", b"NEXT")
+    assert read_body(b"NEXT", {}) == (b"", b"NEXT")
+
+
+def test_sized_body_over_the_limit_is_rejected_before_reading():
+    with pytest.raises(HttpError) as error:
+        read_body(b"", {'content-length': '100'}, max_bytes=10, eof=False)
+    assert error.value.status == 413
+
+
+@pytest.mark.parametrize('headers, data, status', [
+    ({'content-length': 'ten'}, b"", 400),
+    ({'content-length': '10'}, b"short", 400),
+])
+def test_bad_sized_body_is_rejected(headers, data, status):
+    with pytest.raises(HttpError) as error:
+        read_body(data, headers)
+    assert error.value.status == status
+
+
+@pytest.mark.parametrize('data, status', [(b"{not json", 400), (b"[1, 2]", 400)])
+def test_invalid_json_body_is_rejected(data, status):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await RequestBody(reader, {'content-length': str(len(data))}).read_json()
+    with pytest.raises(HttpError) as error:
+        asyncio.run(run())
+    assert error.value.status == status
+
+
+def test_parse_head():
+    api = EstimatorApi(workers=1)
+    head = b"post /match?x=1 HTTP/1.1\r\nHost: localhost\r\nContent-Length: 5\r\nX-Empty:\r\n\r\n"
+    assert api._parse_head(head) == (
+        'POST', '/match?x=1', True, {'host': 'localhost', 'content-length': '5', 'x-empty': ''}
+    )
+    assert api._parse_head(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n")[2] is False
+    assert api._parse_head(b"GET / HTTP/1.0\r\n\r\n")[2] is False
+    assert api._parse_head(b"GET / HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")[2] is True
+    with pytest.raises(HttpError):
+        api._parse_head(b"GARBAGE\r\n\r\n")
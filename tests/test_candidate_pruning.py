@@ -0,0 +1,91 @@
+"""Tests for the n-gram shortlist and the exact score bounds of candidate pruning"""
+
+import random
+
+import pandas as pd
+from fuzzywuzzy import fuzz, process
+
+from matching_engine import MatchingEngine
+from ngram_index import NGramIndex
+
+WORDS = ['road', 'sign', 'speed', 'breaker', 'crash', 'barrier', 'zebra', 'crossing', 'street', 'light',
+         'thermoplastic', 'paint', 'marking', 'guard', 'rail', 'rumble', 'strip', 'cat', 'eye', 'stud',
+         'delineator', 'chevron', 'gantry', 'bollard', 'kerb', 'median', 'W-beam', 'retro-reflective']
+
+
+def make_engine(num_rows: int, seed: int = 0, **kwargs) -> MatchingEngine:
+    rng = random.Random(seed)
+    names = [' '.join(rng.sample(WORDS, rng.randint(1, 4))).title() for _ in range(num_rows)]
+    engine = MatchingEngine(match_cache_size=0, **kwargs)
+    engine.irc_database = pd.DataFrame({
+        'Intervention Type': names,
+        'IRC Code': ['IRC:67-2022'] * num_rows,
+        'Specification': [f"Item {i}" for i in range(num_rows)],
+        'Unit': ['Nos'] * num_rows,
+        'Standard Rate': [100 + i for i in range(num_rows)],
+        'Category': ['Signage'] * num_rows,
+    })
+    engine._choice_index = None
+    return engine
+
+
+def random_queries(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    queries = [' '.join(rng.sample(WORDS, rng.randint(1, 3))) for _ in range(count)]
+    # Typos and case changes, which the n-gram shortlist may miss
+    return queries + [query.upper().replace('a', 'e', 1) for query in queries]
+
+
+def test_score_bounds_never_below_token_sort_ratio():
+    engine = make_engine(300)
+    names = engine._get_choice_index()['names']
+    for query in random_queries(40):
+        bounds = engine._score_bounds(engine._prepare_query(query))
+        for row, name in enumerate(names):
+            score = process.extractOne(query, [name], scorer=fuzz.token_sort_ratio)[1]
+            assert bounds[row] >= score, (query, name)
+
+
+def test_score_bounds_of_empty_strings_are_zero():
+    engine = make_engine(10)
+    assert not engine._score_bounds('').any()
+
+
+def test_pruned_match_equals_full_scan():
+    full_scan = make_engine(2000, pruning_min_rows=float('inf'))
+    pruned = make_engine(2000, pruning_min_rows=0, candidate_limit=5)
+    for query in random_queries(100):
+        intervention = {'type': query, 'description': query}
+        assert pruned._find_best_match(intervention) == full_scan._find_best_match(intervention), query
+
+
+def test_verify_pruning_finds_no_mismatch_and_bypasses_memo():
+    engine = make_engine(1000, pruning_min_rows=0, candidate_limit=5, verify_pruning=True)
+    engine.match_cache_size = 100
+    queries = random_queries(20)
+    for query in queries + queries:
+        engine._find_best_match({'type': query, 'description': query})
+    assert engine.pruning_stats == {'queries': 2 * len(queries), 'mismatches': 0}
+
+
+def test_candidates_are_ascending_and_limited():
+    index = NGramIndex(['speed breaker', 'speed hump', 'road sign', 'speed limit sign', 'zebra crossing'])
+    candidates = index.candidates('speed sign', limit=3)
+    assert len(candidates) == 3
+    assert list(candidates) == sorted(candidates)
+    assert 2 in index.candidates('road sign', limit=1)
+
+
+def test_candidates_keep_the_earlier_row_among_ties():
+    index = NGramIndex(['road sign', 'zebra crossing', 'road sign', 'road sign'])
+    assert list(index.candidates('road sign', limit=2)) == [0, 2]
+
+
+def test_candidates_without_overlap_are_empty():
+    index = NGramIndex(['road sign', 'zebra crossing'])
+    assert len(index.candidates('qqq', limit=5)) == 0
+
+
+def test_specification_words_add_a_bonus():
+    index = NGramIndex(['alpha', 'alpha'], specifications=['plain', 'thermoplastic paint'])
+    assert list(index.candidates('alpha thermoplastic', limit=1)) == [1]
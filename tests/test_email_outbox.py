@@ -0,0 +1,164 @@
+"""Tests for the email outbox: retries, backoff, permanent failures and cleanup"""
+
+import smtplib
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+
+from email_outbox import EmailOutbox, _is_permanent
+
+
+class FakeService:
+    """Stands in for NotificationService; each recipient fails as scripted, then succeeds"""
+    
+    def __init__(self, failures=None):
+        self.failures = {recipient: list(errors) for recipient, errors in (failures or {}).items()}
+        self.attempts = defaultdict(list)
+        self.attachments = []
+        self._lock = threading.Lock()
+    
+    def build_messages(self, subject, body, pdf_path=None, pdf_data=None, pdf_name=None):
+        if pdf_path:
+            with open(pdf_path, 'rb') as f:
+                self.attachments.append((pdf_name, f.read()))
+        return [(subject, body)]
+    
+    def deliver(self, messages, recipients):
+        outcomes = {}
+        with self._lock:
+            for recipient in recipients:
+                self.attempts[recipient].append(time.monotonic())
+                errors = self.failures.get(recipient)
+                outcomes[recipient] = errors.pop(0) if errors else None
+        return outcomes
+
+
+def wait_until_done(outbox, message_ids, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        messages = outbox.get_messages(message_ids)
+        if all(message['status'] in ('sent', 'failed') for message in messages):
+            return messages
+        time.sleep(0.02)
+    raise AssertionError(f"Messages still pending: {outbox.counts()}")
+
+
+@pytest.fixture
+def make_outbox(tmp_path):
+    outboxes = []
+    
+    def make(service, **kwargs):
+        outbox = EmailOutbox(outbox_dir=str(tmp_path / 'outbox'), service=service, **kwargs)
+        outboxes.append(outbox)
+        return outbox
+    
+    yield make
+    for outbox in outboxes:
+        outbox.close()
+
+
+def test_transient_failures_are_retried_with_exponential_backoff(make_outbox):
+    service = FakeService({'flaky@x.org': [smtplib.SMTPServerDisconnected("dropped")] * 3})
+    outbox = make_outbox(service, retry_base=0.1, retry_max=0.25)
+    message_ids = outbox.submit(['flaky@x.org', 'ok@x.org'], "Report", "body")
+    messages = wait_until_done(outbox, message_ids)
+    
+    assert [message['status'] for message in messages] == ['sent', 'sent']
+    assert [message['attempts'] for message in messages] == [4, 1]
+    gaps = [later - earlier for earlier, later in zip(service.attempts['flaky@x.org'],
+                                                       service.attempts['flaky@x.org'][1:])]
+    # 0.1, then 0.2, then capped at retry_max
+    for gap, delay in zip(gaps, (0.1, 0.2, 0.25)):
+        assert gap >= delay - 0.02
+
+
+def test_permanent_failures_are_not_retried(make_outbox):
+    refused = smtplib.SMTPRecipientsRefused({'bad@x.org': (550, b"No such user")})
+    service = FakeService({'bad@x.org': [refused]})
+    outbox = make_outbox(service, retry_base=0.05)
+    [message] = wait_until_done(outbox, outbox.submit(['bad@x.org'], "Report", "body"))
+    assert message['status'] == 'failed'
+    assert message['attempts'] == 1
+    assert "550" in message['error']
+
+
+def test_messages_fail_after_max_attempts(make_outbox):
+    service = FakeService({'down@x.org': [smtplib.SMTPDataError(421, b"Try later")] * 10})
+    outbox = make_outbox(service, retry_base=0.01, max_attempts=3)
+    [message] = wait_until_done(outbox, outbox.submit(['down@x.org'], "Report", "body"))
+    assert (message['status'], message['attempts']) == ('failed', 3)
+    assert len(service.attempts['down@x.org']) == 3
+
+
+def test_backoff_schedule(make_outbox):
+    outbox = make_outbox(FakeService(), retry_base=30, retry_max=100)
+    outbox.close()
+    error = smtplib.SMTPServerDisconnected("dropped")
+    now = time.time()
+    rows = [{'id': f"m{attempts}", 'recipient': f"r{attempts}@x.org", 'attempts': attempts}
+            for attempts in range(4)]
+    with sqlite3.connect(outbox.db_path) as conn:
+        conn.execute("INSERT INTO contents VALUES ('c', 's', 'b', NULL, NULL, '')")
+        conn.executemany("INSERT INTO messages (id, content_id, recipient, status, attempts, next_attempt, created) "
+                         "VALUES (?, 'c', ?, 'sending', ?, 0, '')",
+                         [(row['id'], row['recipient'], row['attempts']) for row in rows])
+    outbox._conn = sqlite3.connect(outbox.db_path, isolation_level=None)
+    outbox._record(rows, {row['recipient']: error for row in rows})
+    with sqlite3.connect(outbox.db_path) as conn:
+        due = dict(conn.execute("SELECT id, next_attempt FROM messages").fetchall())
+    for row, delay in zip(rows, (30, 60, 100, 100)):
+        assert due[row['id']] - now == pytest.approx(delay, abs=1)
+
+
+def test_attachment_is_sent_then_deleted(make_outbox):
+    service = FakeService()
+    outbox = make_outbox(service, retry_base=0.05)
+    message_ids = outbox.submit(['a@x.org', 'b@x.org'], "Report", "body", pdf_data=b"%PDF-1.4 test", pdf_name='r.pdf')
+    wait_until_done(outbox, message_ids)
+    time.sleep(0.1)
+    assert service.attachments == [('r.pdf', b"%PDF-1.4 test")]
+    assert list((outbox.outbox_dir / 'attachments').iterdir()) == []
+
+
+def test_missing_attachment_fails_the_email(make_outbox):
+    service = FakeService()
+    outbox = make_outbox(service, retry_base=0.05)
+    outbox.close()  # keep the sender away until the file is gone
+    message_ids = outbox.submit(['a@x.org'], "Report", "body", pdf_data=b"%PDF-1.4", pdf_name='r.pdf')
+    for path in (outbox.outbox_dir / 'attachments').iterdir():
+        path.unlink()
+    
+    outbox = make_outbox(service, retry_base=0.05)
+    [message] = wait_until_done(outbox, message_ids)
+    assert message['status'] == 'failed'
+    assert "FileNotFoundError" in message['error']
+    assert not service.attempts
+
+
+def test_messages_left_sending_are_retried_after_a_restart(make_outbox):
+    service = FakeService()
+    outbox = make_outbox(service, retry_base=0.05)
+    outbox.close()
+    message_ids = outbox.submit(['a@x.org'], "Report", "body")
+    with sqlite3.connect(outbox.db_path) as conn:
+        conn.execute("UPDATE messages SET status = 'sending'")
+    
+    outbox = make_outbox(service, retry_base=0.05)
+    [message] = wait_until_done(outbox, message_ids)
+    assert message['status'] == 'sent'
+
+
+@pytest.mark.parametrize('error, permanent', [
+    (smtplib.SMTPRecipientsRefused({'a@x.org': (550, b"No such user")}), True),
+    (smtplib.SMTPRecipientsRefused({'a@x.org': (450, b"Mailbox busy")}), False),
+    (smtplib.SMTPAuthenticationError(535, b"Bad credentials"), True),
+    (smtplib.SMTPDataError(421, b"Try later"), False),
+    (smtplib.SMTPServerDisconnected("dropped"), False),
+    (TimeoutError("timed out"), False),
+    (FileNotFoundError("attachment"), True),
+])
+def test_is_permanent(error, permanent):
+    assert _is_permanent(error) is permanent
@@ -0,0 +1,81 @@
+"""Tests for the extraction cache: hits, previews, corrupt entries and eviction"""
+
+import gzip
+import os
+import time
+
+import pytest
+
+from extraction_cache import ExtractionCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(cache_dir=str(tmp_path), max_bytes=10 * 1024 * 1024)
+
+
+def write_entry(cache, key, pages, interventions=()):
+    writer = cache.open_writer(key)
+    for page in pages:
+        writer.add_page(page)
+    writer.commit(list(interventions))
+
+
+def test_hit_returns_preview_and_interventions(cache):
+    write_entry(cache, 'k', ["first page", "second page"], [{'type': 'road sign'}])
+    assert cache.get('k', preview_chars=15) == {'preview': "first page\nseco", 'interventions': [{'type': 'road sign'}]}
+    assert cache.get('k') == {'preview': "", 'interventions': [{'type': 'road sign'}]}
+    assert list(cache.iter_pages('k')) == ["first page", "second page"]
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_keys_depend_on_content_and_file_type(cache):
+    assert cache.key_for(b'abc', 'a.pdf') == cache.key_for(b'abc', 'B.PDF')
+    assert cache.key_for(b'abc', 'a.pdf') != cache.key_for(b'abc', 'a.txt')
+    assert cache.key_for(b'abc', 'a.pdf') != cache.key_for(b'abd', 'a.pdf')
+
+
+def test_miss(cache):
+    assert cache.get('missing') is None
+    assert cache.misses == 1
+    with pytest.raises(FileNotFoundError):
+        list(cache.iter_pages('missing'))
+
+
+@pytest.mark.parametrize('content', [
+    b'not gzip at all',
+    gzip.compress(b'{"p": "page without interventions"}\n'),
+    gzip.compress(b'{"p": "page"}\n{"i": [}\n'),
+    gzip.compress(b'{"p": "page"}\n{"x": 1}\n'),
+    gzip.compress(b'{"p": "page"}\n{"i": []}\n')[:-6],
+])
+def test_corrupt_entry_is_a_miss_and_removed(cache, content):
+    path = cache._entry_path('bad')
+    path.write_bytes(content)
+    assert cache.get('bad', preview_chars=100) is None
+    assert not path.exists()
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_discarded_entry_is_never_visible(cache):
+    writer = cache.open_writer('k')
+    writer.add_page("partial")
+    writer.discard()
+    assert cache.get('k') is None
+    assert list(cache.cache_dir.iterdir()) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ExtractionCache(cache_dir=str(tmp_path), max_bytes=10 * 1024 * 1024)
+    page = os.urandom(20000).hex()
+    write_entry(cache, 'old', [page])
+    cache.max_bytes = cache.stats()['size_bytes'] * 5 // 2  # room for two entries
+    write_entry(cache, 'used', [page])
+    past = time.time() - 60
+    os.utime(cache._entry_path('old'), (past, past))
+    os.utime(cache._entry_path('used'), (past, past))
+    assert cache.get('used') is not None  # refreshes its last use
+    write_entry(cache, 'new', [page])
+    assert cache.get('old') is None
+    assert cache.get('used') is not None and cache.get('new') is not None
+    assert cache.stats()['evictions'] == 1
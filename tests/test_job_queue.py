@@ -0,0 +1,133 @@
+"""Tests for the job queue's recovery of jobs whose worker is gone"""
+
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.shut_down = False
+    
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(JobQueue, '_dispatch', lambda self, job_id, isolated=False: dispatched.append((job_id, isolated)))
+    queue = JobQueue(jobs_dir=str(tmp_path))
+    queue.dispatched = dispatched
+    yield queue
+    queue.shutdown()
+
+
+def add_job(queue, job_id, status='running', host=None, pid=None, heartbeat=None, created='2024-01-01T00:00:00'):
+    with sqlite3.connect(queue.db_path) as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, file_name, options, status, created, worker_host, worker_pid, heartbeat) "
+            "VALUES (?, 'a.txt', '{}', ?, ?, ?, ?, ?)",
+            (job_id, status, created, host, pid, heartbeat)
+        )
+
+
+def statuses(queue):
+    with sqlite3.connect(queue.db_path) as conn:
+        return dict(conn.execute("SELECT id, status FROM jobs").fetchall())
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_requeues_only_jobs_whose_worker_is_gone(queue):
+    host, now = socket.gethostname(), time.time()
+    add_job(queue, 'live', host=host, pid=os.getpid(), heartbeat=now)
+    add_job(queue, 'dead_pid', host=host, pid=dead_pid(), heartbeat=now)
+    add_job(queue, 'other_host', host='elsewhere', pid=1, heartbeat=now)
+    add_job(queue, 'stale_heartbeat', host='elsewhere', pid=1, heartbeat=now - job_queue.STALE_AFTER - 1)
+    add_job(queue, 'never_claimed_by_a_worker')
+    add_job(queue, 'finished', status='done', host=host, pid=dead_pid(), heartbeat=now - 1000)
+    
+    assert sorted(queue._requeue_stale()) == ['dead_pid', 'never_claimed_by_a_worker', 'stale_heartbeat']
+    assert statuses(queue) == {
+        'live': 'running', 'dead_pid': 'queued', 'other_host': 'running', 'stale_heartbeat': 'queued',
+        'never_claimed_by_a_worker': 'queued', 'finished': 'done'
+    }
+    assert queue._requeue_stale() == []
+
+
+def test_requeued_job_is_reset(queue):
+    add_job(queue, 'job', host=socket.gethostname(), pid=dead_pid(), heartbeat=time.time())
+    with sqlite3.connect(queue.db_path) as conn:
+        conn.execute("UPDATE jobs SET stage = 'match', done = 5, total = 9")
+    queue._requeue_stale()
+    job = queue.get('job')
+    assert (job['status'], job['stage'], job['done'], job['total'], job['worker_pid']) == ('queued', None, 0, 0, None)
+
+
+def test_resume_dispatches_requeued_and_queued_jobs_in_order(queue):
+    add_job(queue, 'queued_first', status='queued', created='2024-01-01T00:00:00')
+    add_job(queue, 'stale', heartbeat=time.time() - 1000, created='2024-01-02T00:00:00')
+    add_job(queue, 'queued_last', status='queued', created='2024-01-03T00:00:00')
+    queue._resume()
+    assert queue.dispatched == [('queued_first', False), ('stale', False), ('queued_last', False)]
+
+
+def broken_future(error=None):
+    future = Future()
+    future.set_exception(error or BrokenProcessPool("worker died"))
+    return future
+
+
+def test_broken_pool_resubmits_queued_jobs_and_isolates_running_ones(queue):
+    executor = FakeExecutor()
+    queue._executor = executor
+    add_job(queue, 'waiting', status='queued')
+    add_job(queue, 'running', host=socket.gethostname(), pid=dead_pid(), heartbeat=time.time())
+    queue._on_worker_done('waiting', executor, False, broken_future())
+    queue._on_worker_done('running', executor, False, broken_future())
+    
+    assert executor.shut_down and queue._executor is None
+    assert queue.dispatched == [('waiting', False), ('running', True)]
+    assert statuses(queue) == {'waiting': 'queued', 'running': 'queued'}
+
+
+def test_job_that_breaks_its_own_pool_fails(queue):
+    executor = FakeExecutor()
+    queue._isolation_pools.add(executor)
+    add_job(queue, 'culprit', host=socket.gethostname(), pid=dead_pid(), heartbeat=time.time())
+    queue._on_worker_done('culprit', executor, True, broken_future())
+    
+    assert executor.shut_down and not queue._isolation_pools
+    assert queue.dispatched == []
+    job = queue.get('culprit')
+    assert job['status'] == 'failed' and job['error'].startswith('BrokenProcessPool')
+
+
+def test_a_replaced_pool_is_not_replaced_again(queue):
+    old, current = FakeExecutor(), FakeExecutor()
+    queue._executor = current
+    add_job(queue, 'waiting', status='queued')
+    queue._on_worker_done('waiting', old, False, broken_future())
+    assert queue._executor is current and not current.shut_down
+
+
+def test_list_jobs_only_returns_the_given_jobs(queue):
+    for job_id in ('a', 'b', 'c'):
+        add_job(queue, job_id, status='queued')
+    assert sorted(job['id'] for job in queue.list_jobs(job_ids=['a', 'c'])) == ['a', 'c']
+    assert queue.list_jobs(job_ids=[]) == []
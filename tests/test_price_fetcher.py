@@ -0,0 +1,109 @@
+"""Tests for currency rounding, the columnar pricing modes and price summaries"""
+
+import random
+
+import numpy as np
+import pytest
+
+from intervention_table import InterventionTable
+from price_fetcher import PricedEstimate, PriceFetcher, PriceSummary, round_currency
+
+
+def test_round_currency_matches_round_on_half_paise():
+    # Values a binary float stores just below or above a half paisa
+    values = np.array([1.005, 2.675, 0.125, 0.135, 1.115, 8.345, 1234.565, -2.675, -0.005, 0.0, 1e-9])
+    assert round_currency(values).tolist() == [round(v, 2) for v in values.tolist()]
+
+
+def test_round_currency_matches_round_on_random_amounts():
+    rng = random.Random(7)
+    values = [rng.uniform(0, 1e7) for _ in range(20000)]
+    values += [rng.randint(0, 10 ** 8) / 1000 for _ in range(20000)]  # exact half paise are common
+    values += [rate * 1.18 for rate in values[:5000]]
+    assert round_currency(np.array(values)).tolist() == [round(v, 2) for v in values]
+
+
+@pytest.mark.parametrize('value', [2.0 ** 52, 2.0 ** 60 + 0.5, 9.007199254740993e15, -3e17])
+def test_round_currency_matches_round_on_large_amounts(value):
+    assert round_currency(np.array([value]))[0] == round(value, 2)
+
+
+def test_round_currency_keeps_the_array_shape():
+    values = np.array([[1.005, 2.675], [0.125, 3.0]])
+    rounded = round_currency(values)
+    assert rounded.shape == (2, 2)
+    assert rounded.tolist() == [[round(v, 2) for v in row] for row in values.tolist()]
+
+
+def test_columnar_pricing_matches_calculate_costs():
+    rng = random.Random(3)
+    matched = [{'standard_rate': rng.uniform(1, 250000), 'quantity': rng.choice([1, 2.5, rng.randint(1, 900)])}
+               for _ in range(2000)]
+    fetcher = PriceFetcher(location='Kerala', year=2021)
+    expected = fetcher.calculate_costs(matched)
+    columnar = fetcher.calculate_costs_columnar(
+        np.array([item['standard_rate'] for item in matched]), np.array([item['quantity'] for item in matched])
+    )
+    for column in ('adjusted_rate', 'total_cost', 'gst_amount', 'total_with_gst'):
+        assert columnar[column].tolist() == [item[column] for item in expected], column
+
+
+def _priced_items(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    matched = [
+        {'standard_rate': rng.uniform(1, 90000), 'quantity': rng.randint(1, 400),
+         'category': rng.choice(['Signage', 'Road Marking', 'Safety Barrier', None, float('nan')])}
+        for _ in range(count)
+    ]
+    return PriceFetcher(location='Delhi', year=2023).calculate_costs(matched)
+
+
+def test_price_summary_sums_whole_paise_exactly():
+    items = [{'total_cost': 0.1, 'gst_amount': 0.02, 'total_with_gst': 0.12, 'category': 'Signage'}] * 1000
+    summary = PriceSummary(items)
+    assert (summary.subtotal, summary.total_gst, summary.grand_total) == (100.0, 20.0, 120.0)
+    assert sum(item['total_cost'] for item in items) != 100.0  # what float addition would give
+    assert summary.category_totals['Signage'] == {
+        'total_cost': 100.0, 'gst_amount': 20.0, 'total_with_gst': 120.0, 'count': 1000
+    }
+
+
+def test_price_summary_does_not_depend_on_item_order():
+    items = _priced_items(3000)
+    shuffled = items[:]
+    random.Random(5).shuffle(shuffled)
+    assert PriceSummary(items).to_dict() == PriceSummary(shuffled).to_dict()
+
+
+def test_price_summary_of_a_table_matches_its_records():
+    items = _priced_items(3000)
+    table = InterventionTable.from_records(items)
+    assert PriceSummary(table).to_dict() == PriceSummary(items).to_dict()
+
+
+def test_price_summary_counts_items_without_a_category_in_totals_only():
+    items = _priced_items(500)
+    summary = PriceSummary(items)
+    categorized = [item for item in items if isinstance(item['category'], str)]
+    assert summary.total_items == 500
+    assert set(summary.category_totals) == {'Signage', 'Road Marking', 'Safety Barrier'}
+    assert sum(totals['count'] for totals in summary.category_totals.values()) == len(categorized)
+    assert summary.grand_total == round(sum(round(item['total_with_gst'] * 100) for item in items) / 100, 2)
+
+
+def test_priced_estimate_keeps_its_summary_exact():
+    matched = [{**item} for item in _priced_items(2000)]
+    estimate = PricedEstimate(matched, location='Kerala', year=2022)
+    assert estimate.summary.to_dict() == PriceSummary(estimate.records).to_dict()
+    
+    estimate.update_quantity(7, 12.5)
+    estimate.update_quantity(1999, 0)
+    assert estimate.summary.to_dict() == PriceSummary(estimate.records).to_dict()
+    
+    assert estimate.rescale(location='Delhi', year=2024)
+    expected = PriceFetcher(location='Delhi', year=2024).calculate_costs(
+        [{**item, 'quantity': record['quantity']} for item, record in zip(matched, estimate.records)]
+    )
+    assert [record['total_with_gst'] for record in estimate.records] == \
+        [item['total_with_gst'] for item in expected]
+    assert estimate.summary.to_dict() == PriceSummary(expected).to_dict()